@@ -0,0 +1,172 @@
+"""
+Microbenchmarks of control math hot paths, per call, across history sizes.
+Per-tick paths (marked 'per_tick') should stay flat as history grows;
+full-history integral()/derivative() are O(n) by design and shown for reference.
+
+usage: python -m benchmarks.bench_hot_paths [--sizes 2 100 10000] [--json results.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import numpy as np
+from lib.utils import convert_rate, integral, derivative
+from lib.telemetry import TelemetryBuffer
+from mech.actuator import MockBackend
+from mech.equipment import attenuate_pump_rate
+from classes.pid import PID
+from classes.massprogram import MassProgram
+from lib.clock import VirtualClock
+
+DEFAULT_SIZES = [2, 10, 100, 10**3, 10**4, 10**5, 10**6, 10**7]
+
+# minimum seconds spent timing each case
+MIN_TIME = 0.05
+
+BENCH_RECIPE = {1:{'feed_type':'timed',
+                   'start_parameters': {'rate': 10},#mL/min
+                   'stop_parameters': {'stop_type':'time',
+                                       'stop_value': 0.3}#min
+                   }
+                }
+
+
+def per_call(f, min_time=MIN_TIME, repeat=3):
+
+    """
+    per_call - best-of-repeat seconds per call of f, with number of calls
+      grown until each repeat takes at least min_time
+    """
+
+    number = 1
+    while True:
+        t_start = time.perf_counter()
+        for _ in range(number):
+            f()
+        elapsed = time.perf_counter() - t_start
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time/10 else 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        t_start = time.perf_counter()
+        for _ in range(number):
+            f()
+        best = min(best, time.perf_counter() - t_start)
+
+    return best/number
+
+
+def history(n, capacity=None):
+
+    # 1 Hz trace of n points in telemetry buffer
+    buf = TelemetryBuffer(capacity or max(n, 2))
+    buf.extend(1.6e9 + np.arange(n, dtype=np.float64), np.linspace(0, 1, n))
+
+    return buf
+
+
+def cases(n):
+
+    """
+    cases - benchmark name -> (callable, per_tick) at history size n
+    """
+
+    setpoint = history(n)
+    process = history(n)
+    t_next = [setpoint.last()[0]]
+
+    # continuous PID: most recent point of n point history
+    pid_cont = PID(K=np.array([1.0, 0.1, 0.1]))
+
+    # batch PID: history already folded in; each call adds one new point
+    pid_batch = PID(K=np.array([1.0, 0.1, 0.1]))
+    pid_batch.batch_seen = n
+    pid_batch.last_t, pid_batch.last_error = t_next[0], 0.0
+
+    def batch_tick():
+        t_next[0] += 1
+        setpoint.append(t_next[0], 1.0)
+        process.append(t_next[0], 0.5)
+        pid_batch.control_var(setpoint, process, continuous=False)
+
+    pid_simple = PID(backend=MockBackend())
+
+    mp = MassProgram(BENCH_RECIPE, clock=VirtualClock(), backend=MockBackend())
+    next(mp)
+
+    return {'convert_rate': (lambda: convert_rate(1.0, ['m', 's'], ['sec', 'min']), True),
+            'attenuate_pump_rate': (lambda: attenuate_pump_rate(50.0, 100.0, False), True),
+            'derivative_last_segment': (lambda: derivative(setpoint.window(2)), True),
+            'integral_last_segment': (lambda: integral(setpoint.window(2)), True),
+            'pid_control_var_continuous': (lambda: pid_cont.control_var(setpoint, process), True),
+            'pid_control_var_batch': (batch_tick, True),
+            'pid_simple_control_var': (lambda: pid_simple.simple_control_var(setpoint, process), True),
+            'massprogram_pump': (lambda: mp.pump(0.1, ['m', 'sec']), True),
+            'derivative_full_history': (lambda: derivative(setpoint.window()), False),
+            'integral_full_history': (lambda: integral(setpoint.window()), False)}
+
+
+def run(sizes, min_time=MIN_TIME, only=None):
+
+    """
+    run - times every case at every history size
+    :return: dict - metadata, list of results, growth of per-tick cases
+             (per-call time at largest size / smallest size)
+    """
+
+    results = list()
+
+    for n in sizes:
+        for name, (f, per_tick) in cases(n).items():
+            if only and name not in only:
+                continue
+            results.append({'name': name,
+                            'n': n,
+                            'per_tick': per_tick,
+                            'seconds_per_call': per_call(f, min_time)})
+
+    growth = dict()
+    for name in {r['name'] for r in results if r['per_tick']}:
+        times = [r['seconds_per_call'] for r in results if r['name'] == name]
+        growth[name] = times[-1]/times[0]
+
+    report = {'benchmark': 'hot_paths',
+              'python': sys.version.split()[0],
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'sizes': list(sizes),
+              'results': results,
+              'per_tick_growth': growth}
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--min-time', type=float, default=MIN_TIME)
+    parser.add_argument('--only', nargs='+', default=None, help='benchmark names to run')
+    parser.add_argument('--json', default=None, help='write results to file ("-" for stdout)')
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.min_time, args.only)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        print('{:>28} {:>10} {:>14}'.format('benchmark', 'n', 'us/call'))
+        for r in report['results']:
+            print('{name:>28} {n:>10} {us:>14.3f}'.format(us=1e6*r['seconds_per_call'], **r))
+        print()
+        for name, g in sorted(report['per_tick_growth'].items()):
+            print('{:>28} growth x{:.2f}'.format(name, g))
@@ -0,0 +1,213 @@
+"""
+End-to-end recipe throughput in simulated time. Runs main() on virtual clock
+(no sleeping) for demo recipe and long synthetic recipes (hundreds of stages,
+multi-day durations) and reports ticks/s, stage transitions/s, peak RSS and
+allocations. Ticks/s per core bounds how many vessels one controller box can host.
+
+usage: python -m benchmarks.bench_recipe_throughput [--stages 300] [--json results.json]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+from main import main, DEMO_RECIPE
+from mech.actuator import MockBackend, MOCK_DEFAULTS
+from mech.plant import PlantBackend
+from lib.clock import VirtualClock
+from lib.utils import PID_ADJUSTMENT_INCREMENT
+
+DEFAULT_STAGES = [30, 300]
+
+# feed on scale of synthetic runs, enough for multi-day recipes (g)
+LARGE_FEED = 1e9
+
+
+def synthetic_recipe(n_stages, seed=0):
+
+    """
+    synthetic_recipe - repeating timed / bolus / linear stages with random parameters.
+      Timed stages last 20-60 simulated minutes, so 300 stages run ~3 days;
+      bolus and linear stages are short and mostly exercise stage transitions.
+
+    :param n_stages: int - number of stages
+    :param seed: int - seed of stage parameters
+    :return: dict - recipe (see main.main for format)
+    """
+
+    rng = np.random.default_rng(seed)
+    recipe = dict()
+
+    for i in range(n_stages):
+
+        kind = ('timed', 'bolus', 'linear')[i % 3]
+
+        if kind == 'timed':
+            stage = {'feed_type': 'timed',
+                     'start_parameters': {'rate': float(rng.uniform(5, 20))}, #mL/min
+                     'stop_parameters': {'stop_type': 'time',
+                                         'stop_value': float(rng.uniform(20, 60))}} #min
+        elif kind == 'bolus':
+            stage = {'feed_type': 'bolus',
+                     'start_parameters': {},
+                     'stop_parameters': {'stop_type': 'mass',
+                                         'stop_value': float(rng.uniform(0.5, 2))}} #g
+        else:
+            stage = {'feed_type': 'linear',
+                     'start_parameters': {'inc_rate': -float(rng.uniform(0.5, 2))}, #mL/min^2
+                     'stop_parameters': {'stop_type': 'rate',
+                                         'stop_value': float(rng.uniform(1, 5))}} #mL/min
+
+        recipe[i + 1] = stage
+
+    return recipe
+
+
+def make_backend(kind, clock, feed):
+
+    # fresh devices of simulated reactor
+    state = dict(MOCK_DEFAULTS, SCALE=feed)
+
+    if kind == 'plant':
+        return PlantBackend(state, clock=clock, dt=PID_ADJUSTMENT_INCREMENT)
+
+    return MockBackend(state, clock=clock)
+
+
+def run_recipe(name, recipe, backend_kind='plant', feed=LARGE_FEED,
+               max_ticks=None, trace_alloc=False):
+
+    """
+    run_recipe - runs recipe end to end through main() on virtual clock.
+      Raises RuntimeError if run ends in any status but complete or halted
+
+    :param trace_alloc: bool - also run recipe under tracemalloc (slow) to
+                        report peak traced memory and allocated blocks
+    :return: dict - throughput and memory metrics
+    """
+
+    clock = VirtualClock()
+    backend = make_backend(backend_kind, clock, feed)
+
+    gc.collect()
+    gc_before = [s['collections'] for s in gc.get_stats()]
+    blocks_before = sys.getallocatedblocks()
+
+    t_start = time.perf_counter()
+    controller = main(recipe, clock=clock, backend=backend, max_ticks=max_ticks)
+    wall = time.perf_counter() - t_start
+
+    # main() swallows errors; throughput of crashed run means nothing
+    check_status(name, controller, max_ticks)
+
+    gc_after = [s['collections'] for s in gc.get_stats()]
+    transitions = max(controller.mp.current_stage - 1, 0)
+
+    result = {'name': name,
+              'backend': backend_kind,
+              'stages': len(recipe),
+              'status': controller.status,
+              'ticks': controller.ticks,
+              'transitions': transitions,
+              'simulated_s': clock.elapsed,
+              'wall_s': wall,
+              'ticks_per_s': controller.ticks/wall if wall else float('inf'),
+              'transitions_per_s': transitions/wall if wall else float('inf'),
+              'speedup': clock.elapsed/wall if wall else float('inf'),
+              'peak_rss_mb': peak_rss_mb(),
+              'net_allocated_blocks': sys.getallocatedblocks() - blocks_before,
+              'gc_collections': [b - a for a, b in zip(gc_before, gc_after)]}
+
+    if trace_alloc:
+
+        # second pass under tracemalloc; slows ticks, so not used for throughput
+        clock = VirtualClock()
+        backend = make_backend(backend_kind, clock, feed)
+        tracemalloc.start()
+        controller = main(recipe, clock=clock, backend=backend, max_ticks=max_ticks)
+        check_status(name, controller, max_ticks)
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(s.count for s in tracemalloc.take_snapshot().statistics('filename'))
+        tracemalloc.stop()
+
+        result['traced_peak_mb'] = peak/2**20
+        result['traced_live_blocks'] = blocks
+        result['allocated_blocks_per_tick'] = blocks/max(controller.ticks, 1)
+
+    return result
+
+
+def check_status(name, controller, max_ticks):
+
+    # runs must end complete, or halted by max_ticks (not by interlock / vessel conditions)
+    cut_off = controller.status == 'halted' and max_ticks is not None \
+              and controller.ticks >= max_ticks
+    if controller.status != 'complete' and not cut_off:
+        raise RuntimeError('{} ended with status {} after {} ticks'.format(
+                           name, controller.status, controller.ticks))
+
+
+def peak_rss_mb():
+
+    # peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 2**20 if sys.platform == 'darwin' else 2**10
+
+    return rss/scale
+
+
+def run(stages=DEFAULT_STAGES, backend_kind='plant', max_ticks=None, trace_alloc=False):
+
+    """
+    run - demo recipe plus one synthetic recipe per stage count
+    :return: dict - metadata and list of per-recipe results
+    """
+
+    # demo recipe as in main.py, with enough feed to finish
+    results = [run_recipe('demo', DEMO_RECIPE, backend_kind, LARGE_FEED,
+                          max_ticks, trace_alloc)]
+
+    for n in stages:
+        results.append(run_recipe('synthetic_{}'.format(n), synthetic_recipe(n),
+                                  backend_kind, LARGE_FEED, max_ticks, trace_alloc))
+
+    report = {'benchmark': 'recipe_throughput',
+              'python': sys.version.split()[0],
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'results': results}
+
+    return report
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', type=int, nargs='+', default=DEFAULT_STAGES)
+    parser.add_argument('--backend', choices=['plant', 'mock'], default='plant')
+    parser.add_argument('--max-ticks', type=int, default=None)
+    parser.add_argument('--trace-alloc', action='store_true')
+    parser.add_argument('--json', default=None, help='write results to file ("-" for stdout)')
+    args = parser.parse_args()
+
+    report = run(args.stages, args.backend, args.max_ticks, args.trace_alloc)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+
+        print('{:>16} {:>9} {:>10} {:>12} {:>12} {:>12} {:>10}'.format(
+              'recipe', 'status', 'ticks', 'sim (h)', 'ticks/s', 'stages/s', 'RSS (MB)'))
+        for r in report['results']:
+            print('{name:>16} {status:>9} {ticks:>10} {h:>12.1f} {ticks_per_s:>12.0f} '
+                  '{transitions_per_s:>12.1f} {peak_rss_mb:>10.1f}'.format(
+                  h=r['simulated_s']/3600, **r))
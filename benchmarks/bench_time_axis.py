@@ -0,0 +1,94 @@
+"""
+Compares legacy datetime handling of integral()/derivative()
+(object arrays, map(lambda t: t.seconds, ...) on every call)
+against one-time ingestion into float seconds via as_points().
+
+usage: python -m benchmarks.bench_time_axis [--sizes 10000 1000000 10000000]
+"""
+
+import argparse
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from lib.utils import as_points, integral, derivative
+
+DEFAULT_SIZES = [10**4, 10**6, 10**7]
+
+
+def legacy_time_axis(points):
+
+    # time conversion as done by integral()/derivative() before time_axis()
+    points_arr = np.array(points, dtype=object)
+    relative_time = np.array(points_arr[:,0] - points_arr[0,0])
+    ts = np.array(list(map(lambda t: t.seconds, relative_time)))
+
+    return ts, points_arr[:,1].astype(float)
+
+
+def legacy_integral_derivative(points):
+
+    # legacy path: convert on every call, then integrate/differentiate
+    ts, ys = legacy_time_axis(points)
+    inte = np.trapz(ys, ts) if hasattr(np, 'trapz') else np.trapezoid(ys, ts)
+    dt = np.diff(ts)
+    dy = np.diff(ys)
+    d_0 = [dy[i]/dt[i] if dt[i] else np.nan for i in range(dy.size)][-1]
+
+    return inte, d_0
+
+
+def timed(f, *args):
+
+    t_start = time.perf_counter()
+    f(*args)
+
+    return time.perf_counter() - t_start
+
+
+def run(sizes):
+
+    results = list()
+
+    for n in sizes:
+
+        # 1 Hz datetime trace
+        t0 = datetime(2021, 1, 1)
+        ts = [t0 + timedelta(seconds=i) for i in range(n)]
+        ys = np.linspace(0, 1, n)
+        points = list(zip(ts, ys))
+
+        # legacy: object conversion on every call
+        t_legacy = timed(legacy_integral_derivative, points)
+
+        # new: one-time ingestion, then vectorized calls on float array
+        t_ingest = timed(as_points, points)
+        points_arr = as_points(points)
+        t_calls = timed(lambda: (integral(points_arr), derivative(points_arr)))
+
+        # new: datetime64 input skips python objects entirely
+        ts64 = np.datetime64('2021-01-01') + np.arange(n).astype('timedelta64[s]')
+        t_ingest64 = timed(as_points, ts64, ys)
+
+        results.append({'n': n,
+                        'legacy_s': t_legacy,
+                        'ingest_s': t_ingest,
+                        'ingest_datetime64_s': t_ingest64,
+                        'vectorized_call_s': t_calls})
+
+        del points, ts
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>12} {:>14} {:>14}'.format('n', 'legacy (s)', 'ingest (s)',
+                                                      'ingest dt64 (s)', 'calls (s)'))
+    for r in run(args.sizes):
+        print('{n:>10} {legacy_s:>12.4f} {ingest_s:>12.4f} '
+              '{ingest_datetime64_s:>14.4f} {vectorized_call_s:>14.5f}'.format(**r))
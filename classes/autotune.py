@@ -0,0 +1,217 @@
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from lib.utils import *
+from mech.plant import PLANT_PARAMETERS
+
+"""
+Offline PID auto-tuning. Candidate [k_p, k_i, k_d] sets are scored on
+closed loop step response of plant model (settling time, overshoot, IAE)
+and best set is returned for PID. Candidates are split into chunks that
+are evaluated in worker processes; each chunk is simulated as arrays.
+"""
+
+# pump -> scale-measured rate plant: first order lag with dead time
+PLANT_DEFAULTS = {k: PLANT_PARAMETERS[k] for k in ('gain', 'time_constant', 'dead_time')}
+
+# relative weights of settling time (s), overshoot (fraction) and IAE in cost
+SCORE_WEIGHTS = {'settling_time': 1.0, 'overshoot': 100.0, 'iae': 1.0}
+
+# default candidate grid
+TUNE_GRID = {'k_p': np.linspace(0, 2, 9),
+             'k_i': np.linspace(0, 0.5, 6),
+             'k_d': np.linspace(0, 1, 5)}
+
+TuneResult = namedtuple('TuneResult', ['K', 'cost', 'settling_time',
+                                       'overshoot', 'iae', 'candidates', 'costs'])
+
+
+def ziegler_nichols(Ku, Tu):
+
+    """
+    ziegler_nichols - classic PID rules from ultimate gain and period,
+      e.g. measured by relay feedback (PID.relay_update)
+
+    :param Ku: float - ultimate gain
+    :param Tu: float - ultimate period (s)
+    :return: np.ndarray - K = [k_p, k_i, k_d]
+    """
+
+    k_p = 0.6*Ku
+    T_i = Tu/2
+    T_d = Tu/8
+
+    return np.array([k_p, k_p/T_i, k_p*T_d])
+
+
+def candidate_grid(k_p=TUNE_GRID['k_p'], k_i=TUNE_GRID['k_i'], k_d=TUNE_GRID['k_d']):
+
+    """
+    candidate_grid - every combination of coefficient values
+    :return: np.ndarray (n, 3) - [k_p, k_i, k_d] rows
+    """
+
+    grid = np.meshgrid(k_p, k_i, k_d, indexing='ij')
+
+    return np.stack([g.ravel() for g in grid], axis=1).astype(np.float64)
+
+
+def step_response(K, plant=PLANT_DEFAULTS, setpoint=1.0, duration=120,
+                  dt=PID_ADJUSTMENT_INCREMENT, derivative_filter=PID_DERIVATIVE_FILTER):
+
+    """
+    step_response - closed loop response of plant to setpoint step, for many
+      coefficient sets at once. Pump command is setpoint + u(t), as in
+      FleetSimulator; u(t) uses same update as PID.update.
+
+    :param K: array (n, 3) - candidate [k_p, k_i, k_d] rows
+    :param plant: dict - gain, time_constant (s) and dead_time (s) of plant
+    :param setpoint: float - step size (rate units)
+    :param duration: float - simulated seconds
+    :param dt: float - seconds per tick
+    :return: 2-tuple - times (ticks,), measured rate (n, ticks)
+    """
+
+    K = np.atleast_2d(np.asarray(K, dtype=np.float64))
+    n = K.shape[0]
+    ticks = int(round(duration/dt))
+    delay = int(round(plant['dead_time']/dt))
+    alpha = 1 - np.exp(-dt/plant['time_constant']) if plant['time_constant'] > 0 else 1.0
+
+    # pump commands still in transit through dead time (ring of delay+1 ticks)
+    in_transit = np.zeros((delay + 1, n))
+    y = np.zeros(n)
+    out = np.empty((n, ticks))
+
+    total_int = np.zeros(n)
+    derivative = np.zeros(n)
+    last_error = None
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        for k in range(ticks):
+
+            # PID update on measured rate
+            error = setpoint - y
+            if last_error is not None:
+                total_int += 0.5*(error + last_error)*dt
+                derivative += derivative_filter*((error - last_error)/dt - derivative)
+            last_error = error
+            u = K[:, 0]*error + K[:, 1]*total_int + K[:, 2]*derivative
+
+            # pump command reaches scale after dead time, then lags
+            in_transit[k % (delay + 1)] = setpoint + u
+            arriving = in_transit[(k + 1) % (delay + 1)] if delay else in_transit[0]
+            y = y + alpha*(plant['gain']*arriving - y)
+            out[:, k] = y
+
+    t = dt*np.arange(1, ticks + 1)
+
+    return t, out
+
+
+def score_response(t, y, setpoint=1.0, band=0.02):
+
+    """
+    score_response - step response metrics of each row of y
+
+    :param t: array (ticks,) - times (s)
+    :param y: array (n, ticks) - measured responses
+    :param setpoint: float - step size
+    :param band: float - settling band, fraction of setpoint
+    :return: dict of arrays (n,) - settling_time (s, inf if never settles),
+             overshoot (fraction of setpoint), iae
+    """
+
+    y = np.atleast_2d(y)
+    error = setpoint - y
+    dt = np.diff(t, prepend=0)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+
+        # last time response was outside band; settled after it
+        outside = ~(np.abs(error) <= band*abs(setpoint))
+        settled = ~outside[:, -1]
+        last_out = y.shape[1] - 1 - np.argmax(outside[:, ::-1], axis=1)
+        settling_time = np.where(outside.any(axis=1), t[np.minimum(last_out + 1, t.size - 1)], t[0])
+        settling_time = np.where(settled, settling_time, np.inf)
+
+        overshoot = np.maximum(np.nanmax(y, axis=1) - setpoint, 0)/abs(setpoint)
+        iae = np.sum(np.abs(error)*dt, axis=1)
+
+    unstable = ~np.all(np.isfinite(y), axis=1)
+    overshoot[unstable] = np.inf
+    iae[unstable] = np.inf
+
+    return {'settling_time': settling_time, 'overshoot': overshoot, 'iae': iae}
+
+
+def evaluate_candidates(K, plant=PLANT_DEFAULTS, weights=SCORE_WEIGHTS,
+                        setpoint=1.0, duration=120, dt=PID_ADJUSTMENT_INCREMENT):
+
+    """
+    evaluate_candidates - cost of each coefficient set (lower is better)
+    :return: 2-tuple - cost array (n,), dict of metric arrays (n,)
+    """
+
+    t, y = step_response(K, plant, setpoint, duration, dt)
+    scores = score_response(t, y, setpoint)
+
+    with np.errstate(invalid='ignore'):
+        cost = sum(weights[k]*scores[k] for k in weights)
+    cost = np.where(np.isnan(cost), np.inf, cost)
+
+    return cost, scores
+
+
+def _evaluate_chunk(args):
+
+    # worker process entry point
+    return evaluate_candidates(*args)
+
+
+def autotune(plant=PLANT_DEFAULTS, candidates=None, weights=SCORE_WEIGHTS,
+             setpoint=1.0, duration=120, dt=PID_ADJUSTMENT_INCREMENT,
+             processes=None, chunk_size=64):
+
+    """
+    autotune - finds PID coefficients with lowest cost on plant model
+
+    :param plant: dict - plant model parameters (see PLANT_DEFAULTS),
+                  or object with model attribute (e.g. mech.plant.PlantBackend)
+    :param candidates: array (n, 3) - [k_p, k_i, k_d] rows; candidate_grid() if None
+    :param weights: dict - cost weights of settling_time, overshoot and iae
+    :param processes: int - worker processes; None uses every CPU,
+                      1 evaluates in this process
+    :param chunk_size: int - candidates simulated together per task
+    :return: TuneResult - best K and its metrics, plus cost of every candidate
+    """
+
+    plant = getattr(plant, 'model', plant)
+
+    if candidates is None:
+        candidates = candidate_grid()
+    candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+
+    chunks = [(candidates[i:i + chunk_size], plant, weights, setpoint, duration, dt)
+              for i in range(0, candidates.shape[0], chunk_size)]
+
+    if processes == 1 or len(chunks) == 1:
+        results = [_evaluate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_evaluate_chunk, chunks))
+
+    costs = np.concatenate([cost for cost, scores in results])
+    scores = {k: np.concatenate([s[k] for cost, s in results]) for k in weights}
+
+    best = int(np.argmin(costs))
+
+    result = TuneResult(K=candidates[best].copy(),
+                        cost=float(costs[best]),
+                        settling_time=float(scores['settling_time'][best]),
+                        overshoot=float(scores['overshoot'][best]),
+                        iae=float(scores['iae'][best]),
+                        candidates=candidates,
+                        costs=costs)
+
+    return result
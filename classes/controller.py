@@ -0,0 +1,431 @@
+from lib.utils import *
+from lib.telemetry import TelemetryBuffer
+from lib.clock import SYSTEM_CLOCK
+from lib.instrument import TickInstrumentation
+from lib.downsample import TrendDownsampler
+from lib.ticklog import FLAG_LIMIT_HIT, FLAG_TRANSITION, FLAG_STALE, FLAG_RELAY, FLAG_HALTED
+from mech.equipment import *
+from mech.actuator import DEFAULT_BACKEND
+from classes.pid import PID
+from classes.massprogram import MassProgram
+from classes.trajectory import compile_recipe
+
+
+class FeedController:
+
+    """
+    Runs recipe on single reactor, one control tick at a time.
+      Pacing between ticks is left to caller (e.g. main() or ReactorSupervisor)
+    """
+
+    def __init__(self, recipe, verbose=False, clock=SYSTEM_CLOCK,
+                 backend=DEFAULT_BACKEND, acquirer=None, relay_autotune=False,
+                 instrumentation=None, tick_log=None, trend_tiers=None):
+
+        """
+        :param acquirer: SensorAcquirer reading devices concurrently with timeouts.
+                         None reads devices one after another
+        :param relay_autotune: bool - tune PID by relay feedback during first
+                               recipe stage (see PID.start_relay)
+        :param instrumentation: TickInstrumentation timing tick phases and counting
+                                pump writes, stage transitions and limit hits.
+                                None installs disabled one (profile() still works)
+        :param tick_log: lib.ticklog.TickLogWriter recording every tick (None = no log)
+        :param trend_tiers: tuple of float - bucket widths (s) of live scale & pressure
+                            trends (see lib.downsample); None keeps no trends
+        """
+
+        self.verbose = verbose
+        self.clock = clock
+        self.backend = backend
+        self.acquirer = acquirer
+        self.instrumentation = instrumentation if instrumentation is not None \
+                               else TickInstrumentation(enabled=False)
+        self.tick_log = tick_log
+
+        # Instantiate sensor stores
+        self.sensor_data = {'scale':TelemetryBuffer(),
+                            'pump':TelemetryBuffer(),
+                            'pressure':TelemetryBuffer()}
+        self.measured_data = {'pump':TelemetryBuffer(), # rate of change determined emperically from scale mass/s
+                              'pressure':TelemetryBuffer()} #rate of change of pressure wrt time
+
+        # downsampled scale & pressure history for trend display
+        self.trends = None
+        if trend_tiers is not None:
+            self.trends = {'scale': TrendDownsampler(trend_tiers),
+                           'pressure': TrendDownsampler(trend_tiers)}
+
+        # Bool monitoring of experimental conditions
+        self.pump_limit_exceeded = False # max/min pump rate hit during recipe. Ends current recipe stage.
+        self.rate_meas = None # pump rate determined by scale change per time
+        self.rate_meas_st = None # scale-measured pump rate in steps/s
+        self.stage_changed = False # recipe stage advanced during current tick
+        self.next_rate = None # pump rate determined by mass program
+        self.rate_trim = 1 # cascade correction of linear ramp setpoint
+        self.current_data = None # most recent sensor readings
+
+        # Instantiate massprogram objects (e.g. mass-defined recipe)
+        self.mp = MassProgram(recipe, clock=clock, backend=backend)
+        self.recipe = recipe
+        self.trajectory = None # setpoint table compiled at start
+        self.pid=PID(backend=backend) #insantiate PID object
+        self.relay_autotune = relay_autotune
+
+        # run state: 'idle', 'running', 'complete', 'halted' or 'error'
+        self.status = 'idle'
+        self.ticks = 0
+
+    def read_sensors(self):
+
+        # one snapshot of every sensor
+        if self.acquirer is not None:
+            return self.acquirer.acquire()
+
+        return acquire_snapshot(self.clock, self.backend)
+
+    def write_pump(self, rate, input_units=['m', 'sec'], **kwargs):
+
+        """
+        write_pump - MassProgram.pump, timed and counted by instrumentation
+        :return: bool - True if pump rate attenuated to engineering/recipe limit
+        """
+
+        instrumentation = self.instrumentation
+
+        with instrumentation.span('pump'):
+            limit_hit = self.mp.pump(rate, input_units, **kwargs)
+
+        instrumentation.count('pump_writes')
+        if limit_hit:
+            instrumentation.count('limit_hits')
+
+        return limit_hit
+
+    def start(self):
+
+        """
+        start - records initial pressure, starts first recipe stage,
+          opens valve and starts pump
+        :return: bool - True if recipe is running
+        """
+
+        mp = self.mp
+
+        # initial sensor readings, shared by pressure log and first stage
+        self.current_data = self.read_sensors()
+        self.sensor_data['pressure'].append(self.current_data.time,
+                                            self.current_data.pressure) #initial pressure (atm)
+
+        # precompute recipe setpoints from starting scale reading
+        self.trajectory = compile_recipe(self.recipe,
+                                         initial_mass=self.current_data.mass)
+
+        # generate run coefficients for first stage of recipe 
+        try:
+            mp.next_stage(self.current_data)
+        except StopIteration:
+            if self.verbose:
+                print("feed recipe complete")
+            self.status = 'complete'
+            return False
+
+        if self.verbose:
+            print("First stage of recipe has started. Recipe type: {}".format(mp.feed_type))
+
+        # get pump start rate
+        self.next_rate = mp.coeff[1] #pump rate in g/s
+
+        # oscillate pump around first stage rate (steps/s) to tune PID
+        if self.relay_autotune:
+            center = convert_rate(self.next_rate, ['m', 's'])
+            self.pid.start_relay(center, RELAY_AMPLITUDE*center)
+        # open valve
+        self.backend.valve(1)
+        # start pump
+        self.pump_limit_exceeded = self.write_pump(self.next_rate) #use mp.pump for better control?
+
+        self.status = 'running'
+
+        return True
+
+    def tick(self):
+
+        """
+        tick - single iteration of PID controlled glucose feed loop.
+          Reads every sensor once, then checks vessle conditions, advances
+          recipe stage and adjusts pump rate from that same snapshot.
+        :return: bool - True if recipe still running, False once complete or halted
+        """
+
+        # phase spans and profiling window bracket whole tick
+        self.instrumentation.tick_start()
+        try:
+            running = self._tick()
+            if self.tick_log is not None:
+                self.log_tick()
+        finally:
+            self.instrumentation.tick_end()
+
+        return running
+
+    def _tick(self):
+
+        mp = self.mp
+        self.stage_changed = False
+
+        # read sensors once; all decisions this tick use same readings
+        with self.instrumentation.span('sensors'):
+            snapshot = self.read_sensors()
+
+        # check if recipe done & if experiment and eng controls acceptable
+        if not (mp.current_stage <= mp.len_stages \
+                and vessle_conditions_good(backend=self.backend,
+                                           snapshot=snapshot)):
+
+            self.current_data = snapshot
+            if 'pressure' not in snapshot.stale:
+                self.sensor_data['pressure'].append(snapshot.time, snapshot.pressure)
+            self.status = 'halted'
+
+            return False
+
+        try:
+            self.step(snapshot)
+
+        except StopIteration:
+
+            if self.verbose:
+                print("feed recipe complete")
+            self.status = 'complete'
+
+            return False
+
+        self.ticks += 1
+
+        return True
+
+    def log_tick(self):
+
+        # append tick's readings, setpoint, PID terms and flags to tick log
+        data = self.current_data
+        pid = self.pid
+
+        flags = 0
+        if self.pump_limit_exceeded:
+            flags |= FLAG_LIMIT_HIT
+        if self.stage_changed:
+            flags |= FLAG_TRANSITION
+        if data.stale:
+            flags |= FLAG_STALE
+        if pid.relay is not None:
+            flags |= FLAG_RELAY
+        if self.status == 'halted':
+            flags |= FLAG_HALTED
+
+        # PID terms of latest error sample
+        error = pid.rate_error.last()[1] if len(pid.rate_error) else np.nan
+        K = pid.K
+
+        self.tick_log.append(time=epoch_seconds(data.time),
+                             mass=data.mass,
+                             rate=data.rate,
+                             pressure=data.pressure,
+                             setpoint=np.nan if self.next_rate is None else self.next_rate,
+                             measured=np.nan if self.rate_meas_st is None else self.rate_meas_st,
+                             error=error,
+                             p=K[0]*error,
+                             i=K[1]*pid.total_int,
+                             d=K[2]*pid.derivative,
+                             u=pid.current_u,
+                             stage=self.mp.current_stage,
+                             flags=flags,
+                             valve=data.valve or 0)
+
+    def step(self, snapshot=None):
+
+        """
+        step - advances recipe stage if stop value hit,
+          and adjusts pump rate. Raises StopIteration after last stage.
+        :param snapshot: SensorSnapshot of this tick. If None, sensors are read
+        """
+
+        mp = self.mp
+        instrumentation = self.instrumentation
+
+        # instantiate list index
+        i = mp.current_stage - 1
+
+        # read sensors
+        if snapshot is None:
+            with instrumentation.span('sensors'):
+                snapshot = self.read_sensors()
+        self.current_data = snapshot
+        pressure_check = self.current_data['pressure']
+
+        # print status
+        if self.verbose:
+            with instrumentation.span('verbose'):
+
+                #define units for formatting
+                print_units = {'mass':'g', 'rate':' steps/sec', 'pressure': ' atm', 'valve': ''}
+
+                print_data = dict()
+                # format data for print
+                for k, v in self.current_data.items():
+                    if k != 'time' and k != 'valve':
+                        print_data[k] = str(round(v ,2)) + print_units[k]
+                    elif k=='valve':
+                        print_data[k] = (lambda x: ' open' if 1 else 'close')(v)
+                txt="current sensors data as of {}:"
+                now=self.current_data['time'].strftime("%H:%M:%S")
+                print(txt.format(now))
+                print(print_data)
+     
+        # Store sensor readings; stale sensors only repeat last value, so aren't samples
+        stale = self.current_data.stale
+        if 'pressure' not in stale:
+            self.sensor_data['pressure'].append(self.current_data['time'],
+                                                pressure_check) #atm
+        if 'mass' not in stale:
+            self.sensor_data['scale'].append(self.current_data['time'], # time, epoch (s)
+                                             self.current_data['mass']) #mass, relative (g)
+        if 'rate' not in stale:
+            self.sensor_data['pump'].append(self.current_data['time'], #time, epoch (s)
+                                            self.current_data['rate'])  #pump rate in steps/second
+        if self.trends is not None:
+            if 'mass' not in stale:
+                self.trends['scale'].append(self.current_data['time'], self.current_data['mass'])
+            if 'pressure' not in stale:
+                self.trends['pressure'].append(self.current_data['time'], pressure_check)
+        
+        # if recipe type is linear, readjust pump rate accordingly
+        ramp_rate = None
+        if mp.stop_type == 'rate':
+
+            # convert pump rate and readjust value if physically feasible
+            
+            # adjust pump rate according to recipe if linear
+            # (according to relative increase; e.g. what to add to current rate)
+            #  rate_i_calc => calculated rate from recipe
+
+
+            
+            ms = mp.massprogram[i]
+            del_t = (self.current_data['time'] - ms.t0_stage).total_seconds()
+
+            # ramp setpoint looked up in precomputed trajectory, trimmed by cascade
+            ramp_rate = convert_rate(self.trajectory.stage_setpoint(i, del_t, ms.r0_stage),
+                                     ['m', 's']) #g/s => steps/s
+            self.next_rate = ramp_rate*self.rate_trim
+
+            # PID controller ineffective without emperically-based tuning parameters
+            ## increment pump rate and attenuate wrt engineering controls
+            #self.pump_limit_exceeded = mp.pump(self.next_rate, ['m', 'sec'],
+            #                                   pid=[1,0,0])
+
+        # stop values are in g, g/s or datetime; compare pump rate in g/s too
+        stop_data = self.current_data.with_rate_units(['m', 'sec'])
+
+        # pump attenuated to stop rate counts as hit (unit round trip may leave it an ulp short);
+        #  decreasing ramp to below pump's minimum rate ends once attenuated to that minimum
+        rate_at_stop = False
+        if mp.stop_type == 'rate':
+            stop_rate = mp.stop_value
+            if mp.is_lowerbound:
+                stop_rate = max(stop_rate, pump_rate_limits(['m', 'sec'])[0])
+            rate_at_stop = np.isclose(stop_data['rate'], stop_rate)
+
+        # check if stop target value was hit for given stage       
+        if (stop_data[mp.stop_type] >= mp.stop_value and not mp.is_lowerbound) or \
+            (stop_data[mp.stop_type] <= mp.stop_value and mp.is_lowerbound) or \
+            rate_at_stop: # or self.pump_limit_exceeded DISABLED:
+             # check if pump rate is decreasing or pump stop rate hit
+            
+            # go to next stage in recipe
+            if self.verbose:
+                print("completed stage {}: {} portion of recipe".format(mp.current_stage, mp.feed_type))
+            with instrumentation.span('next_stage'):
+                mp.next_stage(self.current_data)
+            instrumentation.count('stage_transitions')
+            self.stage_changed = True
+
+            # update list index
+            i = mp.current_stage - 1
+
+            #except StopIteration:
+            #    pass
+            # Reset loop vars
+            self.pump_limit_exceeded = False
+            self.rate_trim = 1
+            ramp_rate = None
+
+            # relay autotune only valid around rate of stage it started in
+            self.pid.relay = None
+
+            # update pump rate to new recipe stage rate if type=timed
+            if mp.feed_type == 'timed':
+
+                # Retrieve constant coefficient (e.g. b in y=mx+b)
+                self.next_rate = mp.coeff[1]
+                # Attenuate recipe value
+                self.pump_limit_exceeded = self.write_pump(self.next_rate,
+                                                           ['m', 'sec'], #g/sec
+                                                           pid =[1,0,0]) 
+
+        # emperically-determined pump rate based on measured mass change of scale per unit time
+        #  (not updated while scale or pump reading is stale)
+        fresh = not stale & {'mass', 'rate'}
+        with instrumentation.span('derivative'):
+            self.rate_meas = derivative(self.sensor_data['scale'].window(2)) \
+                             if fresh else None #just need last two points
+
+        
+        # if derivative exists
+        self.rate_meas_st = None
+        if self.rate_meas:
+            
+            # make units consistent with comparison values
+            rate_meas_st = -1*convert_rate(rate=self.rate_meas, units_num=['m', 's'])
+            self.rate_meas_st = rate_meas_st
+
+            # store scale-measured pump rate
+            self.measured_data['pump'].append(self.sensor_data['scale'][-1][0], #time
+                                              rate_meas_st)
+
+            with instrumentation.span('control'):
+
+                if self.pid.relay is not None:
+
+                    # relay autotune: switch pump between two rates from measured rate
+                    self.next_rate = self.pid.relay_update(self.current_data['time'],
+                                                           rate_meas_st)
+
+                elif len(self.measured_data['pump']) > 3:
+
+                   # PID ineffecive without emperical data. Using simplified cascade (mp.simple_control_var)
+                   ## determine PID correction based on error rate          
+                   ##self.next_rate = self.pid.control_var(self.measured_data['pump'],
+                   #                                       self.sensor_data['pump'])
+
+                   # determine PID correction based on error rate          
+                   rate_0 = self.backend.pump()
+                   self.pid.simple_control_var(self.measured_data['pump'],
+                                               self.sensor_data['pump'])
+                   rate_1 = self.backend.pump()
+
+                   if ramp_rate is None:
+                       self.next_rate = rate_1/60
+                   elif rate_0 > 0 and rate_1 > 0:
+                       # linear stage keeps ramp setpoint; correction accumulates in trim
+                       self.rate_trim *= rate_1/rate_0
+                       self.next_rate = ramp_rate*self.rate_trim
+               
+        # update pump rate; check if pump engineering limit exceeded
+        self.pump_limit_exceeded = self.write_pump(self.next_rate, ['s', 'sec'])
+
+    def stop(self):
+
+        # End feed
+        self.backend.valve(0)
+        self.backend.pump(0)
@@ -0,0 +1,242 @@
+import numpy as np
+from collections import namedtuple
+from lib.utils import *
+from mech.actuator import MOCK_DEFAULTS
+from mech.equipment import attenuate_pump_rates, pump_rate_limits
+from classes.trajectory import stage_table, BOLUS, TIMED, LINEAR
+from classes.fleet import FleetSimulator
+
+"""
+Dry-run of recipes before they are loaded onto vessel.
+Predicts recipe duration, feed consumed and stages where pump rate is
+attenuated to MAX_PUMP_RATE/MIN_PUMP_RATE by attenuate_pump_rate.
+Ideal pump is solved in closed form; plant dynamics (pump lag, PID)
+fall back to virtual-time stepping with FleetSimulator.
+"""
+
+DryRunResult = namedtuple('DryRunResult',
+                          ['duration',      # s; inf if a stage never ends
+                           'mass_consumed', # g of feed used (up to stuck stage)
+                           'limit_hits',    # tuple of (stage, 'MAX_PUMP_RATE'/'MIN_PUMP_RATE')
+                           'completes',     # bool - every stage reaches its stop value
+                           'stuck_stage',   # stage (1-based) that never ends, else None
+                           'enough_feed',   # bool - initial mass covers mass consumed
+                           'method'])       # 'analytic' or 'stepped'
+
+# order of limits in FleetSimulator.stage_limit_hits
+LIMIT_NAMES = ('MAX_PUMP_RATE', 'MIN_PUMP_RATE')
+
+# pump engineering limits in g/s
+_MIN_RATE, _MAX_RATE = pump_rate_limits(['m', 'sec'])
+_DEFAULT_RATE = convert_rate(DEFAULT_PUMP_RATE, ['s', 'm'])
+
+
+def _attenuate(rate):
+
+    # rate attenuated to engineering limits (g/s), and name of limit hit, if any
+    rate, too_slow, too_fast = attenuate_pump_rates(rate, ['m', 'sec'])
+    limit = 'MIN_PUMP_RATE' if too_slow else 'MAX_PUMP_RATE' if too_fast else None
+
+    return float(rate), limit
+
+
+def _ramp_stop_time(r0, inc, stop_rate):
+
+    """
+    _ramp_stop_time - seconds until attenuated ramp r0 + inc*t hits stop rate.
+      Stop check follows live loop: measured (attenuated) pump rate >= stop rate,
+      or <= stop rate if ramp decreasing (is_lowerbound)
+    :return: float - seconds; inf if stop rate never hit
+    """
+
+    if inc < 0:
+
+        # attenuated rate <= stop rate; stop rate below pump minimum
+        #  is hit once rate attenuated to minimum
+        if stop_rate >= _MAX_RATE:
+            return 0.0
+
+        return max((max(stop_rate, _MIN_RATE) - r0)/inc, 0.0)
+
+    # attenuated rate >= stop rate
+    if stop_rate <= 0:
+        return 0.0
+    elif stop_rate <= _MIN_RATE:
+        threshold = 0.0
+    elif stop_rate <= _MAX_RATE:
+        threshold = stop_rate
+    else:
+        return np.inf
+
+    if r0 >= threshold:
+        return 0.0
+    if inc == 0:
+        return np.inf
+
+    return (threshold - r0)/inc
+
+
+def _ramp_mass(r0, inc, duration):
+
+    """
+    _ramp_mass - feed delivered by attenuated ramp r0 + inc*t over duration,
+      integrated piecewise between crossings of 0, MIN and MAX pump rates
+    :return: float - grams
+    """
+
+    if inc == 0:
+        return _attenuate(r0)[0]*duration
+
+    # times setpoint crosses attenuation boundaries
+    breaks = [0.0, duration]
+    for level in (0.0, _MIN_RATE, _MAX_RATE):
+        t = (level - r0)/inc
+        if 0 < t < duration:
+            breaks.append(t)
+    breaks.sort()
+
+    mass = 0.0
+    for t_a, t_b in zip(breaks[:-1], breaks[1:]):
+
+        # setpoint within limits: trapezoid; else attenuated rate is constant
+        s_a, s_b = r0 + inc*t_a, r0 + inc*t_b
+        s_mid = 0.5*(s_a + s_b)
+        if _MIN_RATE <= s_mid <= _MAX_RATE:
+            mass += s_mid*(t_b - t_a)
+        else:
+            mass += _attenuate(s_mid)[0]*(t_b - t_a)
+
+    return mass
+
+
+def dry_run_table(table, initial_mass=MOCK_DEFAULTS['SCALE']):
+
+    """
+    dry_run_table - closed form dry-run of ideal pump through stage table.
+      Continuous time; live loop runs each stage up to one tick longer.
+
+    :param table: np.ndarray (n_stages, 4) - output of stage_table()
+    :param initial_mass: float - scale reading at recipe start (g)
+    :return: DryRunResult
+    """
+
+    duration = 0.0
+    mass = 0.0
+    hits = list()
+    stuck_stage = None
+    rate_in = _DEFAULT_RATE # rate carried into first stage (g/s)
+
+    for i, (kind, rate, inc, stop_value) in enumerate(table.tolist()):
+
+        stage = i + 1
+
+        if kind == TIMED:
+            rate_in, limit = _attenuate(rate)
+            d = stop_value
+            fed = rate_in*d
+
+        elif kind == BOLUS:
+            rate_in, limit = _attenuate(rate_in)
+            d = stop_value/rate_in if rate_in > 0 else np.inf
+            fed = stop_value
+
+        else:
+            d = _ramp_stop_time(rate_in, inc, stop_value)
+            if np.isinf(d):
+                # ramp runs on forever, eventually into pump limit
+                limit = _attenuate(rate_in)[1]
+                if inc > 0:
+                    limit = limit or 'MAX_PUMP_RATE'
+                elif inc < 0:
+                    limit = limit or 'MIN_PUMP_RATE'
+                fed = 0.0
+            else:
+                rate_out = rate_in + inc*d
+                limit = _attenuate(rate_in)[1]
+                fed = _ramp_mass(rate_in, inc, d)
+                rate_in, limit_out = _attenuate(rate_out)
+                limit = limit or limit_out
+                if inc < 0 and stop_value < _MIN_RATE:
+                    limit = limit or 'MIN_PUMP_RATE'
+
+        if limit:
+            hits.append((stage, limit))
+
+        if np.isinf(d):
+            stuck_stage = stage
+            duration = np.inf
+            break
+
+        duration += d
+        mass += fed
+
+    result = DryRunResult(duration=duration,
+                          mass_consumed=mass,
+                          limit_hits=tuple(hits),
+                          completes=stuck_stage is None,
+                          stuck_stage=stuck_stage,
+                          enough_feed=mass <= initial_mass,
+                          method='analytic')
+
+    return result
+
+
+def dry_run(recipe, initial_mass=MOCK_DEFAULTS['SCALE'], pump_lag=0,
+            use_pid=False, dt=PID_ADJUSTMENT_INCREMENT, max_duration=86400):
+
+    """
+    dry_run - predicts recipe duration, feed required and engineering limit hits
+      without running pump
+
+    :param recipe: dict - recipe (see main.main for format)
+    :param initial_mass: float - scale reading at recipe start (g)
+    :param pump_lag: float - pump time constant (s); > 0 requires stepping
+    :param use_pid: bool - include PID correction; requires stepping
+    :param dt: float - simulated seconds per tick when stepping
+    :param max_duration: float - simulated seconds before stepping gives up
+    :return: DryRunResult
+    """
+
+    if pump_lag > 0 or use_pid:
+        return dry_run_many([recipe], initial_mass, pump_lag, use_pid,
+                            dt, max_duration)[0]
+
+    return dry_run_table(stage_table(recipe), initial_mass)
+
+
+def dry_run_many(recipes, initial_mass=MOCK_DEFAULTS['SCALE'], pump_lag=0,
+                 use_pid=False, dt=PID_ADJUSTMENT_INCREMENT, max_duration=86400):
+
+    """
+    dry_run_many - dry-runs list of recipes. Closed form for ideal pump;
+      otherwise all recipes step together in single FleetSimulator (virtual time)
+
+    :param recipes: list of recipe dicts
+    :return: list of DryRunResult, one per recipe
+    """
+
+    if not (pump_lag > 0 or use_pid):
+        return [dry_run_table(stage_table(recipe), initial_mass) for recipe in recipes]
+
+    fleet = FleetSimulator(list(recipes), dt=dt, initial_mass=initial_mass,
+                           use_pid=use_pid, pump_lag=pump_lag)
+    fleet.run(max_ticks=int(np.ceil(max_duration/dt)))
+
+    results = list()
+    for r in range(fleet.n):
+
+        stages, kinds = np.nonzero(fleet.stage_limit_hits[r])
+        hits = tuple((int(s) + 1, LIMIT_NAMES[k]) for s, k in zip(stages, kinds))
+        completes = bool(fleet.done[r] and not fleet.failed[r])
+        stuck_stage = None if completes else int(fleet.stage[r]) + 1
+
+        results.append(DryRunResult(duration=float(np.nanmax(fleet.stage_end_t[r], initial=0))
+                                             if completes else np.inf,
+                                    mass_consumed=float(initial_mass - fleet.mass[r]),
+                                    limit_hits=hits,
+                                    completes=completes,
+                                    stuck_stage=stuck_stage,
+                                    enough_feed=bool(fleet.mass[r] >= 0),
+                                    method='stepped'))
+
+    return results
@@ -0,0 +1,260 @@
+import numpy as np
+from lib.utils import *
+from mech.actuator import MOCK_DEFAULTS
+from mech.equipment import max_pressure, attenuate_pump_rates, pump_rate_limits
+from classes.trajectory import stage_table, FEED_TYPE_CODES, BOLUS, TIMED, LINEAR
+
+"""
+Vectorized simulation of many reactors at once.
+State of every reactor (pump rate, scale mass, pressure, stage, PID terms)
+lives in NumPy arrays and all reactors advance in single update per tick.
+"""
+
+
+class FleetSimulator:
+
+    """
+    Struct-of-arrays simulator stepping thousands of reactors per vectorized tick.
+      Stage semantics follow MassSegment.calculate_bolus/timed/linear:
+        bolus - constant rate carried over from previous stage until net mass fed
+        timed - constant recipe rate until duration elapsed
+        linear - rate ramps from previous stage rate until stop rate hit
+      First stage starts from DEFAULT_PUMP_RATE when rate is carried over.
+    """
+
+    def __init__(self, recipes, n=None, dt=PID_ADJUSTMENT_INCREMENT,
+                 initial_mass=MOCK_DEFAULTS['SCALE'], K=DEFAULT_K,
+                 derivative_filter=PID_DERIVATIVE_FILTER, use_pid=False,
+                 pump_lag=0, pressure_rise=0, plant=None):
+
+        """
+        :param recipes: dict - single recipe run by all n reactors,
+                        or list of recipe dicts, one per reactor
+        :param n: int - number of reactors if single recipe given
+        :param dt: float - simulated seconds per tick
+        :param initial_mass: float or array - initial scale reading of each reactor (g)
+        :param K: PID coefficients [k_p, k_i, k_d]
+        :param use_pid: bool - if True, PID correction u(t) is added to pump rate
+        :param pump_lag: float - time constant (s) of delivered rate following pump setting
+        :param pressure_rise: float - vessle pressure increase per tick (atm)
+                              (mock pressure sensor adds 0.01 atm per read)
+        :param plant: mech.plant.FOPDTPlant of n reactors. If given, it replaces
+                      pump_lag/pressure_rise: delivered rate, scale readings and
+                      pressure come from plant (dead time, lag, noise, quantization)
+        """
+
+        if isinstance(recipes, dict):
+            recipes = [recipes]*(n or 1)
+        self.n = len(recipes)
+        self.dt = dt
+        self.K = np.asarray(K, dtype=np.float64)
+        self.derivative_filter = derivative_filter
+        self.use_pid = use_pid
+        self.pump_lag = pump_lag
+        self.pressure_rise = pressure_rise
+        self.plant = plant
+        self.max_pressure = max_pressure()
+
+        # rate carried into first stage (g/s)
+        self.default_rate = convert_rate(DEFAULT_PUMP_RATE, ['s', 'm'])
+
+        # Build stage tables; identical recipe objects compiled once
+        tables = dict()
+        for recipe in recipes:
+            if id(recipe) not in tables:
+                tables[id(recipe)] = stage_table(recipe)
+        n_stages = [tables[id(recipe)].shape[0] for recipe in recipes]
+        max_stages = max(n_stages) if n_stages else 0
+
+        self.n_stages = np.array(n_stages, dtype=np.int64)
+        self.kind = np.full((self.n, max_stages), -1, dtype=np.int64)
+        self.start_rate = np.full((self.n, max_stages), np.nan)
+        self.inc_table = np.zeros((self.n, max_stages))
+        self.stop_table = np.full((self.n, max_stages), np.nan)
+        for r, recipe in enumerate(recipes):
+            table = tables[id(recipe)]
+            k = table.shape[0]
+            self.kind[r, :k] = table[:, 0]
+            self.start_rate[r, :k] = table[:, 1]
+            self.inc_table[r, :k] = table[:, 2]
+            self.stop_table[r, :k] = table[:, 3]
+
+        # time at end of each stage (s); NaN until stage completes
+        self.stage_end_t = np.full((self.n, max_stages), np.nan)
+
+        # Reactor state
+        self.t = 0.0 # simulated time (s)
+        self.ticks = 0
+        self.stage = np.zeros(self.n, dtype=np.int64) # current stage index
+        self.mass = np.full(self.n, initial_mass, dtype=np.float64) # scale reading (g)
+        self.pressure = np.full(self.n, MOCK_DEFAULTS['PRESSURE'], dtype=np.float64) # atm
+        if plant is not None:
+            self.mass = plant.read_scale()
+            self.pressure = np.array(plant.pressure)
+        self.rate = np.zeros(self.n) # pump setting (g/s)
+        self.delivered = np.zeros(self.n) # rate actually leaving feed (g/s)
+        self.done = self.n_stages == 0
+        self.failed = np.zeros(self.n, dtype=bool) # out of feed or over pressure
+
+        # Current stage coefficients & boundaries
+        self.t0 = np.zeros(self.n)
+        self.m0 = np.array(self.mass)
+        self.r0 = np.zeros(self.n)
+        self.inc = np.zeros(self.n)
+        self.stop_value = np.full(self.n, np.nan)
+        self.is_lowerbound = np.zeros(self.n, dtype=bool)
+
+        # PID state
+        self.total_int = np.zeros(self.n)
+        self.last_error = np.zeros(self.n)
+        self.derivative = np.zeros(self.n)
+        self.current_u = np.zeros(self.n)
+
+        # counters
+        self.limit_hits = np.zeros(self.n, dtype=np.int64)
+        # ticks attenuated per stage to [MAX_PUMP_RATE, MIN_PUMP_RATE]
+        self.stage_limit_hits = np.zeros((self.n, max_stages, 2), dtype=np.int64)
+        self.transitions = 0
+
+        self._start_stage(~self.done)
+        self.rate[:] = np.where(self.done, 0, self.r0)
+
+    def _start_stage(self, mask):
+
+        # initialize stage coefficients of reactors in mask from current conditions
+        idx = np.nonzero(mask)[0]
+        s = self.stage[idx]
+        kind = self.kind[idx, s]
+
+        # start rate: recipe rate, else carried over (default rate for first stage)
+        carried = np.where(s == 0, self.default_rate, self.rate[idx])
+        rate_param = self.start_rate[idx, s]
+        self.r0[idx] = np.where(np.isnan(rate_param), carried, rate_param)
+
+        self.t0[idx] = self.t
+        self.m0[idx] = self.mass[idx]
+        self.inc[idx] = self.inc_table[idx, s]
+        self.stop_value[idx] = self.stop_table[idx, s]
+
+        # bolus subtracts from scale; linear decreasing if rate increase < 0
+        lowerbound = np.where(kind == BOLUS, True,
+                              np.where(kind == LINEAR, self.inc[idx] < 0,
+                                       False))
+        self.is_lowerbound[idx] = lowerbound
+
+    def setpoint(self):
+
+        # recipe pump rate of current stage, y = mx + b (g/s)
+        return self.r0 + self.inc*(self.t - self.t0)
+
+    def step(self):
+
+        """
+        step - advances all reactors by one tick:
+          stage transitions, pump rate setting, PID update and plant update
+        :return: bool - True while any reactor is still running
+        """
+
+        active = ~self.done
+        setpoint = self.setpoint()
+
+        # check if stop target value was hit for each reactor's stage
+        s = np.minimum(self.stage, max(self.kind.shape[1] - 1, 0))
+        kind = self.kind[np.arange(self.n), s]
+        stop_bolus = (kind == BOLUS) & (self.mass <= self.m0 - self.stop_value)
+        stop_timed = (kind == TIMED) & (self.t - self.t0 >= self.stop_value)
+
+        # linear stop follows live loop: attenuated pump rate against stop rate,
+        #  decreasing ramp to below pump's minimum rate ends once attenuated to that minimum
+        limited = attenuate_pump_rates(setpoint, ['m', 'sec'])[0]
+        stop_rate = np.where(self.is_lowerbound,
+                             np.maximum(self.stop_value, pump_rate_limits(['m', 'sec'])[0]),
+                             self.stop_value)
+        stop_linear = (kind == LINEAR) & \
+                      (((limited >= self.stop_value) & ~self.is_lowerbound) |
+                       ((limited <= self.stop_value) & self.is_lowerbound) |
+                       np.isclose(limited, stop_rate))
+        stopped = active & (stop_bolus | stop_timed | stop_linear)
+
+        if np.any(stopped):
+
+            # go to next stage in recipe
+            idx = np.nonzero(stopped)[0]
+            self.stage_end_t[idx, self.stage[idx]] = self.t
+            self.stage[idx] += 1
+            self.transitions += idx.size
+
+            finished = stopped & (self.stage >= self.n_stages)
+            self.done |= finished
+            self._start_stage(stopped & ~finished)
+            setpoint = self.setpoint()
+
+        active = ~self.done
+
+        # PID error between recipe rate and delivered rate
+        error = setpoint - self.delivered
+        if self.ticks:
+            self.total_int += 0.5*(error + self.last_error)*self.dt
+            d_error = (error - self.last_error)/self.dt
+            self.derivative += self.derivative_filter*(d_error - self.derivative)
+        self.last_error = error
+        self.current_u = self.K[0]*error + self.K[1]*self.total_int + \
+                         self.K[2]*self.derivative
+
+        rate = setpoint + self.current_u if self.use_pid else setpoint
+
+        # attenuate pump rate to engineering limits
+        rate, too_slow, too_fast = attenuate_pump_rates(rate, ['m', 'sec'])
+        self.limit_hits += active & (too_slow | too_fast)
+        for k, hit in enumerate((too_fast, too_slow)):
+            idx = np.nonzero(active & hit)[0]
+            self.stage_limit_hits[idx, self.stage[idx], k] += 1
+        self.rate = np.where(active, rate, 0)
+
+        if self.plant is not None:
+
+            # FOPDT plant model of every reactor
+            self.plant.advance(self.dt, self.rate)
+            self.delivered = np.array(self.plant.delivered)
+            self.mass = self.plant.read_scale()
+            self.pressure = np.array(self.plant.pressure)
+
+        else:
+
+            # plant: delivered rate follows pump setting with first order lag
+            if self.pump_lag > 0:
+                alpha = 1 - np.exp(-self.dt/self.pump_lag)
+                self.delivered += alpha*(self.rate - self.delivered)
+            else:
+                self.delivered = np.array(self.rate)
+
+            self.mass -= self.delivered*self.dt
+            self.pressure += np.where(active, self.pressure_rise, 0)
+
+        # out of feed or over pressure halts reactor
+        failed = active & ((self.mass < -1) | (self.pressure >= self.max_pressure))
+        self.failed |= failed
+        self.done |= failed
+        self.rate[failed] = 0
+        self.delivered[failed] = 0
+
+        self.t += self.dt
+        self.ticks += 1
+
+        return not np.all(self.done)
+
+    def run(self, max_ticks=None):
+
+        """
+        run - steps until every reactor finished its recipe (or max_ticks reached)
+        :return: int - number of ticks run
+        """
+
+        ticks = 0
+        while not np.all(self.done):
+            if max_ticks is not None and ticks >= max_ticks:
+                break
+            self.step()
+            ticks += 1
+
+        return ticks
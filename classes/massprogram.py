@@ -5,7 +5,8 @@
 from classes.recipe_coefficients import MassSegment
 from classes.pid import PID
 from mech.equipment import *
-from mech.actuator import pump, valve, pressure
+from mech.actuator import pump, valve, pressure, DEFAULT_BACKEND
+from lib.clock import SYSTEM_CLOCK
 
 
 class MassProgram:
@@ -14,7 +15,7 @@ class MassProgram:
     Defines recipe object in terms of mass transfer rate of individuals stages
     """
      
-    def __init__(self, recipe):
+    def __init__(self, recipe, clock=SYSTEM_CLOCK, backend=DEFAULT_BACKEND):
 
         # Instantiate recipe
         self.recipe = dict()
@@ -44,6 +45,15 @@ class MassProgram:
 
         # number of stages
         self.len_stages = len(recipe)
+
+        # clock used for stage start times
+        self.clock = clock
+
+        # devices of reactor running recipe
+        self.backend = backend
+
+        # PID coefficients used by pump() corrections (created once, not per call)
+        self.pid = PID(backend=backend)
         
         # Populate recipe with newly-generated recipe stage
         for stage, segment in recipe.items():
@@ -71,6 +81,15 @@ class MassProgram:
 
     def __next__(self):
 
+        self.next_stage()
+
+    def next_stage(self, snapshot=None):
+
+        """
+        next_stage - advances to next recipe stage and calculates its run coefficients
+        :param snapshot: SensorSnapshot - stage start conditions. If None, sensors are read
+        """
+
         if self.current_stage < len(self.massprogram):
             self.ms = self.massprogram[self.current_stage]
         else:
@@ -84,7 +103,9 @@ class MassProgram:
         self.stop_type = self.ms.stop_type
 
         # get stage start conditions
-        current_data = current_readings(rate_units=['m','sec'])
+        if snapshot is None:
+            snapshot = acquire_snapshot(self.clock, self.backend)
+        current_data = snapshot.with_rate_units(['m','sec'])
 
         # Calculate run parameters based on current system run conditions
         if self.ms.feed_type=='bolus':
@@ -117,10 +138,6 @@ class MassProgram:
                 'm' = mass (g), 's' = steps, 'v'=volume, 'sec'=seconds, 'min'=minute
         """
 
-        #Insantiate PID object
-        _pid=PID()
-
-
         # convert stop_rate to same units
         if self.stop_type=='rate':
             stop_value_st = convert_rate(rate=self.stop_value, #g/s => steps/s
@@ -133,7 +150,7 @@ class MassProgram:
 
             # multiply rate increase by proportionality pid constant
             #  to preemptively offset error in rate adjustment
-            rate*= _pid.K[pid] # Not sure if this is valid use of k_p coefficient
+            rate*= self.pid.K[pid] # Not sure if this is valid use of k_p coefficient
             rate=sum(rate)
 
         # add calculated pump rate increase to current emperical rate
@@ -159,7 +176,7 @@ class MassProgram:
                                        units_den=['sec', 'min'])
 
         # update pump rate according to (corrected) mass program
-        pump_return=pump(adj_rate_st_min)
+        pump_return=self.backend.pump(adj_rate_st_min)
 
         return pump_limit_exceeded
 
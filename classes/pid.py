@@ -1,6 +1,7 @@
-from mech.actuator import tune, pump
+from mech.actuator import tune, pump, DEFAULT_BACKEND
 from lib.utils import *
-from lib.utils import integral, derivative
+from lib.telemetry import TelemetryBuffer
+from classes.autotune import autotune, ziegler_nichols
 
 #TODO: fix buggy control loop logic
 
@@ -12,91 +13,240 @@ class PID:
 
     """
 
-    def __init__(self, K=DEFAULT_K):
+    def __init__(self, K=DEFAULT_K, derivative_filter=PID_DERIVATIVE_FILTER,
+                 backend=DEFAULT_BACKEND):
 
         self.K = K #3-membered list: proportional integral and derivative K's
         self.current_u = 0       #u(t_0)
-        self.rate_error = list() #e(t)
+        self.rate_error = TelemetryBuffer(PID_ERROR_HISTORY) #e(t), most recent only
         self.sensor_data = list()
         self.derivatives = list() # de(t)/dt
-        self.derivative= 0
+        self.derivative_filter = derivative_filter
+        self.backend = backend # devices of reactor being controlled
+        self.tune_result = None # classes.autotune.TuneResult of last auto-tune
+        self.relay = None # relay autotune state while running
+        self.relay_result = None # ultimate gain/period and K from last relay autotune
+
+        # streaming state, updated in O(1) per error sample
+        self.derivative= 0 # filtered de(t)/dt
+        self.current_derivative = 0 # unfiltered de(t)/dt of last segment
         self.total_int=0 #cumulative integral
+        self.last_t = None # time of last error sample (s)
+        self.last_error = None # last error sample
+        self.batch_seen = 0 # history points already folded in by batch mode
 
      #Confirm sensor_data and measured_data lists auto-update
 
-    def tune(self):
+    def tune(self, plant=None, **kwargs):
 
-        # Tune system to calculate PID parameters
+        """
+        tune - calculates PID parameters
+        :param plant: dict - plant model (see classes.autotune.PLANT_DEFAULTS),
+                      or mech.plant.PlantBackend. If given, K is auto-tuned offline against model;
+                      otherwise reactor backend's tuning is used
+        :param kwargs: passed to classes.autotune.autotune (candidates, weights, processes...)
+        :return: np.ndarray - K = [k_p, k_i, k_d]
+        """
 
-        self.K = tune()
+        if plant is None:
+            self.K = self.backend.tune()
+        else:
+            self.tune_result = autotune(plant, **kwargs)
+            self.K = self.tune_result.K
 
         return self.K
 
+    def start_relay(self, center, amplitude, cycles=RELAY_CYCLES, hysteresis=0):
+
+        """
+        start_relay - starts relay feedback (Astrom-Hagglund) autotune.
+          Pump rate is switched between center +/- amplitude each time measured
+          rate crosses center, making loop oscillate at its ultimate period.
+
+        :param center: float - pump rate oscillated around (e.g. stage rate)
+        :param amplitude: float - relay swing, same units as center
+        :param cycles: int - oscillations to measure; first one is discarded
+        :param hysteresis: float - error band ignored when switching (noise immunity)
+        """
+
+        self.relay = {'center': center,
+                      'amplitude': amplitude,
+                      'cycles': cycles,
+                      'hysteresis': hysteresis,
+                      'high': True,        # relay state
+                      't_switch': None,    # time of last switch to high
+                      'y_max': -np.inf,    # extremes of current cycle
+                      'y_min': np.inf,
+                      'periods': list(),
+                      'amplitudes': list()}
+
+    def relay_update(self, t, process):
+
+        """
+        relay_update - single relay autotune tick. O(1) per call.
+          Once enough cycles are measured, K is derived from ultimate gain
+          Ku = 4d/(pi*a) and period Tu (Ziegler-Nichols) and relay stops.
+
+        :param t: float or datetime - time of measurement
+        :param process: float - measured rate (e.g. scale-derived pump rate)
+        :return: float - pump rate to apply (e.g. via MassProgram.pump);
+                 center rate once autotune finished
+        """
+
+        relay = self.relay
+        if relay is None:
+            return None
+
+        t = epoch_seconds(t)
+        error = relay['center'] - process
+
+        # track extremes of oscillation
+        relay['y_max'] = max(relay['y_max'], process)
+        relay['y_min'] = min(relay['y_min'], process)
+
+        # switch low when measured rate above center, high when below
+        if relay['high'] and error < -relay['hysteresis']:
+            relay['high'] = False
+
+        elif not relay['high'] and error > relay['hysteresis']:
+            relay['high'] = True
+
+            # switch to high closes cycle
+            if relay['t_switch'] is not None:
+                relay['periods'].append(t - relay['t_switch'])
+                relay['amplitudes'].append(0.5*(relay['y_max'] - relay['y_min']))
+            relay['t_switch'] = t
+            relay['y_max'], relay['y_min'] = -np.inf, np.inf
+
+            if len(relay['periods']) > relay['cycles'] - 1:
+                return self._finish_relay()
+
+        if relay['high']:
+            return relay['center'] + relay['amplitude']
+
+        return relay['center'] - relay['amplitude']
+
+    def _finish_relay(self):
+
+        # derive K from measured oscillation (first cycle discarded as transient)
+        relay = self.relay
+        Tu = float(np.mean(relay['periods'][1:]))
+        a = float(np.mean(relay['amplitudes'][1:]))
+
+        if a > 0:
+            Ku = 4*relay['amplitude']/(np.pi*a)
+            self.K = ziegler_nichols(Ku, Tu)
+            self.relay_result = {'Ku': Ku, 'Tu': Tu, 'K': self.K}
+
+        self.relay = None
+
+        return relay['center']
+
+    def reset(self):
+
+        # Clear streaming state, e.g. at start of new run
+        self.derivative = 0
+        self.current_derivative = 0
+        self.total_int = 0
+        self.last_t = None
+        self.last_error = None
+        self.batch_seen = 0
+        self.current_u = 0
+
+    def update(self, t, error):
+
+        """
+        update - streaming PID step. Folds single error sample into running
+          integral and filtered derivative with scalar arithmetic only.
+
+        :param t: float - time of error sample (s)
+        :param error: float - e(t), setpoint minus process value
+        :return: float u(t), or None if no previous sample to difference against
+        """
+
+        u_0 = None
+
+        if self.last_t is not None:
+
+            dt = t - self.last_t
+
+            # skip integral & derivative update for repeated/out of order times
+            if dt > 0:
+
+                # trapezoidal integral of latest segment
+                self.total_int += 0.5*(error + self.last_error)*dt
+
+                # low-pass filtered derivative of latest segment
+                self.current_derivative = (error - self.last_error)/dt
+                self.derivative += self.derivative_filter * \
+                                   (self.current_derivative - self.derivative)
+
+            # Calculate PID control variable
+            u_0 = error*self.K[0] + \
+                  self.total_int*self.K[1] + \
+                  self.derivative*self.K[2]
+
+            # Update current u(t) value
+            self.current_u = u_0
+
+        self.last_t = t
+        self.last_error = error
+
+        return u_0
+
     def control_var(self, setpoint, process, continuous=True):
 
         """
         control_var - provides adjusted pumprate based on u(t),
-           where u(t) = k_p*e(t) + k_i*e(t) + k_d*e(t),
+           where u(t) = k_p*e(t) + k_i*int(e(t)) + k_d*de(t)/dt,
            with e(t) being the error between the set point and measured point
             (e.g. pump rate set by pump() vs. scale mass-transfer rate),
             and k_p, k_i, k_d being PID coefficients from system tuning
 
-        :param setpoint: list of tups [(t_i, x_i)] - expected setpoint values
-        :param process: list of tups [(t_i, x_i)]  - measured setpoint values
+        :param setpoint: list of tups [(t_i, x_i)] or TelemetryBuffer - expected setpoint values
+        :param process: list of tups [(t_i, x_i)] or TelemetryBuffer - measured setpoint values
+        :param continuous: bool - if True, only most recent point is folded into PID state.
+                           if False, every point of history not yet seen is folded in
+                           (only new points are processed on repeated calls)
         :return: set_rate0 modified set rate based on u(t)
         """
 
         # get most recent values
         setrate_0 = setpoint[-1:][0][1] 
         processrate_0 = process[-1:][0][1]
+        t_0 = epoch_seconds(setpoint[-1:][0][0])
 
         # calculate error between scale-measured grams/s pump rate (in steps/s)
         #   vs. pump sensor speed rate(steps/s)
         rate_error_0 = setrate_0 - processrate_0
-        self.rate_error.append((setpoint[-1:][0][0],
-                                rate_error_0))
+        self.rate_error.append(t_0, rate_error_0)
 
         if continuous:
-        # process update every second
-            
-            if len(self.rate_error) >= 2:
-                # Calculate integral & derivative of most recent points.
-                # Add integral to previous sum to avoid recalculating points
-                self.total_int +=integral(self.rate_error[-2:])
-                self.current_derivative = derivative(self.rate_error[-2:])
-                
-                # Calculate PID control variable
-                u_0 =  rate_error_0*self.K[0] + \
-                       self.current_derivative * self.K[1] + \
-                       self.total_int * self.K[2]
-
-                # Update current u(t) value
-                self.current_u = u_0
-
-                # update pump rate according to u_i value
-                setrate_0+=u_0 #?Not sure how to use u_0 here - is it additive?
+            # process update every second
+            u_0 = self.update(t_0, rate_error_0)
 
         else:
             # batch process error corrections
-            setpoint_arr = np.array(setpoint)
-            process_arr = np.array(process)
-            error_arr = setpoint_arr[:,1] - process_arr[:,1]
-        
-            error_ls = list(zip(setpoint_arr[:,0],error_arr))
-
-            if len(error_ls) >= 2:
-                # Calculate integral & derivative of entire data set
-                inte = integral(error_ls)
-                d_0 = derivative(error_ls)
-                u_0 = rate_error_0 * self.K[0] + \
-                        d_0 * self.K[1] + \
-                        inte * self.K[2]
-
-                # Update current u(t) value
-                self.current_u = u_0
-                
-                # update pump rate according to u_i value
-                setrate_0+=u_0 #?Not sure how to use u_0 here - is it additive?
+
+            # count samples ever appended; full ring buffers keep constant length
+            n = len(setpoint)
+            total = getattr(setpoint, 'total', n)
+
+            # start over if history is shorter than what was already processed
+            if total < self.batch_seen:
+                self.reset()
+
+            # fold in points not yet seen
+            u_0 = None
+            new = min(total - self.batch_seen, n)
+            for j in range(n - new, n):
+                t_j = epoch_seconds(setpoint[j][0])
+                u_0 = self.update(t_j, setpoint[j][1] - process[j][1])
+            self.batch_seen = total
+
+        if u_0 is not None:
+            # update pump rate according to u_i value
+            setrate_0+=u_0 #?Not sure how to use u_0 here - is it additive?
 
         return setrate_0
 
@@ -114,12 +264,12 @@ class PID:
 
         rate_error_i = setpoint[-1:][0][1] - process[-1:][0][1]
         t_f = setpoint[-1:][0][0]
-        self.rate_error.append((t_f, rate_error_i))
+        self.rate_error.append(t_f, rate_error_i)
 
         if rate_error_i > 0:
             # increase pump if too slow                     
-            pump('f')
+            self.backend.pump('f')
 
         elif rate_error_i < 0:
             # decrease pump if too fast
-            pump('s')
+            self.backend.pump('s')
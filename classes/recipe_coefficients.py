@@ -45,6 +45,50 @@ class MassSegment:
         self.coefficients = None
 
 
+    def stage_parameters(self):
+
+        """
+        stage_parameters - recipe stage parameters converted to runtime units.
+          Independent of run conditions, so can be shared with simulators.
+
+        :return: dict - 'rate': start pump rate (g/s); None if carried over
+                                 from previous stage (or default rate if first stage)
+                        'inc_rate': pump rate increase (g/s^2)
+                        'stop_value': net mass (g) for bolus,
+                                      duration (s) for timed,
+                                      end pump rate (g/s) for linear
+        """
+
+        params = {'rate': None, 'inc_rate': 0, 'stop_value': None}
+
+        if self.feed_type == 'bolus':
+
+            # net mass to transfer (grams)
+            params['stop_value'] = self.stop_parameters['stop_value']
+
+        elif self.feed_type == 'timed':
+
+            # Convert rate to g/s
+            params['rate'] = convert_rate(self.start_parameters['rate'],
+                                          ['v','m'],
+                                          ['min', 'sec'])
+            # Convert duration to seconds
+            params['stop_value'] = self.stop_parameters['stop_value']*60
+
+        elif self.feed_type == 'linear':
+
+            # convert acceleration term into g/s^2
+            params['inc_rate'] = convert_rate(self.start_parameters['inc_rate'],
+                                              ['v', 'm'],
+                                              ['min^2', 'sec^2'])
+            # convert stop parameter to g/s
+            params['stop_value'] = convert_rate(self.stop_parameters['stop_value'],
+                                                ['v','m'],
+                                                ['min', 'sec'])
+
+        return params
+
+
     def calculate_bolus(self, initial_conditions):
 
         # retrieve last stage's end parameters
@@ -64,7 +108,7 @@ class MassSegment:
             self.r0_recipe = self.r0_stage
 
         # calculate absolute mass from net mass (grams)
-        net_mass = self.stop_parameters['stop_value']
+        net_mass = self.stage_parameters()['stop_value']
         target_mass = self.m0_stage - net_mass
         self.stop_value = target_mass        
         self.is_lowerbound = True # subtractive scale
@@ -85,11 +129,9 @@ class MassSegment:
         # retrieve last stage's end parameters
         ms_last = self.last
 
-        # Convert rate to g/s
-        rate_mL_min= self.start_parameters['rate']
-        start_rate = convert_rate(rate_mL_min,
-                                  ['v','m'],
-                                  ['min', 'sec']) 
+        # Convert rate to g/s and duration to s
+        params = self.stage_parameters()
+        start_rate = params['rate']
 
         # Set stage start parameters
         self.t0_stage = initial_conditions['time']
@@ -104,8 +146,8 @@ class MassSegment:
             self.m0_recipe = self.m0_stage
 
         # calculate stop parameters based on initial conditions
-        duration_min = self.stop_parameters['stop_value']
-        self.stop_value = self.t0_stage + timedelta(minutes=duration_min)
+        duration_s = params['stop_value']
+        self.stop_value = self.t0_stage + timedelta(seconds=duration_s)
  
         # y = mx + b, where m = pump rate increase, b = start rate
         #  time in relative seconds from start of segment
@@ -135,16 +177,10 @@ class MassSegment:
             self.r0_recipe = self.r0_stage
             self.m0_recipe = self.m0_stage
 
-        # convert acceleration term into g/s^2
-        inc_rate_mL_min2 = self.start_parameters['inc_rate']
-        self.inc_rate = convert_rate(inc_rate_mL_min2,
-                                       ['v', 'm'],
-                                       ['min^2', 'sec^2'])
-        # convert stop parameter to g/s
-        end_rate_mL_min = self.stop_parameters['stop_value']
-        self.stop_value = convert_rate(end_rate_mL_min,
-                                        ['v','m'],
-                                        ['min', 'sec'])
+        # convert acceleration term into g/s^2 and stop parameter to g/s
+        params = self.stage_parameters()
+        self.inc_rate = params['inc_rate']
+        self.stop_value = params['stop_value']
 
         # y = mx + b, where m = pump rate increase, b = start rate
         #  time in relative seconds from start of segment
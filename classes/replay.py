@@ -0,0 +1,120 @@
+import time
+import numpy as np
+from collections import namedtuple
+from lib.utils import *
+from lib.ticklog import read_tick_log
+from mech.replay import ReplayBackend, clock_for
+from classes.controller import FeedController
+
+"""
+Regression testing of controller changes against recorded runs.
+Recorded tick log is re-driven through FeedController at full CPU speed:
+virtual clock jumps straight to each recorded tick time, sensors come from
+record (mech.replay.ReplayBackend), and pump commands of replayed controller
+are diffed against commands of recorded run.
+"""
+
+ReplayResult = namedtuple('ReplayResult',
+                          ['time',              # (n,) recorded tick times (epoch s)
+                           'recorded_command',  # (n,) pump rate commanded by recorded run (steps/s)
+                           'replayed_command',  # (n,) pump rate commanded by replayed controller
+                           'recorded_setpoint', # (n,) setpoint of recorded run (steps/s)
+                           'replayed_setpoint', # (n,) setpoint of replayed controller
+                           'recorded_stage',    # (n,) recipe stage of recorded run
+                           'replayed_stage',    # (n,) recipe stage of replayed controller (0 once ended)
+                           'max_abs_diff',      # largest |replayed - recorded| command
+                           'first_divergence',  # index of first tick commands differ, else None
+                           'stage_mismatches',  # ticks replayed stage differs from recorded
+                           'status',            # final status of replayed controller
+                           'wall_s',            # seconds taken by replay
+                           'speedup'])          # recorded seconds per wall second
+
+
+def recorded_commands(records):
+
+    """
+    recorded_commands - pump rate commanded at each recorded tick, i.e. pump
+      rate read back at following tick. Last tick's command is unknown (NaN)
+    :param records: structured array of TICK_RECORD
+    :return: np.ndarray (n,) - steps/s
+    """
+
+    command = np.full(len(records), np.nan)
+    command[:-1] = records['rate'][1:]
+
+    return command
+
+
+def replay_run(records, recipe, rtol=1e-6, atol=1e-9, controller_kwargs=None):
+
+    """
+    replay_run - re-drives recorded run through FeedController and diffs commands
+
+    :param records: str or structured array - tick log path or TICK_RECORD rows
+    :param recipe: dict - recipe of recorded run (see main.main for format)
+    :param rtol: float - relative tolerance of command comparison
+    :param atol: float - absolute tolerance of command comparison (steps/s)
+    :param controller_kwargs: dict - extra FeedController arguments
+                              (e.g. instrumentation, relay_autotune)
+    :return: ReplayResult
+    """
+
+    if isinstance(records, str):
+        records = read_tick_log(records)
+
+    n = len(records)
+    clock = clock_for(records)
+    backend = ReplayBackend(records, clock)
+    controller = FeedController(recipe, clock=clock, backend=backend,
+                                **(controller_kwargs or dict()))
+
+    times = np.asarray(records['time'], dtype=np.float64)
+    elapsed = times - times[0]
+    replayed_command = np.full(n, np.nan)
+    replayed_setpoint = np.full(n, np.nan)
+    replayed_stage = np.zeros(n, dtype=np.int64)
+
+    t_start = time.perf_counter()
+
+    # recorded run started right before its first tick
+    if controller.start():
+
+        for k in range(n):
+
+            # jump to recorded tick time; no sleeping
+            clock.elapsed = elapsed[k]
+            running = controller.tick()
+
+            replayed_command[k] = backend.state['PUMP']/60 # steps/min -> steps/s
+            replayed_setpoint[k] = np.nan if controller.next_rate is None else controller.next_rate
+            replayed_stage[k] = controller.mp.current_stage
+
+            if not running:
+                break
+
+    wall = time.perf_counter() - t_start
+    controller.stop()
+
+    recorded_command = recorded_commands(records)
+
+    # commands differ where both known and outside tolerance
+    both = ~(np.isnan(recorded_command) | np.isnan(replayed_command))
+    differs = both & ~np.isclose(replayed_command, recorded_command, rtol=rtol, atol=atol)
+    diverged = np.flatnonzero(differs)
+    abs_diff = np.abs(replayed_command[both] - recorded_command[both])
+
+    result = ReplayResult(time=times,
+                          recorded_command=recorded_command,
+                          replayed_command=replayed_command,
+                          recorded_setpoint=np.asarray(records['setpoint'], dtype=np.float64),
+                          replayed_setpoint=replayed_setpoint,
+                          recorded_stage=np.asarray(records['stage'], dtype=np.int64),
+                          replayed_stage=replayed_stage,
+                          max_abs_diff=float(abs_diff.max()) if abs_diff.size else 0.0,
+                          first_divergence=int(diverged[0]) if diverged.size else None,
+                          stage_mismatches=int(np.sum(replayed_stage != records['stage'])),
+                          status=controller.status,
+                          wall_s=wall,
+                          speedup=float(elapsed[-1])/wall if wall else float('inf'))
+
+    return result
@@ -0,0 +1,129 @@
+import asyncio
+import numpy as np
+from lib.utils import PID_ADJUSTMENT_INCREMENT
+from lib.scheduler import DeadlineScheduler
+
+
+class ReactorSupervisor:
+
+    """
+    Drives many FeedController control loops concurrently on single asyncio event loop.
+      Each vessel ticks on its own DeadlineScheduler grid. Ticks (i.e. device I/O) run in
+      thread pool executor so slow devices don't block other vessels.
+    """
+
+    def __init__(self, executor=None, inline=False):
+
+        """
+        :param executor: concurrent.futures.Executor running vessel ticks.
+                         None uses event loop's default thread pool
+        :param inline: bool - if True, ticks run directly on event loop
+                       (suitable for non-blocking devices e.g. mock backends)
+        """
+
+        self.executor = executor
+        self.inline = inline
+
+        # vessel name -> controller
+        self.controllers = dict()
+        # vessel name -> DeadlineScheduler pacing its ticks (jitter & overruns)
+        self.schedulers = dict()
+        # vessel name -> exception raised by tick, if any
+        self.errors = dict()
+
+    def add(self, name, controller, period=PID_ADJUSTMENT_INCREMENT, clock=None):
+
+        """
+        add - registers vessel control loop
+
+        :param name: hashable - vessel identifier
+        :param controller: FeedController - control loop of vessel
+        :param period: float - seconds between ticks of vessel
+        :param clock: clock pacing vessel's ticks; controller's clock if None
+        """
+
+        self.controllers[name] = controller
+        self.schedulers[name] = DeadlineScheduler(period, clock or controller.clock)
+
+    async def _tick(self, controller):
+
+        # run single tick on event loop or executor
+        if self.inline:
+            running = controller.tick()
+        else:
+            loop = asyncio.get_running_loop()
+            running = await loop.run_in_executor(self.executor, controller.tick)
+
+        return running
+
+    async def run_vessel(self, name):
+
+        """
+        run_vessel - runs control loop of single vessel until recipe ends.
+          Ticks are paced by vessel's DeadlineScheduler, awaited on event loop.
+        """
+
+        controller = self.controllers[name]
+        scheduler = self.schedulers[name]
+
+        try:
+
+            if not controller.start():
+                return controller.status
+
+            # first tick fires now, later ones on scheduler's deadline grid
+            scheduler.start()
+            while await self._tick(controller):
+                await scheduler.wait_async()
+
+        except Exception as e:
+
+            # halt this vessel only; others keep running
+            controller.status = 'error'
+            self.errors[name] = e
+
+        finally:
+
+            # End feed
+            controller.stop()
+
+        return controller.status
+
+    async def run(self):
+
+        """
+        run - runs all registered vessels concurrently
+        :return: dict - vessel name -> final run status
+        """
+
+        names = list(self.controllers)
+        statuses = await asyncio.gather(*[self.run_vessel(n) for n in names])
+
+        return dict(zip(names, statuses))
+
+    def run_all(self):
+
+        # blocking entry point
+        return asyncio.run(self.run())
+
+    def jitter_stats(self, name):
+
+        """
+        jitter_stats - summary of tick lateness for vessel
+
+        :return: dict of tick count, mean, 50th/99th percentile and max lateness (s),
+                 and number of missed deadlines
+        """
+
+        scheduler = self.schedulers[name]
+        lateness = scheduler.jitter.values()
+        stats = {'ticks': lateness.size,
+                 'overruns': scheduler.overruns}
+
+        if lateness.size:
+            stats['mean'] = float(np.mean(lateness))
+            stats['p50'] = float(np.percentile(lateness, 50))
+            stats['p99'] = float(np.percentile(lateness, 99))
+            stats['max'] = float(np.max(lateness))
+
+        return stats
@@ -0,0 +1,259 @@
+import numpy as np
+from lib.utils import *
+from mech.actuator import MOCK_DEFAULTS
+from classes.massprogram import MassProgram
+
+"""
+Recipe compiler. Turns recipe into piecewise setpoint table
+(stage boundaries, coefficients, expected mass & rate at each boundary)
+shared by live control loop, simulators and dashboards.
+"""
+
+# integer codes of feed types in stage tables
+FEED_TYPE_CODES = {'bolus': 0, 'timed': 1, 'linear': 2}
+BOLUS, TIMED, LINEAR = 0, 1, 2
+
+
+def stage_table(recipe):
+
+    """
+    stage_table - converts recipe into rows of runtime stage parameters,
+      using same unit conversions as MassSegment.calculate_* methods
+
+    :param recipe: dict - recipe (see main.main for format)
+    :return: np.ndarray (n_stages, 4) - feed type code, start rate (g/s, NaN if carried over),
+             rate increase (g/s^2), stop value (g, s or g/s)
+    """
+
+    mp = MassProgram(recipe)
+    rows = list()
+
+    for ms in mp.massprogram:
+        params = ms.stage_parameters()
+        rate = np.nan if params['rate'] is None else params['rate']
+        rows.append((FEED_TYPE_CODES[ms.feed_type], rate,
+                     params['inc_rate'], params['stop_value']))
+
+    return np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+
+class SetpointTrajectory:
+
+    """
+    Precomputed piecewise-linear pump rate setpoint of recipe, assuming pump
+      delivers setpoint exactly. Stage i runs from t[i] to t[i+1] (s from recipe start)
+      with rate(t) = rate[i] + inc[i]*(t - t[i]) (g/s) and scale reading falling from mass[i].
+      Stages that never reach their stop value have t[i+1] = inf;
+      later stages are unreachable (NaN boundaries).
+      Lookups are binary searches over stage boundaries, O(log stages).
+    """
+
+    def __init__(self, kind, t, rate, inc, mass, stop_value):
+
+        """
+        :param kind: array (n,) - feed type code of each stage
+        :param t: array (n+1,) - stage start times, then recipe end time (s)
+        :param rate: array (n+1,) - setpoint at each boundary (g/s)
+        :param inc: array (n,) - rate increase of each stage (g/s^2)
+        :param mass: array (n+1,) - expected scale reading at each boundary (g)
+        :param stop_value: array (n,) - stop value of each stage (g, s or g/s)
+        """
+
+        self.kind = kind
+        self.t = t
+        self.rate = rate
+        self.inc = inc
+        self.mass = mass
+        self.stop_value = stop_value
+        self.n_stages = kind.size
+
+    @property
+    def duration(self):
+
+        # recipe length (s); inf if a stage never ends
+        return float(np.nanmax(self.t) - self.t[0]) if self.n_stages else 0.0
+
+    @property
+    def mass_consumed(self):
+
+        # feed used by whole recipe (g); NaN if a stage never ends
+        return float(self.mass[0] - self.mass[-1]) if self.n_stages else 0.0
+
+    def stage_at(self, t):
+
+        """
+        stage_at - index of stage running at time t (O(log stages))
+        :param t: float or array - seconds from recipe start
+        :return: int or array - stage index; n_stages once recipe finished
+        """
+
+        i = np.searchsorted(self.t, t, side='right') - 1
+
+        return np.clip(i, 0, self.n_stages)
+
+    def _lookup(self, t):
+
+        # stage index, seconds into stage, running mask
+        t = np.asarray(t, dtype=np.float64)
+        i = self.stage_at(t)
+        running = i < self.n_stages
+        j = np.minimum(i, max(self.n_stages - 1, 0))
+        dt = np.where(running, t - self.t[j], 0)
+
+        return i, j, dt, running
+
+    def setpoint(self, t):
+
+        """
+        setpoint - recipe pump rate at time t
+        :param t: float or array - seconds from recipe start
+        :return: float or array - rate (g/s); 0 once recipe finished
+        """
+
+        if not self.n_stages:
+            return np.zeros_like(np.asarray(t, dtype=np.float64))[()]
+
+        i, j, dt, running = self._lookup(t)
+        rate = np.where(running, self.rate[j] + self.inc[j]*dt, 0)
+
+        return rate[()]
+
+    def expected_mass(self, t):
+
+        """
+        expected_mass - scale reading at time t if pump follows setpoint
+        :param t: float or array - seconds from recipe start
+        :return: float or array - mass (g)
+        """
+
+        if not self.n_stages:
+            return np.full_like(np.asarray(t, dtype=np.float64), np.nan)[()]
+
+        i, j, dt, running = self._lookup(t)
+        fed = self.rate[j]*dt + 0.5*self.inc[j]*dt**2
+        mass = np.where(running, self.mass[j] - fed, self.mass[-1])
+
+        return mass[()]
+
+    def stage_rate(self, stage, elapsed, rate_0=None):
+
+        """
+        stage_rate - setpoint of stage given seconds since stage actually started.
+          Used by live loop, where stage start follows measured values rather than plan.
+        :param stage: int - stage index
+        :param elapsed: float - seconds since stage start
+        :param rate_0: float - measured rate at stage start (g/s); planned rate if None
+        :return: float - rate (g/s)
+        """
+
+        if rate_0 is None:
+            rate_0 = self.rate[stage]
+
+        return rate_0 + self.inc[stage]*elapsed
+
+    def stage_setpoint(self, stage, elapsed, rate_0=None):
+
+        """
+        stage_setpoint - setpoint looked up in trajectory (setpoint()), with stage
+          re-anchored to its actual start so plan and live stage always agree.
+          Past planned end of stage, its end rate is held.
+        :param stage: int - stage index
+        :param elapsed: float - seconds since stage start
+        :param rate_0: float - measured rate at stage start (g/s), used only
+                       if plan never reaches stage (see stage_rate)
+        :return: float - rate (g/s)
+        """
+
+        t_start, t_end = self.t[stage], self.t[stage + 1]
+
+        if not np.isfinite(t_start):
+            return self.stage_rate(stage, elapsed, rate_0)
+        if t_start + elapsed >= t_end:
+            return float(self.rate[stage] + self.inc[stage]*(t_end - t_start))
+
+        return float(self.setpoint(t_start + elapsed))
+
+    def table(self):
+
+        """
+        table - stage boundaries for display
+        :return: list of dicts, one per stage
+        """
+
+        names = {code: name for name, code in FEED_TYPE_CODES.items()}
+        rows = list()
+
+        for i in range(self.n_stages):
+            rows.append({'stage': i + 1,
+                         'feed_type': names[int(self.kind[i])],
+                         't_start': float(self.t[i]),
+                         't_end': float(self.t[i + 1]),
+                         'rate_start': float(self.rate[i]),
+                         'rate_end': float(self.rate[i] + self.inc[i]*(self.t[i + 1] - self.t[i]))
+                                     if np.isfinite(self.t[i + 1]) else np.nan,
+                         'mass_start': float(self.mass[i]),
+                         'mass_end': float(self.mass[i + 1])})
+
+        return rows
+
+
+def compile_recipe(recipe, initial_mass=MOCK_DEFAULTS['SCALE'], initial_rate=None,
+                   t0=0.0):
+
+    """
+    compile_recipe - resolves every recipe stage up front into SetpointTrajectory.
+      Stage semantics follow MassSegment.calculate_bolus/timed/linear:
+        bolus - constant rate carried over from previous stage until net mass fed
+        timed - constant recipe rate until duration elapsed
+        linear - rate ramps from previous stage rate until stop rate hit
+
+    :param recipe: dict - recipe (see main.main for format), or stage_table() array
+    :param initial_mass: float - scale reading at recipe start (g)
+    :param initial_rate: float - rate carried into first stage (g/s);
+                         DEFAULT_PUMP_RATE if None
+    :param t0: float - recipe start time (s)
+    :return: SetpointTrajectory
+    """
+
+    table = recipe if isinstance(recipe, np.ndarray) else stage_table(recipe)
+    n = table.shape[0]
+
+    if initial_rate is None:
+        initial_rate = convert_rate(DEFAULT_PUMP_RATE, ['s', 'm'])
+
+    kind = table[:, 0].astype(np.int64)
+    inc = table[:, 2].copy()
+    stop_value = table[:, 3].copy()
+    t = np.full(n + 1, np.nan)
+    rate = np.full(n + 1, np.nan)
+    mass = np.full(n + 1, np.nan)
+    t[0], rate[0], mass[0] = t0, initial_rate, initial_mass
+
+    for i in range(n):
+
+        # start rate: recipe rate, else carried over
+        if not np.isnan(table[i, 1]):
+            rate[i] = table[i, 1]
+        r0, m = rate[i], inc[i]
+
+        # seconds until stop value hit
+        if kind[i] == TIMED:
+            duration = stop_value[i]
+        elif kind[i] == BOLUS:
+            duration = stop_value[i]/r0 if r0 > 0 else np.inf
+        elif m != 0:
+            duration = max((stop_value[i] - r0)/m, 0)
+        else:
+            # flat ramp only stops if already past (upper bound) stop rate
+            duration = 0 if r0 >= stop_value[i] else np.inf
+
+        if not np.isfinite(duration):
+            t[i + 1] = np.inf
+            break
+
+        # boundary conditions carried into next stage
+        t[i + 1] = t[i] + duration
+        rate[i + 1] = r0 + m*duration
+        mass[i + 1] = mass[i] - (r0*duration + 0.5*m*duration**2)
+
+    return SetpointTrajectory(kind, t, rate, inc, mass, stop_value)
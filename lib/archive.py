@@ -0,0 +1,448 @@
+import json
+import lzma
+import struct
+import zlib
+import numpy as np
+from lib.utils import integral, derivative, time_axis, epoch_seconds, ARCHIVE_CHUNK_ROWS
+
+"""
+Compressed columnar archive of run history (e.g. tick logs of lib.ticklog).
+Rows are split into chunks of ARCHIVE_CHUNK_ROWS; each column of each chunk
+is encoded, byte-shuffled and compressed (zlib or lzma) separately:
+  time column - delta-of-delta of float bits (regular ticks encode to ~0)
+  floats      - XOR with previous value's bits (slow signals share high bits)
+  integers    - delta from previous value
+Chunk index (row count, first/last time, first/last value of every column,
+byte ranges) is stored as JSON footer, so range queries decompress only
+chunks they overlap, one at a time, and neighbouring chunks' boundary
+points come from the index.
+
+File: magic | column blobs ... | JSON index | index offset (u8) | index length (u8) | magic
+"""
+
+ARCHIVE_MAGIC = b'PIDARCH1'
+ARCHIVE_VERSION = 2
+
+# footer: index offset, index length, magic
+_FOOTER = struct.Struct('<QQ8s')
+
+CODECS = {'zlib': (lambda data, level: zlib.compress(data, 6 if level is None else level),
+                   zlib.decompress),
+          'lzma': (lambda data, level: lzma.compress(data, preset=6 if level is None else level),
+                   lzma.decompress)}
+
+
+def _bits(values):
+
+    # raw bits of fixed-size values as unsigned integers
+    return values.view('<u{}'.format(values.dtype.itemsize))
+
+
+def _shuffle(values):
+
+    # group k-th bytes of every value together (slow-changing bytes compress to runs)
+    n, size = values.size, values.dtype.itemsize
+    return np.ascontiguousarray(values).view(np.uint8).reshape(n, size).T.tobytes()
+
+
+def _unshuffle(data, dtype, n):
+
+    dtype = np.dtype(dtype)
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, n)
+    return np.ascontiguousarray(planes.T).view(dtype).reshape(n)
+
+
+def encode_column(values, encoding):
+
+    """
+    encode_column - lossless transform of column before compression
+    :param values: np.ndarray (n,) - column values
+    :param encoding: str - 'delta2' (time), 'xor' (floats) or 'delta' (integers)
+    :return: bytes - shuffled encoded values
+    """
+
+    values = np.ascontiguousarray(values)
+
+    if encoding == 'delta2':
+        # integer arithmetic on float bits wraps, so decoding is exact
+        bits = _bits(values).astype(np.int64)
+        encoded = np.diff(np.diff(bits, prepend=0), prepend=0)
+
+    elif encoding == 'xor':
+        bits = _bits(values)
+        encoded = bits.copy()
+        encoded[1:] ^= bits[:-1]
+
+    elif encoding == 'delta':
+        encoded = np.diff(values.astype(np.int64), prepend=0)
+
+    else:
+        raise ValueError('unknown encoding {}'.format(encoding))
+
+    return _shuffle(encoded)
+
+
+def decode_column(data, encoding, dtype, n):
+
+    """
+    decode_column - inverse of encode_column
+    :return: np.ndarray (n,) of dtype
+    """
+
+    dtype = np.dtype(dtype)
+
+    if encoding == 'delta2':
+        encoded = _unshuffle(data, np.int64, n)
+        bits = np.cumsum(np.cumsum(encoded))
+        return bits.astype('<u{}'.format(dtype.itemsize)).view(dtype)
+
+    if encoding == 'xor':
+        encoded = _unshuffle(data, '<u{}'.format(dtype.itemsize), n)
+        return np.bitwise_xor.accumulate(encoded).view(dtype)
+
+    if encoding == 'delta':
+        encoded = _unshuffle(data, np.int64, n)
+        return np.cumsum(encoded).astype(dtype)
+
+    raise ValueError('unknown encoding {}'.format(encoding))
+
+
+def _encoding(name, dtype, time):
+
+    # encoding of column by role and type
+    if name == time:
+        return 'delta2'
+    if dtype.kind == 'f':
+        return 'xor'
+    if dtype.kind in 'iub':
+        return 'delta'
+
+    raise TypeError('column {} of type {} cannot be archived'.format(name, dtype))
+
+
+def write_archive(path, columns, time='time', chunk_rows=ARCHIVE_CHUNK_ROWS,
+                  codec='zlib', level=None):
+
+    """
+    write_archive - writes columns to compressed chunked archive.
+      Works chunk by chunk, so memory-mapped inputs (e.g. lib.ticklog.read_tick_log)
+      are never loaded whole.
+
+    :param path: str - archive file; overwritten if it exists
+    :param columns: structured array, or dict of name -> array (n,) of equal length
+    :param time: str - name of time column (float seconds, non-decreasing)
+    :param chunk_rows: int - rows per chunk
+    :param codec: str - 'zlib' or 'lzma'
+    :param level: int - compression level / preset (codec default if None)
+    :return: int - number of chunks written
+    """
+
+    if codec not in CODECS:
+        raise ValueError('unknown codec {}'.format(codec))
+    compress = CODECS[codec][0]
+
+    if isinstance(columns, np.ndarray) and columns.dtype.names:
+        names = columns.dtype.names
+    else:
+        names = tuple(columns)
+    if time not in names:
+        raise ValueError('time column {} missing'.format(time))
+
+    n = len(columns[time])
+    layout = [(name, np.dtype(columns[name].dtype)) for name in names]
+    encodings = {name: _encoding(name, dtype, time) for name, dtype in layout}
+
+    chunks = list()
+
+    with open(path, 'wb') as f:
+
+        f.write(ARCHIVE_MAGIC)
+
+        for start in range(0, n, chunk_rows):
+
+            stop = min(start + chunk_rows, n)
+            t = np.asarray(columns[time][start:stop], dtype=np.float64)
+            chunk = {'rows': stop - start,
+                     't_min': float(t[0]),
+                     't_max': float(t[-1]),
+                     'columns': dict(),
+                     'edges': dict()}
+
+            # one compressed blob per column; byte range and boundary values kept in index
+            for name, dtype in layout:
+                values = np.asarray(columns[name][start:stop], dtype=dtype)
+                if name != time: # time bounds are t_min/t_max
+                    chunk['edges'][name] = values[[0, -1]].tolist()
+                blob = compress(encode_column(values, encodings[name]), level)
+                chunk['columns'][name] = [f.tell(), len(blob)]
+                f.write(blob)
+
+            chunks.append(chunk)
+
+        index = {'version': ARCHIVE_VERSION,
+                 'codec': codec,
+                 'time': time,
+                 'rows': n,
+                 'columns': [[name, dtype.str, encodings[name]] for name, dtype in layout],
+                 'chunks': chunks}
+
+        blob = json.dumps(index, separators=(',', ':')).encode('utf-8')
+        offset = f.tell()
+        f.write(blob)
+        f.write(_FOOTER.pack(offset, len(blob), ARCHIVE_MAGIC))
+
+    return len(chunks)
+
+
+class ColumnArchive:
+
+    """
+    Reader of archive written by write_archive. Only index is read on open;
+      column chunks are read and decompressed on demand.
+    """
+
+    def __init__(self, path):
+
+        self.path = path
+        self._file = open(path, 'rb')
+
+        # footer locates JSON index
+        self._file.seek(-_FOOTER.size, 2)
+        offset, length, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+        if magic != ARCHIVE_MAGIC:
+            self._file.close()
+            raise ValueError('{} is not a column archive'.format(path))
+
+        self._file.seek(offset)
+        index = json.loads(self._file.read(length).decode('utf-8'))
+        if index['version'] != ARCHIVE_VERSION:
+            self._file.close()
+            raise ValueError('{} is archive version {}, expected {}'.format(
+                             path, index['version'], ARCHIVE_VERSION))
+
+        self.codec = index['codec']
+        self.time = index['time']
+        self.rows = index['rows']
+        self.dtypes = {name: np.dtype(dtype) for name, dtype, _ in index['columns']}
+        self.encodings = {name: encoding for name, _, encoding in index['columns']}
+        self.chunks = index['chunks']
+        self._decompress = CODECS[self.codec][1]
+
+        # chunk time bounds for range lookup
+        self.t_min = np.array([c['t_min'] for c in self.chunks], dtype=np.float64)
+        self.t_max = np.array([c['t_max'] for c in self.chunks], dtype=np.float64)
+
+        self.decompressed = 0 # column chunks decompressed so far
+
+    @property
+    def columns(self):
+
+        return tuple(self.dtypes)
+
+    def __len__(self):
+
+        return self.rows
+
+    def close(self):
+
+        self._file.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+        return False
+
+    def chunk_range(self, start=None, stop=None):
+
+        """
+        chunk_range - chunks holding rows with start <= time <= stop
+        :param start: float or datetime - first time (None = beginning of run)
+        :param stop: float or datetime - last time (None = end of run)
+        :return: range of chunk indices
+        """
+
+        first = 0 if start is None else \
+                int(np.searchsorted(self.t_max, epoch_seconds(start), side='left'))
+        last = len(self.chunks) if stop is None else \
+               int(np.searchsorted(self.t_min, epoch_seconds(stop), side='right'))
+
+        return range(first, max(first, last))
+
+    def read_chunk(self, i, columns=None):
+
+        """
+        read_chunk - decompresses columns of single chunk
+        :param i: int - chunk index
+        :param columns: list of column names (None = all)
+        :return: dict of name -> np.ndarray
+        """
+
+        chunk = self.chunks[i]
+        out = dict()
+
+        for name in (columns or self.columns):
+            offset, length = chunk['columns'][name]
+            self._file.seek(offset)
+            data = self._decompress(self._file.read(length))
+            out[name] = decode_column(data, self.encodings[name],
+                                      self.dtypes[name], chunk['rows'])
+            self.decompressed += 1
+
+        return out
+
+    def iter_chunks(self, columns=None, start=None, stop=None):
+
+        """
+        iter_chunks - yields columns chunk by chunk, trimmed to time range.
+          Only one chunk is held in memory at a time.
+
+        :param columns: list of column names (None = all)
+        :param start: float or datetime - first time (None = beginning of run)
+        :param stop: float or datetime - last time (None = end of run)
+        :return: generator of dict of name -> np.ndarray
+        """
+
+        columns = list(columns or self.columns)
+        wanted = columns if self.time in columns else columns + [self.time]
+        t_start = None if start is None else epoch_seconds(start)
+        t_stop = None if stop is None else epoch_seconds(stop)
+
+        for i in self.chunk_range(start, stop):
+
+            chunk = self.read_chunk(i, wanted)
+            t = chunk[self.time]
+
+            # trim rows of boundary chunks
+            lo = 0 if t_start is None else int(np.searchsorted(t, t_start, side='left'))
+            hi = t.size if t_stop is None else int(np.searchsorted(t, t_stop, side='right'))
+            if lo == 0 and hi == t.size:
+                yield {name: chunk[name] for name in columns}
+            elif hi > lo:
+                yield {name: chunk[name][lo:hi] for name in columns}
+
+    def read(self, columns=None, start=None, stop=None):
+
+        """
+        read - columns within time range as structured array
+        :return: np.ndarray - structured, one field per column
+        """
+
+        columns = list(columns or self.columns)
+        dtype = np.dtype([(name, self.dtypes[name]) for name in columns])
+        parts = list()
+
+        for chunk in self.iter_chunks(columns, start, stop):
+            part = np.empty(chunk[columns[0]].size, dtype=dtype)
+            for name in columns:
+                part[name] = chunk[name]
+            parts.append(part)
+
+        if not parts:
+            return np.empty(0, dtype=dtype)
+
+        return np.concatenate(parts)
+
+    def _block(self, i, column):
+
+        # (n, 2) [t_i, y_i] points of column in chunk i
+        chunk = self.read_chunk(i, [self.time, column])
+
+        return np.column_stack((chunk[self.time].astype(np.float64),
+                                chunk[column].astype(np.float64)))
+
+    def points(self, column, start=None, stop=None):
+
+        """
+        points - (n, 2) [t_i, y_i] arrays of column, chunk by chunk, for
+          integral()/derivative(). Each block repeats last point of previous
+          block, so segments across chunk boundaries aren't lost.
+
+        :param column: str - column name
+        :return: generator of np.ndarray (n, 2) float64
+        """
+
+        last = None
+
+        for chunk in self.iter_chunks([self.time, column], start, stop):
+
+            block = np.column_stack((chunk[self.time].astype(np.float64),
+                                     chunk[column].astype(np.float64)))
+            if last is not None:
+                block = np.vstack((last, block))
+            last = block[-1:]
+
+            yield block
+
+    def integral(self, column, start=None, stop=None):
+
+        """
+        integral - trapezoidal integral of column over time range (lib.utils.integral),
+          accumulated chunk by chunk
+        :return: float
+        """
+
+        total = 0.0
+        for block in self.points(column, start, stop):
+            if block.shape[0] >= 2:
+                total += integral(block, abs_t=False)
+
+        return total
+
+    def derivative(self, column, t_0=None):
+
+        """
+        derivative - lib.utils.derivative of column at t_0, decompressing only
+          chunk holding t_0 (boundary segments use neighbour points from index)
+
+        :param t_0: float or datetime - tangent position; None = last segment of run
+                    array-like - many positions, grouped by chunk
+        :return: float (None if undefined), or np.ndarray if t_0 array-like
+        """
+
+        if t_0 is None:
+            return derivative(self._around(column, len(self.chunks) - 1)) \
+                   if self.chunks else None
+
+        t_q = time_axis(np.atleast_1d(t_0))
+        out = np.full(t_q.size, np.nan)
+
+        # chunk holding each query time
+        if self.chunks:
+            owner = np.clip(np.searchsorted(self.t_max, t_q, side='left'),
+                            0, len(self.chunks) - 1)
+            for i in np.unique(owner):
+                hit = owner == i
+                slopes = derivative(self._around(column, i), t_q[hit])
+                if slopes is not None:
+                    out[hit] = slopes
+
+        if np.ndim(t_0):
+            return out
+
+        return None if np.isnan(out[0]) else float(out[0])
+
+    def _edge(self, i, column, last):
+
+        # (1, 2) first or last [t_i, y_i] point of chunk i, from index
+        chunk = self.chunks[i]
+        t = chunk['t_max' if last else 't_min']
+        y = t if column == self.time else chunk['edges'][column][last]
+
+        return np.array([[t, y]], dtype=np.float64)
+
+    def _around(self, column, i):
+
+        # points of chunk i plus closest point of each neighbouring chunk
+        blocks = list()
+        if i > 0:
+            blocks.append(self._edge(i - 1, column, last=True))
+        blocks.append(self._block(i, column))
+        if i + 1 < len(self.chunks):
+            blocks.append(self._edge(i + 1, column, last=False))
+
+        return np.vstack(blocks)
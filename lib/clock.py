@@ -0,0 +1,63 @@
+import time
+from datetime import datetime, timedelta
+
+"""
+Clock abstractions for the control loop.
+SystemClock follows wall time; VirtualClock advances instantly on sleep,
+so recipes can be simulated faster than real time.
+"""
+
+
+class SystemClock:
+
+    """
+    Wall clock - reads datetime.now() and really sleeps
+    """
+
+    def now(self):
+
+        return datetime.now()
+
+    def monotonic(self):
+
+        # seconds from arbitrary reference, unaffected by system time changes
+        return time.monotonic()
+
+    def sleep(self, seconds):
+
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class VirtualClock:
+
+    """
+    Simulated clock - time only moves when sleep() or advance() is called
+    """
+
+    def __init__(self, start=None):
+
+        self.start = start if start is not None else datetime.now() # datetime at t=0
+        self.elapsed = 0.0 # simulated seconds since start
+
+    def now(self):
+
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+
+        return self.elapsed
+
+    def sleep(self, seconds):
+
+        # advance simulated time instantly
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def advance(self, seconds):
+
+        self.sleep(seconds)
+
+
+# default clock used when none is injected
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,328 @@
+import numpy as np
+from collections import namedtuple
+from lib.utils import epoch_seconds, TREND_TIERS, TREND_BUCKETS, TREND_RAW_CAPACITY, LTTB_OVERSAMPLE
+from lib.telemetry import TelemetryBuffer
+
+"""
+Downsampled trends of live sensor history for display.
+Every sample is folded in O(1) into tiers of fixed-width time buckets
+(e.g. 10 s, 1 min, 10 min) that keep min, max, mean and last value, so
+spikes survive downsampling. Trend requests pick the finest tier whose
+buckets in window fit the requested pixel count, so cost is O(pixels)
+however long the run. LTTB (largest triangle three buckets) thins a
+tier to exactly n visually representative points instead.
+"""
+
+Trend = namedtuple('Trend', ['t',      # bucket start times (s); sample times for raw/LTTB
+                             'min',
+                             'max',
+                             'mean',
+                             'last',
+                             'width'])  # seconds per bucket of source (0 = raw samples)
+
+# bucket columns
+_T, _MIN, _MAX, _SUM, _COUNT, _LAST = range(6)
+
+
+class DownsampleTier:
+
+    """
+    Fixed-capacity ring of time buckets of one width. Buckets are aligned
+      to multiples of width; samples of still-open bucket are visible to queries.
+      Storage is mirrored like TelemetryBuffer, so windows are contiguous views.
+    """
+
+    def __init__(self, width, capacity=TREND_BUCKETS):
+
+        """
+        :param width: float - bucket width (s)
+        :param capacity: int - closed buckets kept (oldest overwritten)
+        """
+
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+
+        self.width = width
+        self.capacity = capacity
+        self._data = np.zeros((2*capacity, 6), dtype=np.float64)
+        self._head = 0
+        self._count = 0
+
+        self._open = None # open bucket row, or None before first sample
+        self._k = None    # index (t//width) of open bucket
+
+    def __len__(self):
+
+        return self._count + (self._open is not None)
+
+    def append(self, t, y):
+
+        """
+        append - folds sample into its bucket in O(1). NaN values open
+          bucket but don't touch its statistics.
+        :param t: float - sample time (s), non-decreasing
+        :param y: float - sample value
+        """
+
+        k = t//self.width
+
+        if k != self._k:
+            if self._open is not None:
+                self._close()
+            self._k = k
+            self._open = [k*self.width, np.inf, -np.inf, 0.0, 0, np.nan]
+
+        if y == y: # skip NaN
+            row = self._open
+            if y < row[_MIN]:
+                row[_MIN] = y
+            if y > row[_MAX]:
+                row[_MAX] = y
+            row[_SUM] += y
+            row[_COUNT] += 1
+            row[_LAST] = y
+
+    def _close(self):
+
+        # move open bucket into ring (both halves)
+        head = self._head
+        self._data[head] = self._open
+        self._data[head + self.capacity] = self._open
+        self._head = (head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def buckets(self, start=None, stop=None):
+
+        """
+        buckets - buckets overlapping [start, stop], oldest first, incl. open bucket
+        :return: np.ndarray (m, 6) - start time, min, max, sum, count, last
+        """
+
+        end = self._head + self.capacity
+        closed = self._data[end - self._count:end]
+
+        # buckets ending after start and starting at or before stop
+        i = 0 if start is None else \
+            int(np.searchsorted(closed[:, _T], start - self.width, side='right'))
+        j = closed.shape[0] if stop is None else \
+            int(np.searchsorted(closed[:, _T], stop, side='right'))
+        rows = closed[i:j]
+
+        if self._open is not None and (stop is None or self._open[_T] <= stop) \
+           and (start is None or self._open[_T] + self.width > start):
+            rows = np.vstack((rows, self._open))
+
+        return rows
+
+    def oldest(self):
+
+        # start time of oldest bucket kept, None if empty
+        if self._count:
+            return self._data[self._head + self.capacity - self._count, _T]
+
+        return None if self._open is None else self._open[_T]
+
+
+def lttb(t, y, n_out):
+
+    """
+    lttb - largest triangle three buckets downsampling. Keeps first and last
+      points, and from each of n_out-2 buckets the point forming largest
+      triangle with previously kept point and mean of next bucket.
+
+    :param t: np.ndarray (n,) - times
+    :param y: np.ndarray (n,) - values (NaN points selected only from all-NaN buckets)
+    :param n_out: int - points returned
+    :return: np.ndarray (k,) - indices of selected points, k = min(n, n_out)
+    """
+
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = t.size
+
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError('lttb keeps first and last point; n_out must be at least 3')
+
+    # bucket edges of interior points
+    edges = (1 + np.arange(n_out - 1)*(n - 2)/(n_out - 2)).astype(np.int64)
+    edges[-1] = n - 1
+    edges = edges.tolist()
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    # mean point of every bucket's following bucket (last point for final bucket)
+    nxt = np.array(edges[1:] + [n])
+    finite = y == y
+    t_c = np.add.reduceat(t, nxt[:-1])/np.diff(nxt)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y_c = np.add.reduceat(np.where(finite, y, 0), nxt[:-1]) / \
+              np.add.reduceat(finite, nxt[:-1])
+
+    # buckets hold a few points each: scalar loop beats per-bucket numpy calls
+    t_l, y_l, t_c, y_c = t.tolist(), y.tolist(), t_c.tolist(), y_c.tolist()
+
+    a = 0
+    for b in range(n_out - 2):
+
+        t_a, y_a = t_l[a], y_l[a]
+        t_n = t_c[b]
+        y_n = y_c[b] if y_c[b] == y_c[b] else y_a # next bucket all NaN
+
+        # twice triangle area of (a, candidate, next-bucket mean); NaN never wins
+        best, best_area = edges[b], -1.0
+        for k in range(edges[b], edges[b + 1]):
+            area = abs((t_a - t_n)*(y_l[k] - y_a) - (t_a - t_l[k])*(y_n - y_a))
+            if area > best_area:
+                best, best_area = k, area
+        a = best
+        selected[b + 1] = a
+
+    return selected
+
+
+class TrendDownsampler:
+
+    """
+    Raw recent samples plus downsampling tiers of single sensor,
+      all updated incrementally per sample.
+    """
+
+    def __init__(self, tiers=TREND_TIERS, capacity=TREND_BUCKETS,
+                 raw_capacity=TREND_RAW_CAPACITY):
+
+        """
+        :param tiers: tuple of float - bucket widths (s)
+        :param capacity: int - buckets kept per tier
+        :param raw_capacity: int - raw samples kept for zoomed-in windows
+        """
+
+        self.raw = TelemetryBuffer(raw_capacity)
+        self.tiers = [DownsampleTier(width, capacity) for width in sorted(tiers)]
+        self.t_first = None # time of first sample
+
+    def append(self, t, y):
+
+        """
+        append - records sample in raw buffer and every tier, O(number of tiers)
+        :param t: datetime or float - sample time
+        :param y: float - sample value
+        """
+
+        t = epoch_seconds(t)
+        if self.t_first is None:
+            self.t_first = t
+        self.raw.append(t, y)
+        for tier in self.tiers:
+            tier.append(t, y)
+
+    def _source(self, start, stop, points):
+
+        """
+        _source - finest source covering [start, stop] with at most points
+          samples/buckets in window; coarsest tier if none fits
+        :return: DownsampleTier, or None for raw samples
+        """
+
+        times = self.raw.times()
+
+        if times.size and times[0] <= start:
+            i = np.searchsorted(times, start, side='left')
+            j = np.searchsorted(times, stop, side='right')
+            if j - i <= points:
+                return None
+
+        # tier must still hold bucket containing start
+        for tier in self.tiers:
+            w = tier.width
+            oldest = tier.oldest()
+            if oldest is not None and oldest <= start//w*w \
+               and stop//w - start//w + 1 <= points:
+                return tier
+
+        return self.tiers[-1] if self.tiers else None
+
+    def trend(self, start=None, stop=None, pixels=800, method='minmax'):
+
+        """
+        trend - downsampled window of history for display
+
+        :param start: float or datetime - window start (None = oldest sample kept)
+        :param stop: float or datetime - window end (None = latest sample)
+        :param pixels: int - horizontal resolution; at most this many points returned
+        :param method: str - 'minmax' (min/max/mean/last per bucket) or
+                       'lttb' (pixels representative points of mean trace)
+        :return: Trend
+        """
+
+        last = self.raw.last()
+        if last is None:
+            empty = np.empty(0)
+            return Trend(empty, empty, empty, empty, empty, 0)
+
+        stop = last[0] if stop is None else epoch_seconds(stop)
+        if start is None:
+            # oldest sample still kept by any source
+            oldest = self.tiers[-1].oldest() if self.tiers else self.raw.times()[0]
+            start = max(self.t_first, oldest)
+        else:
+            start = epoch_seconds(start)
+
+        # LTTB picks points from finer source than it returns
+        budget = pixels*LTTB_OVERSAMPLE if method == 'lttb' else pixels
+        source = self._source(start, stop, budget)
+
+        if source is None:
+            window = self.raw.window()
+            i = np.searchsorted(window[:, 0], start, side='left')
+            j = np.searchsorted(window[:, 0], stop, side='right')
+            t, y = window[i:j, 0], window[i:j, 1]
+            trend = Trend(t, y, y, y, y, 0)
+        else:
+            trend = _bucket_trend(source.buckets(start, stop), source.width, budget)
+
+        if method == 'lttb':
+            keep = lttb(trend.t, trend.mean, pixels)
+            t, y = trend.t[keep], trend.mean[keep]
+            trend = Trend(t, y, y, y, y, trend.width)
+        elif method != 'minmax':
+            raise ValueError('unknown trend method {}'.format(method))
+
+        return trend
+
+
+def _bucket_trend(rows, width, points):
+
+    """
+    _bucket_trend - Trend of bucket rows; merges neighbouring buckets
+      if there are more than points (window longer than coarsest tier fits)
+    """
+
+    group = -(-rows.shape[0]//points) if points else 1
+
+    if group > 1:
+        idx = np.arange(0, rows.shape[0], group)
+        last_idx = np.minimum(idx + group, rows.shape[0]) - 1
+        with np.errstate(invalid='ignore'):
+            rows = np.column_stack((rows[idx, _T],
+                                    np.minimum.reduceat(rows[:, _MIN], idx),
+                                    np.maximum.reduceat(rows[:, _MAX], idx),
+                                    np.add.reduceat(rows[:, _SUM], idx),
+                                    np.add.reduceat(rows[:, _COUNT], idx),
+                                    rows[last_idx, _LAST]))
+        width = width*group
+
+    # buckets without samples (only NaN) report NaN
+    empty = rows[:, _COUNT] == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = rows[:, _SUM]/rows[:, _COUNT]
+
+    return Trend(t=rows[:, _T].copy(),
+                 min=np.where(empty, np.nan, rows[:, _MIN]),
+                 max=np.where(empty, np.nan, rows[:, _MAX]),
+                 mean=np.where(empty, np.nan, mean),
+                 last=rows[:, _LAST].copy(),
+                 width=width)
@@ -0,0 +1,248 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+
+"""
+Per-phase instrumentation of the control loop.
+Phases of each tick are timed with wall-clock monotonic spans (not the loop
+clock, so spans stay meaningful under VirtualClock), events such as pump writes
+and stage transitions are counted, and cProfile/tracemalloc can be switched on
+for next N ticks while loop is running. Disabled instrumentation hands out a
+shared no-op span, so cost per phase is one method call.
+"""
+
+# phases timed within FeedController.tick
+TICK_PHASES = ('sensors', 'verbose', 'derivative', 'control', 'next_stage', 'pump')
+
+# events counted within FeedController.tick
+TICK_COUNTERS = ('pump_writes', 'stage_transitions', 'limit_hits')
+
+
+class _NullSpan:
+
+    # no-op span handed out while instrumentation disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+# allocations made by profilers, excluded from memory_stats
+_PROFILER_TRACES = [tracemalloc.Filter(False, '*/cProfile.py'),
+                    tracemalloc.Filter(False, '*/pstats.py'),
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, __file__)]
+
+
+class _Span:
+
+    # times one phase of current tick
+    __slots__ = ('instrument', 'phase', 't_start')
+
+    def __init__(self, instrument, phase):
+        self.instrument = instrument
+        self.phase = phase
+
+    def __enter__(self):
+        self.t_start = self.instrument.timer()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrument.record(self.phase, self.instrument.timer() - self.t_start)
+        return False
+
+
+class TickInstrumentation:
+
+    """
+    Phase spans, event counters and on-demand profiling of control ticks.
+      Spans and counters are recorded only when enabled; profile() works either way.
+    """
+
+    def __init__(self, enabled=True, timer=time.perf_counter):
+
+        """
+        :param enabled: bool - record phase spans and counters
+        :param timer: callable - monotonic seconds used for spans
+        """
+
+        self.enabled = enabled
+        self.timer = timer
+
+        # per phase: [calls, total seconds, max seconds]
+        self.phases = dict()
+        self.counters = Counter()
+
+        self.ticks = 0
+        self.t_tick = None      # timer value at start of current tick
+        self.current = dict()   # phase -> seconds within current tick
+        self.last_tick = dict() # phase breakdown of last finished tick (incl. 'tick')
+        self.slowest_tick = dict() # phase breakdown of slowest tick so far (incl. 'tick')
+
+        # profiling armed by profile()
+        self.profile_ticks = 0   # ticks left to profile
+        self.profile_memory = False
+        self.profiler = None     # cProfile.Profile while profiling
+        self.profile_stats = None # pstats.Stats of last profiling window
+        self.memory_stats = None # tracemalloc.Statistic list of last profiling window
+        self._memory_started = False
+        self._memory_before = None
+
+    def span(self, phase):
+
+        """
+        span - context manager timing phase of current tick
+        :param phase: str - phase name (see TICK_PHASES)
+        """
+
+        if not self.enabled:
+            return _NULL_SPAN
+
+        return _Span(self, phase)
+
+    def record(self, phase, seconds):
+
+        # add phase duration to running totals and current tick
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+        self.current[phase] = self.current.get(phase, 0.0) + seconds
+
+    def count(self, name, n=1):
+
+        """
+        count - increments event counter
+        :param name: str - counter name (see TICK_COUNTERS)
+        """
+
+        if self.enabled:
+            self.counters[name] += n
+
+    def tick_start(self):
+
+        # begin profiling window if armed
+        if self.profile_ticks and self.profiler is None:
+            self._start_profile()
+
+        if self.enabled:
+            self.current = dict()
+            self.t_tick = self.timer()
+
+    def tick_end(self):
+
+        # close tick; keep breakdown of slowest tick
+        if self.enabled and self.t_tick is not None:
+
+            self.current['tick'] = self.timer() - self.t_tick
+            self.ticks += 1
+            self.last_tick = self.current
+            if self.current['tick'] > self.slowest_tick.get('tick', -1.0):
+                self.slowest_tick = self.current
+            self.t_tick = None
+
+        # end profiling window after N ticks
+        if self.profiler is not None:
+            self.profile_ticks -= 1
+            if self.profile_ticks <= 0:
+                self._stop_profile()
+
+    def profile(self, ticks, memory=False):
+
+        """
+        profile - runs cProfile (and tracemalloc) over next N ticks.
+          Safe to call while loop is running; results land in profile_stats
+          and memory_stats once window ends.
+
+        :param ticks: int - number of ticks to profile
+        :param memory: bool - also trace allocations with tracemalloc
+        """
+
+        self.profile_ticks = int(ticks)
+        self.profile_memory = memory
+
+    def _start_profile(self):
+
+        # start profilers at tick boundary
+        if self.profile_memory:
+            self._memory_started = not tracemalloc.is_tracing()
+            if self._memory_started:
+                tracemalloc.start()
+            self._memory_before = tracemalloc.take_snapshot()
+
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def _stop_profile(self):
+
+        # stop profilers and keep their statistics
+        self.profiler.disable()
+
+        if self._memory_before is not None:
+
+            # allocations of profiler itself are left out
+            after = tracemalloc.take_snapshot().filter_traces(_PROFILER_TRACES)
+            before = self._memory_before.filter_traces(_PROFILER_TRACES)
+            self.memory_stats = after.compare_to(before, 'lineno')
+            if self._memory_started:
+                tracemalloc.stop()
+            self._memory_before = None
+            self._memory_started = False
+
+        self.profile_stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        self.profiler = None
+        self.profile_ticks = 0
+
+    def profile_report(self, limit=20, sort='cumulative'):
+
+        """
+        profile_report - text of last profiling window
+        :param limit: int - functions / allocation sites listed
+        :param sort: str - pstats sort key
+        :return: str - empty if nothing profiled yet
+        """
+
+        if self.profile_stats is None:
+            return ''
+
+        stream = io.StringIO()
+        self.profile_stats.stream = stream
+        self.profile_stats.sort_stats(sort).print_stats(limit)
+
+        if self.memory_stats:
+            stream.write('allocations since profiling started:\n')
+            for stat in self.memory_stats[:limit]:
+                stream.write('{}\n'.format(stat))
+
+        return stream.getvalue()
+
+    def stats(self):
+
+        """
+        stats - summary of instrumented ticks
+        :return: dict - ticks, counters, and per phase calls / total / mean / max (s)
+        """
+
+        phases = dict()
+        for phase, (calls, total, peak) in self.phases.items():
+            phases[phase] = {'calls': calls,
+                             'total': total,
+                             'mean': total/calls,
+                             'max': peak}
+
+        summary = {'ticks': self.ticks,
+                   'counters': {name: self.counters[name] for name in
+                                sorted(set(TICK_COUNTERS) | set(self.counters))},
+                   'phases': phases,
+                   'slowest_tick': dict(self.slowest_tick)}
+
+        return summary
@@ -0,0 +1,313 @@
+import numpy as np
+from lib.utils import epoch_seconds, QUERY_BLOCK_ROWS
+
+"""
+Time-range queries and aggregates over stored run history (tick logs,
+archives, or dicts of columns). Sorted time column is binary searched;
+sums, counts and trapezoidal integrals come from prefix arrays and min/max
+from per-block extremes, all built once per column on first use, so each
+range query is O(1) or O(block) regardless of run length. Stage column,
+if present, is split into per-stage segments for per-stage aggregates.
+"""
+
+AGGREGATES = ('sum', 'mean', 'count', 'min', 'max', 'integral', 'change', 'first', 'last')
+
+# per-stage segments: stage number, row range [start, stop) and time span
+SEGMENT = np.dtype([('stage', np.int64), ('start', np.int64), ('stop', np.int64),
+                    ('t_start', np.float64), ('t_end', np.float64)])
+
+
+class RunQuery:
+
+    """
+    Query layer over columns of single run. Columns are used in place
+      (memory-mapped tick logs stay zero-copy) unless time column needs sorting.
+      NaN samples are skipped by sum/mean/count/min/max; trapezoid segments
+      touching NaN contribute nothing to integral.
+    """
+
+    def __init__(self, columns, time='time', stage='stage', block=QUERY_BLOCK_ROWS):
+
+        """
+        :param columns: structured array (e.g. lib.ticklog.read_tick_log),
+                        or dict of name -> array (n,)
+        :param time: str - name of time column (float seconds)
+        :param stage: str - name of recipe stage column; ignored if missing
+        :param block: int - rows per block of min/max index
+        """
+
+        if isinstance(columns, np.ndarray) and columns.dtype.names:
+            names = columns.dtype.names
+        else:
+            names = tuple(columns)
+
+        t = np.asarray(columns[time], dtype=np.float64)
+
+        # time index must be sorted; reorder rows only if it isn't
+        order = None
+        if t.size > 1 and np.any(t[1:] < t[:-1]):
+            order = np.argsort(t, kind='stable')
+            t = t[order]
+
+        self.time = time
+        self.t = t
+        self.block = block
+        self.columns = {name: (np.asarray(columns[name]) if order is None
+                               else np.asarray(columns[name])[order])
+                        for name in names}
+
+        self._prefix = dict() # column -> (cumulative sum, count, trapezoid area)
+        self._blocks = dict() # column -> (block minima, block maxima)
+
+        self.segments = self._segments(stage) if stage in self.columns \
+                        else np.empty(0, dtype=SEGMENT)
+
+    def __len__(self):
+
+        return self.t.size
+
+    def _segments(self, stage):
+
+        # runs of equal stage number
+        stages = self.columns[stage]
+        if stages.size == 0:
+            return np.empty(0, dtype=SEGMENT)
+
+        starts = np.concatenate(([0], np.flatnonzero(stages[1:] != stages[:-1]) + 1))
+        stops = np.append(starts[1:], stages.size)
+
+        segments = np.empty(starts.size, dtype=SEGMENT)
+        segments['stage'] = stages[starts]
+        segments['start'] = starts
+        segments['stop'] = stops
+        segments['t_start'] = self.t[starts]
+        segments['t_end'] = self.t[stops - 1]
+
+        return segments
+
+    def span(self, start=None, stop=None):
+
+        """
+        span - row range of samples with start <= time <= stop
+        :param start: float or datetime (None = first sample)
+        :param stop: float or datetime (None = last sample)
+        :return: 2-tuple of int - [i, j) row indices
+        """
+
+        i = 0 if start is None else int(np.searchsorted(self.t, epoch_seconds(start), side='left'))
+        j = self.t.size if stop is None else \
+            int(np.searchsorted(self.t, epoch_seconds(stop), side='right'))
+
+        return i, max(i, j)
+
+    def values(self, column, start=None, stop=None):
+
+        """
+        values - samples of column in time range (view, no copy)
+        :return: 2-tuple of np.ndarray - times, values
+        """
+
+        i, j = self.span(start, stop)
+
+        return self.t[i:j], self.columns[column][i:j]
+
+    def at(self, column, t):
+
+        """
+        at - value of column at time t (last sample at or before t)
+        :return: float - NaN if t before first sample
+        """
+
+        i = int(np.searchsorted(self.t, epoch_seconds(t), side='right')) - 1
+
+        return float(self.columns[column][i]) if i >= 0 else np.nan
+
+    def _prefix_of(self, column):
+
+        # prefix sums of finite values, finite counts and trapezoid areas
+        if column not in self._prefix:
+
+            y = np.asarray(self.columns[column], dtype=np.float64)
+            finite = np.isfinite(y)
+
+            total = np.zeros(y.size + 1)
+            np.cumsum(np.where(finite, y, 0), out=total[1:])
+            count = np.zeros(y.size + 1, dtype=np.int64)
+            np.cumsum(finite, out=count[1:])
+
+            # area[k] = trapezoid integral of first k segments
+            with np.errstate(invalid='ignore'):
+                segment = 0.5*(y[1:] + y[:-1])*np.diff(self.t)
+            area = np.zeros(max(y.size, 1))
+            np.cumsum(np.where(np.isfinite(segment), segment, 0), out=area[1:])
+
+            self._prefix[column] = (total, count, area)
+
+        return self._prefix[column]
+
+    def _blocks_of(self, column):
+
+        # minimum and maximum of every block of rows
+        if column not in self._blocks:
+
+            y = np.asarray(self.columns[column], dtype=np.float64)
+            n_blocks = y.size//self.block
+            full = y[:n_blocks*self.block].reshape(n_blocks, self.block)
+
+            with np.errstate(invalid='ignore'):
+                self._blocks[column] = (np.fmin.reduce(full, axis=1, initial=np.inf),
+                                        np.fmax.reduce(full, axis=1, initial=-np.inf))
+
+        return self._blocks[column]
+
+    def _extreme(self, column, i, j, which):
+
+        # min or max of rows [i, j): whole blocks from index, edges scanned
+        y = self.columns[column]
+        ufunc, initial = (np.fmin, np.inf) if which == 'min' else (np.fmax, -np.inf)
+        b = self.block
+
+        if j - i <= 2*b:
+            parts = [y[i:j]]
+        else:
+            first, last = -(-i//b), j//b
+            parts = [y[i:first*b], self._blocks_of(column)[which == 'max'][first:last], y[last*b:j]]
+
+        value = initial
+        for part in parts:
+            if len(part):
+                value = ufunc(value, ufunc.reduce(np.asarray(part, dtype=np.float64), initial=initial))
+
+        # nothing but NaN (or no rows) in range
+        return np.nan if value == initial else float(value)
+
+    def aggregate(self, column, how, start=None, stop=None):
+
+        """
+        aggregate - aggregate of column over time range
+
+        :param column: str - column name
+        :param how: str - 'sum', 'mean', 'count', 'min', 'max', 'integral'
+                    (trapezoidal, as lib.utils.integral with abs_t=False),
+                    'change' (last - first), 'first' or 'last'
+        :param start: float or datetime (None = first sample)
+        :param stop: float or datetime (None = last sample)
+        :return: float - NaN if range empty (0 for sum/count/integral)
+        """
+
+        i, j = self.span(start, stop)
+
+        return self._aggregate(column, how, i, j)
+
+    def _aggregate(self, column, how, i, j):
+
+        # aggregate of rows [i, j)
+        if how in ('min', 'max'):
+            return self._extreme(column, i, j, how)
+
+        if how in ('first', 'last', 'change'):
+            if j <= i:
+                return np.nan
+            y = self.columns[column]
+            if how == 'first':
+                return float(y[i])
+            if how == 'last':
+                return float(y[j - 1])
+            return float(y[j - 1]) - float(y[i])
+
+        total, count, area = self._prefix_of(column)
+
+        if how == 'sum':
+            return float(total[j] - total[i])
+        if how == 'count':
+            return int(count[j] - count[i])
+        if how == 'mean':
+            n = count[j] - count[i]
+            return float(total[j] - total[i])/n if n else np.nan
+        if how == 'integral':
+            return float(area[j - 1] - area[i]) if j - i >= 2 else 0.0
+
+        raise ValueError('unknown aggregate {} (expected one of {})'.format(how, AGGREGATES))
+
+    def _aggregate_bins(self, column, how, bounds):
+
+        """
+        _aggregate_bins - aggregate of consecutive row ranges [bounds[k], bounds[k+1]),
+          vectorized over all ranges
+        :param bounds: np.ndarray (m+1,) - non-decreasing row indices
+        :return: np.ndarray (m,) float64
+        """
+
+        starts, stops = bounds[:-1], bounds[1:]
+        empty = stops <= starts
+
+        if how in ('min', 'max'):
+
+            # one reduceat pass over rows covered by bins
+            if bounds[-1] <= bounds[0]:
+                return np.full(starts.size, np.nan)
+            y = np.asarray(self.columns[column][bounds[0]:bounds[-1]], dtype=np.float64)
+            ufunc = np.fmin if how == 'min' else np.fmax
+            values = ufunc.reduceat(y, np.minimum(starts - bounds[0], y.size - 1))
+
+        elif how in ('first', 'last', 'change'):
+            y = self.columns[column]
+            first = y[np.minimum(starts, y.size - 1)].astype(np.float64)
+            last = y[np.maximum(stops - 1, 0)].astype(np.float64)
+            values = {'first': first, 'last': last, 'change': last - first}[how]
+
+        else:
+            total, count, area = self._prefix_of(column)
+            if how == 'sum':
+                return total[stops] - total[starts]
+            if how == 'count':
+                return (count[stops] - count[starts]).astype(np.float64)
+            if how == 'integral':
+                return np.where(stops - starts >= 2,
+                                area[np.maximum(stops - 1, 0)] - area[starts], 0.0)
+            if how != 'mean':
+                raise ValueError('unknown aggregate {} (expected one of {})'.format(how, AGGREGATES))
+            n = count[stops] - count[starts]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = (total[stops] - total[starts])/n
+            empty = n == 0
+
+        return np.where(empty, np.nan, values)
+
+    def per_stage(self, column, how):
+
+        """
+        per_stage - aggregate of column over each recipe stage segment
+        :return: 2-tuple - segments (SEGMENT array), np.ndarray of aggregates
+        """
+
+        segments = self.segments
+        if segments.size == 0:
+            return segments, np.empty(0)
+
+        bounds = np.append(segments['start'], segments['stop'][-1])
+
+        return segments, self._aggregate_bins(column, how, bounds)
+
+    def per_interval(self, column, how, width, start=None, stop=None):
+
+        """
+        per_interval - aggregate of column over consecutive time bins
+          (e.g. width=3600 for max pressure per hour)
+
+        :param width: float - bin width (s)
+        :return: 2-tuple - bin start times (m,), np.ndarray (m,) of aggregates
+        """
+
+        i, j = self.span(start, stop)
+        if j <= i:
+            return np.empty(0), np.empty(0)
+
+        t0 = self.t[i] if start is None else epoch_seconds(start)
+        t1 = self.t[j - 1]
+        edges = t0 + width*np.arange(int((t1 - t0)//width) + 2)
+
+        # row boundaries of every bin in one search
+        bounds = np.clip(np.searchsorted(self.t, edges, side='left'), i, j)
+
+        return edges[:-1], self._aggregate_bins(column, how, bounds)
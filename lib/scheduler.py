@@ -0,0 +1,161 @@
+import asyncio
+import numpy as np
+from lib.utils import PID_ADJUSTMENT_INCREMENT
+from lib.clock import SYSTEM_CLOCK, SystemClock
+from lib.telemetry import TelemetryBuffer
+
+"""
+Drift-free pacing of the control loop.
+Ticks fire on absolute grid t_start + k*period of monotonic clock,
+so time spent doing work (and slow prints/stage transitions) doesn't
+stretch the loop period.
+"""
+
+# histogram bin edges (s): 0, then 1 us to 10 s logarithmically; last bin open-ended
+LATENCY_BINS = np.concatenate(([0], np.logspace(-6, 1, 15)))
+
+
+class DeadlineScheduler:
+
+    """
+    Sleeps until next absolute tick deadline; counts overruns and records
+      per-tick cycle time (work between ticks) and wake jitter (lateness of wake-up)
+    """
+
+    def __init__(self, period=PID_ADJUSTMENT_INCREMENT, clock=SYSTEM_CLOCK,
+                 bins=LATENCY_BINS):
+
+        """
+        :param period: float - seconds between tick deadlines
+        :param clock: clock providing monotonic() and sleep()
+        :param bins: array - histogram bin edges (s)
+        """
+
+        self.period = period
+        self.clock = clock
+        self.bins = np.asarray(bins, dtype=np.float64)
+
+        self.t_start = None # monotonic time of first deadline
+        self.k = 0          # index of current deadline
+        self.t_wake = None  # monotonic time of last wake-up
+        self.ticks = 0
+        self.overruns = 0   # deadlines missed because work ran past them
+
+        # (deadline, seconds) of recent ticks
+        self.cycle_time = TelemetryBuffer()
+        self.jitter = TelemetryBuffer()
+
+        # running histograms over whole run
+        self.cycle_hist = np.zeros(self.bins.size, dtype=np.int64)
+        self.jitter_hist = np.zeros(self.bins.size, dtype=np.int64)
+
+    def start(self):
+
+        # first deadline is now
+        self.t_start = self.clock.monotonic()
+        self.t_wake = self.t_start
+        self.k = 0
+
+    def _bin(self, seconds):
+
+        # histogram bin index of value (negative values in first bin)
+        i = np.searchsorted(self.bins, seconds, side='right') - 1
+
+        return min(max(i, 0), self.bins.size - 1)
+
+    def next_deadline(self):
+
+        """
+        next_deadline - records work since last wake-up and advances to next
+          tick deadline. If work overran one or more deadlines, they are skipped
+          (and counted) rather than fired late in a burst.
+        :return: 2-tuple of float - deadline (monotonic s), seconds until it
+        """
+
+        if self.t_start is None:
+            self.start()
+
+        now = self.clock.monotonic()
+        deadline_last = self.t_start + self.k*self.period
+
+        # time spent working since last wake-up
+        cycle = now - self.t_wake
+        self.cycle_time.append(deadline_last, cycle)
+        self.cycle_hist[self._bin(cycle)] += 1
+
+        # next deadline on absolute grid; skip deadlines already passed
+        self.k += 1
+        deadline = self.t_start + self.k*self.period
+        if now > deadline:
+            missed = int((now - self.t_start)//self.period) - self.k + 1
+            self.overruns += missed
+            self.k += missed
+            deadline = self.t_start + self.k*self.period
+
+        return deadline, deadline - now
+
+    def woke(self, deadline):
+
+        """
+        woke - records how late wake-up for deadline was
+        :return: float - lateness of wake-up relative to deadline (s)
+        """
+
+        self.t_wake = self.clock.monotonic()
+        lateness = self.t_wake - deadline
+        self.jitter.append(deadline, lateness)
+        self.jitter_hist[self._bin(lateness)] += 1
+        self.ticks += 1
+
+        return lateness
+
+    def wait(self):
+
+        """
+        wait - sleeps on clock until next tick deadline (see next_deadline)
+        :return: float - lateness of wake-up relative to deadline (s)
+        """
+
+        deadline, delay = self.next_deadline()
+        self.clock.sleep(delay)
+
+        return self.woke(deadline)
+
+    async def wait_async(self):
+
+        """
+        wait_async - as wait, but awaits next deadline on asyncio event loop,
+          so other coroutines (e.g. other vessels) run meanwhile.
+          Simulated clocks (e.g. VirtualClock) are advanced to deadline once
+          other coroutines had their turn, so vessels sharing one keep its grid
+        :return: float - lateness of wake-up relative to deadline (s)
+        """
+
+        deadline, delay = self.next_deadline()
+
+        if isinstance(self.clock, SystemClock):
+            await asyncio.sleep(max(delay, 0))
+        else:
+            await asyncio.sleep(0)
+            self.clock.sleep(deadline - self.clock.monotonic())
+
+        return self.woke(deadline)
+
+    def stats(self):
+
+        """
+        stats - summary of run timing
+        :return: dict - tick & overrun counts, mean/p99/max cycle time and jitter (s)
+        """
+
+        summary = {'ticks': self.ticks,
+                   'overruns': self.overruns}
+
+        for name, buf in (('cycle', self.cycle_time), ('jitter', self.jitter)):
+            values = buf.values()
+            if values.size:
+                summary[name + '_mean'] = float(np.mean(values))
+                summary[name + '_p99'] = float(np.percentile(values, 99))
+                summary[name + '_max'] = float(np.max(values))
+
+        return summary
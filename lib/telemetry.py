@@ -0,0 +1,151 @@
+import numpy as np
+from lib.utils import epoch_seconds, time_axis, TELEMETRY_BUFFER_CAPACITY
+
+"""
+Array-backed storage for sensor time series.
+Replaces ever-growing lists of (datetime, float) tuples in the control loop.
+"""
+
+
+class TelemetryBuffer:
+
+    """
+    Fixed-capacity ring buffer of (t_i, y_i) samples stored as float64.
+      Each sample is written twice (at i and i+capacity) so the most recent
+      samples are always contiguous, and windows are returned as zero-copy views.
+      Times are stored as float seconds (epoch seconds for datetimes).
+    """
+
+    def __init__(self, capacity=TELEMETRY_BUFFER_CAPACITY):
+
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+
+        self.capacity = capacity
+        self._data = np.zeros((2*capacity, 2), dtype=np.float64) # mirrored storage
+        self._head = 0  # write position in lower half
+        self._count = 0 # number of stored samples (<= capacity)
+        self.total = 0  # number of samples appended since instantiation
+
+    def __len__(self):
+
+        return self._count
+
+    def append(self, t, y):
+
+        """
+        append - stores sample in O(1), overwriting oldest sample when full
+
+        :param t: datetime, timedelta or float - time of sample
+        :param y: float - sample value
+        """
+
+        t_sec = epoch_seconds(t)
+
+        # write sample to both halves of storage
+        head = self._head
+        self._data[head, 0] = t_sec
+        self._data[head, 1] = y
+        self._data[head + self.capacity, 0] = t_sec
+        self._data[head + self.capacity, 1] = y
+
+        # advance write position
+        self._head = (head + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        self.total += 1
+
+    def extend(self, times, values):
+
+        """
+        extend - stores block of samples at once (e.g. backfilling history).
+          Only last capacity samples are kept if block is longer than buffer.
+
+        :param times: array-like - sample times (datetimes, datetime64 or float seconds)
+        :param values: array-like - sample values
+        """
+
+        t_sec = time_axis(times)
+        ys = np.asarray(values, dtype=np.float64)
+        n = t_sec.size
+        self.total += n
+
+        if n > self.capacity:
+            t_sec, ys = t_sec[-self.capacity:], ys[-self.capacity:]
+            n = self.capacity
+
+        # write block to both halves of storage
+        idx = (self._head + np.arange(n)) % self.capacity
+        for offset in (0, self.capacity):
+            self._data[idx + offset, 0] = t_sec
+            self._data[idx + offset, 1] = ys
+
+        self._head = (self._head + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def window(self, n=None):
+
+        """
+        window - returns most recent samples as (n, 2) array view, oldest first
+
+        :param n: int - number of samples. If None, returns all stored samples
+        :return: np.ndarray view - column 0 times (s), column 1 values
+        """
+
+        if n is None or n > self._count:
+            n = self._count
+
+        end = self._head + self.capacity
+
+        return self._data[end - n:end]
+
+    def times(self, n=None):
+
+        # view of most recent sample times
+        return self.window(n)[:, 0]
+
+    def values(self, n=None):
+
+        # view of most recent sample values
+        return self.window(n)[:, 1]
+
+    def last(self):
+
+        """
+        last - most recent sample
+        :return: tuple (t_i, y_i) or None if buffer empty
+        """
+
+        if not self._count:
+            return None
+
+        t_i, y_i = self._data[self._head + self.capacity - 1]
+
+        return (t_i, y_i)
+
+    def clear(self):
+
+        self._head = 0
+        self._count = 0
+
+    def __getitem__(self, key):
+
+        # integer index returns (t, y) tuple, slices return array views
+        if isinstance(key, slice):
+            return self.window()[key]
+
+        t_i, y_i = self.window()[key]
+
+        return (t_i, y_i)
+
+    def __iter__(self):
+
+        return iter(self.window())
+
+    def __array__(self, dtype=None, copy=None):
+
+        arr = self.window()
+        if dtype is not None:
+            arr = arr.astype(dtype)
+
+        return arr
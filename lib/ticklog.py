@@ -0,0 +1,210 @@
+import mmap
+import threading
+import numpy as np
+from lib.utils import TELEMETRY_BUFFER_CAPACITY
+
+"""
+Append-only binary log of every control tick.
+File is a 64 byte header followed by fixed-size records (TICK_RECORD),
+written through a memory map so appending costs a few stores and never
+waits on disk. Writer bumps record count in header after each record is
+complete, so readers (read_tick_log) can map file as NumPy structured
+array, zero-copy, while run is still in progress.
+"""
+
+TICK_LOG_MAGIC = b'PIDTICK1'
+TICK_LOG_VERSION = 1
+
+# header: count is written last for each record; readers trust count only
+TICK_LOG_HEADER = np.dtype({'names': ['magic', 'version', 'itemsize', 'count', 'capacity'],
+                            'formats': ['S8', '<u4', '<u4', '<u8', '<u8'],
+                            'offsets': [0, 8, 12, 16, 24],
+                            'itemsize': 64})
+
+# one control tick; rates in steps/s, NaN where not available that tick
+TICK_RECORD = np.dtype([('time', '<f8'),      # epoch seconds
+                        ('mass', '<f8'),      # scale reading (g)
+                        ('rate', '<f8'),      # pump sensor rate (steps/s)
+                        ('pressure', '<f8'),  # vessle pressure (atm)
+                        ('setpoint', '<f8'),  # pump rate commanded (steps/s)
+                        ('measured', '<f8'),  # scale-measured pump rate (steps/s)
+                        ('error', '<f8'),     # PID e(t)
+                        ('p', '<f8'),         # k_p*e(t)
+                        ('i', '<f8'),         # k_i*int(e(t))
+                        ('d', '<f8'),         # k_d*de(t)/dt
+                        ('u', '<f8'),         # u(t)
+                        ('stage', '<u4'),     # recipe stage (1-based)
+                        ('flags', '<u2'),     # FLAG_* bits
+                        ('valve', 'u1')], align=True)
+
+# flag bits of TICK_RECORD['flags']
+FLAG_LIMIT_HIT = 1     # pump rate attenuated to engineering/recipe limit
+FLAG_TRANSITION = 2    # recipe stage advanced this tick
+FLAG_STALE = 4         # a sensor answered late; its last value was logged
+FLAG_RELAY = 8         # relay autotune active
+FLAG_HALTED = 16       # vessle conditions halted recipe
+
+# values of fields not passed to append()
+_DEFAULTS = {name: (np.nan if TICK_RECORD[name].kind == 'f' else 0)
+             for name in TICK_RECORD.names}
+
+
+class TickLogWriter:
+
+    """
+    Writes TICK_RECORD rows to memory-mapped file. File grows by whole
+      chunks of records when full. Nothing is fsynced on append; flush()
+      (or background flushing every flush_interval seconds) syncs to disk.
+    """
+
+    def __init__(self, path, capacity=TELEMETRY_BUFFER_CAPACITY, flush_interval=None):
+
+        """
+        :param path: str - log file; overwritten if it exists
+        :param capacity: int - records preallocated (and added per growth)
+        :param flush_interval: float - seconds between background flushes;
+                               None flushes only on flush()/close()
+        """
+
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+
+        self.path = path
+        self.chunk = capacity
+        self.count = 0
+        self._lock = threading.Lock() # guards remapping against background flush
+        self._defaults = tuple(_DEFAULTS[name] for name in TICK_RECORD.names)
+
+        self._file = open(path, 'w+b')
+        self._map(capacity)
+
+        header = self._header
+        header['magic'] = TICK_LOG_MAGIC
+        header['version'] = TICK_LOG_VERSION
+        header['itemsize'] = TICK_RECORD.itemsize
+        header['count'] = 0
+
+        self._stop = threading.Event()
+        self._flusher = None
+        if flush_interval is not None:
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             args=(flush_interval,), daemon=True)
+            self._flusher.start()
+
+    def _map(self, capacity):
+
+        # size file for capacity records and map header & records
+        self._file.truncate(TICK_LOG_HEADER.itemsize + capacity*TICK_RECORD.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        self._header = np.ndarray((), TICK_LOG_HEADER, buffer=self._mmap)
+        self._records = np.ndarray((capacity,), TICK_RECORD, buffer=self._mmap,
+                                   offset=TICK_LOG_HEADER.itemsize)
+        self.capacity = capacity
+        self._header['capacity'] = capacity
+
+    def _grow(self):
+
+        # remap with another chunk of records; readers' maps stay valid
+        with self._lock:
+            self._header = self._records = None
+            self._mmap.close()
+            self._map(self.capacity + self.chunk)
+
+    def __len__(self):
+
+        return self.count
+
+    def append(self, **fields):
+
+        """
+        append - writes one tick record in O(1)
+
+        :param fields: TICK_RECORD field values; missing floats are NaN, ints 0
+        """
+
+        if self.count == self.capacity:
+            self._grow()
+
+        row = self._defaults
+        if fields:
+            row = tuple(fields.get(name, default) for name, default
+                        in zip(TICK_RECORD.names, self._defaults))
+
+        # record first, then count, so readers never see partial record
+        self._records[self.count] = row
+        self.count += 1
+        self._header['count'] = self.count
+
+    @property
+    def records(self):
+
+        # copy of records written so far; views of map would dangle after grow/close
+        return self._records[:self.count].copy()
+
+    def flush(self):
+
+        # sync mapped pages to disk (blocks caller until written)
+        with self._lock:
+            if self._mmap is not None and not self._mmap.closed:
+                self._mmap.flush()
+
+    def _flush_loop(self, interval):
+
+        # background flushing keeps fsync off control loop thread
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def close(self):
+
+        """
+        close - stops background flushing, syncs file and trims unused capacity
+        """
+
+        if self._file.closed:
+            return
+
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+
+        self.flush()
+        with self._lock:
+            self._header = self._records = None
+            self._mmap.close()
+            self._file.truncate(TICK_LOG_HEADER.itemsize + self.count*TICK_RECORD.itemsize)
+            self._file.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+        return False
+
+
+def read_tick_log(path):
+
+    """
+    read_tick_log - maps tick log as structured array without copying.
+      Safe while writer is running: only records counted in header are mapped.
+
+    :param path: str - log written by TickLogWriter
+    :return: np.memmap of TICK_RECORD (read only); empty array if no records yet
+    """
+
+    header = np.fromfile(path, dtype=TICK_LOG_HEADER, count=1)
+    if header.size == 0 or header['magic'][0] != TICK_LOG_MAGIC:
+        raise ValueError('{} is not a tick log'.format(path))
+    if header['itemsize'][0] != TICK_RECORD.itemsize:
+        raise ValueError('tick log record size {} does not match TICK_RECORD ({})'
+                         .format(header['itemsize'][0], TICK_RECORD.itemsize))
+
+    count = int(header['count'][0])
+    if count == 0:
+        return np.empty(0, dtype=TICK_RECORD)
+
+    return np.memmap(path, dtype=TICK_RECORD, mode='r',
+                     offset=TICK_LOG_HEADER.itemsize, shape=(count,))
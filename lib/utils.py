@@ -1,6 +1,10 @@
 import numpy as np
 from copy import deepcopy
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+# trapezoidal rule (np.trapz renamed in numpy 2)
+_trapz = getattr(np, 'trapezoid', None) or np.trapz
 
 # System default values
 VESSLE_PRESSURE_LIMIT = 5 #atm
@@ -13,6 +17,180 @@ MIN_PUMP_RATE = 0.1 #steps/sec
 PID_ADJUSTMENT_INCREMENT = 1 #second
 DEFAULT_K = np.array([1,0,0]) # default pid tune parameters
 DEFAULT_REACTOR_MODEL = 'ficticfeed100'
+TELEMETRY_BUFFER_CAPACITY = 86400 # samples kept per sensor (24 hours at 1 Hz)
+ARCHIVE_CHUNK_ROWS = 3600 # rows per compressed archive chunk (1 hour at 1 Hz)
+QUERY_BLOCK_ROWS = 1024 # rows per block of run query min/max index
+TREND_TIERS = (10, 60, 600) # seconds per bucket of live trend downsampling tiers
+TREND_BUCKETS = 4096 # buckets kept per trend tier (~11 h at 10 s, ~28 days at 10 min)
+TREND_RAW_CAPACITY = 3600 # raw samples kept by trend for zoomed-in windows
+LTTB_OVERSAMPLE = 4 # source points per output point LTTB chooses from
+PID_ERROR_HISTORY = 3600 # e(t) samples kept by PID for diagnostics
+PID_DERIVATIVE_FILTER = 0.5 # de(t)/dt smoothing factor (1 = unfiltered)
+RELAY_AMPLITUDE = 0.2 # relay autotune swing, fraction of stage pump rate
+RELAY_CYCLES = 4 # relay oscillations measured by autotune (first is discarded)
+SENSOR_TIMEOUT = 0.1 # seconds allowed per device read before reading marked stale
+TICK_LOG_FLUSH_INTERVAL = 5 # seconds between background syncs of tick log to disk
+
+EPOCH = datetime(1970, 1, 1) # reference for naive datetimes (same as datetime64)
+
+def epoch_seconds(t):
+
+    """
+    epoch_seconds - converts single time value into float seconds
+
+    :param t: datetime - converted to seconds since epoch
+              timedelta - converted to total seconds (incl. days & microseconds)
+              float/int - returned as float
+    :return: float - time in seconds
+    """
+
+    if isinstance(t, datetime):
+        # naive datetimes counted from EPOCH, consistent with time_axis()
+        if t.tzinfo is None:
+            t_sec = (t - EPOCH).total_seconds()
+        else:
+            t_sec = t.timestamp()
+    elif isinstance(t, timedelta):
+        t_sec = t.total_seconds()
+    elif isinstance(t, (np.datetime64, np.timedelta64)):
+        t_sec = float(time_axis(np.array([t]))[0])
+    else:
+        t_sec = float(t)
+
+    return t_sec
+
+
+def time_axis(times):
+
+    """
+    time_axis - vectorized conversion of sample times into float seconds.
+      datetime64/timedelta64 arrays are converted without python-level loops.
+      datetime/timedelta object arrays are converted in single pass.
+
+    :param times: array-like of datetime64, timedelta64, datetime, timedelta or float
+    :return: np.ndarray float64 - epoch seconds (absolute times) or seconds (relative times)
+    """
+
+    times = np.asarray(times)
+
+    if times.dtype.kind == 'O':
+        # python datetime/timedelta objects: single pass over objects
+        ts = np.fromiter([epoch_seconds(t) for t in times.flat],
+                         np.float64, times.size).reshape(times.shape)
+    elif times.dtype.kind == 'M':
+        # absolute times: microseconds since epoch
+        ts = times.astype('datetime64[us]').astype(np.int64) * 1e-6
+    elif times.dtype.kind == 'm':
+        # relative times: microseconds
+        ts = times.astype('timedelta64[us]').astype(np.int64) * 1e-6
+    else:
+        ts = times.astype(np.float64, copy=False)
+
+    return ts
+
+
+def as_points(points, values=None):
+
+    """
+    as_points - ingests time series into (n, 2) float64 array of [t_i (s), y_i].
+      Float arrays and TelemetryBuffers pass through without copying, so
+      converting once at ingestion makes repeated integral()/derivative() calls cheap.
+
+    :param points: list of ordered tuples e.g. [(t_i, y_i)], (n, 2) array,
+                   TelemetryBuffer, or array of times if values specified
+    :param values: array-like y_i values corresponding to times in points
+    :return: np.ndarray float64 (n, 2) - column 0 times in seconds, column 1 values
+    """
+
+    if values is not None:
+        # separate time and value columns
+        points_arr = np.column_stack((time_axis(points),
+                                      np.asarray(values, dtype=np.float64)))
+
+    elif hasattr(points, 'window'):
+        # telemetry buffer already stores time-ordered float seconds
+        points_arr = points.window()
+
+    elif isinstance(points, np.ndarray) and points.dtype.kind in 'fiu':
+        # numeric array; no cleanup necessary
+        points_arr = points.astype(np.float64, copy=False).reshape(-1, 2)
+
+    elif len(points) and isinstance(points[0][0], (datetime, timedelta)):
+        # list of tuples w/ python times: convert time column once
+        n = len(points)
+        ts = np.fromiter([epoch_seconds(p[0]) for p in points], np.float64, n)
+        ys = np.fromiter([p[1] for p in points], np.float64, n)
+        points_arr = np.column_stack((ts, ys))
+
+    elif len(points):
+        # list of numeric tuples
+        points_arr = np.array(points, dtype=np.float64).reshape(-1, 2)
+
+    else:
+        points_arr = np.empty((0, 2))
+
+    # sort by time if not already ordered
+    if points_arr.shape[0] > 1 and np.any(points_arr[1:, 0] < points_arr[:-1, 0]):
+        points_arr = points_arr[np.argsort(points_arr[:,0], kind='stable')]
+
+    return points_arr
+
+
+# time units: (length in seconds, power)
+TIME_UNITS = {'sec': (1, 1),
+              'min': (60, 1),
+              'hour': (3600, 1),
+              'sec^2': (1, 2),
+              'min^2': (60, 2),
+              'hour^2': (3600, 2)}
+
+
+@lru_cache(maxsize=None)
+def rate_factor(num_in=None, num_out=None, den_in=None, den_out=None,
+                step_constant=NOMINAL_VOL_PER_STEP,
+                density=GLUCOSE_SOLN_DENSITY):
+
+    """
+    rate_factor - resolves unit pair into single multiplicative factor.
+      Results are cached, so each unit combination is only resolved once.
+
+    :param num_in: str - input numerator unit ('v', 's' or 'm'); None for no conversion
+    :param num_out: str - output numerator unit
+    :param den_in: str - input denominator unit (e.g. 'sec', 'min^2'); None for no conversion
+    :param den_out: str - output denominator unit
+    :step_constant: float - volume transferred per pump step (mL per step)
+    :density: float - density of solution being pumped (g/mL)
+    :return: float - factor such that rate_out = rate_in * factor
+    """
+
+    factor = 1
+
+    # numerator: convert input amount to mL, then mL to output amount
+    if num_in is not None and num_out is not None and num_in != num_out:
+
+        amount_mL = {'v': 1,
+                     's': step_constant, # mL/step
+                     'm': 1/density}     # mL/g
+        if num_in not in amount_mL or num_out not in amount_mL:
+            raise ValueError('unknown amount units {}'.format([num_in, num_out]))
+
+        factor *= amount_mL[num_in] / amount_mL[num_out]
+
+    # denominator: rescale per-time unit
+    if den_in is not None and den_out is not None and den_in != den_out:
+
+        if den_in not in TIME_UNITS or den_out not in TIME_UNITS:
+            raise ValueError('unknown time units {}'.format([den_in, den_out]))
+
+        length_in, power_in = TIME_UNITS[den_in]
+        length_out, power_out = TIME_UNITS[den_out]
+        if power_in != power_out:
+            raise ValueError('incompatible time units {}'.format([den_in, den_out]))
+
+        factor *= (length_out / length_in)**power_in
+
+    return factor
+
 
 def convert_rate(rate, units_num = ['v', 's'], units_den = None,
                   step_constant=NOMINAL_VOL_PER_STEP,
@@ -21,7 +199,7 @@ def convert_rate(rate, units_num = ['v', 's'], units_den = None,
     """
     pump step to gram conversion
 
-    :param rate: float - rate to be converted
+    :param rate: float or np.ndarray - rate(s) to be converted
 
     :param units_num: list - conversion units input/output (numerator).
                        First position is input, second output.
@@ -40,64 +218,20 @@ def convert_rate(rate, units_num = ['v', 's'], units_den = None,
 
     :density: float - density of solution being pumped (g/mL)
 
-    :return: float - pump rate in desired units
+    :return: float or np.ndarray - pump rate in desired units
     """
 
-    # factors used if density or step -> vol conversions take place
-    step_factor = 1
-    density_factor = 1
-    time_factor = 1
-
-    # if numerator value is to be converted
-    if units_num:
-
-        # determine whether to multiply or divide by step_constant
-        if units_num[0]=='s' and units_num[1]!='s':
-            step_factor = step_constant
-        if units_num[1]=='s' and units_num[0]!='s':
-            step_factor = 1/step_constant
-
-        # determine whether to multiply or divide by density
-        if units_num[0]=='m' and units_num[1]!='m':
-            denisty_factor = 1/density
-        if units_num[1]=='m' and units_num[0]!='m':
-            density_factor = density
-
-    # convert time units if present
-    if units_den:
-
-        # determine relative scale of time units
-        timescale = list()
-        for u in units_den:
-
-            # Convert from hour <-> min <-> sec rates
-            if u=='sec' and ('min' in set(units_den) or \
-                             'hour' in set(units_den)):
-                timescale.append(1)
-            elif u=='min' and ('sec' in set(units_den) or \
-                             'hour' in set(units_den)):
-                timescale.append(2)
-            elif u=='hour'and ('sec' in set(units_den) or \
-                             'min' in set(units_den)):
-                timescale.append(3)
-                
-            # acceleration unit conversion rates
-            elif u=='sec^2' and 'min^2' in units_den:
-                timescale.append(2) 
-            elif u=='min^2' and 'sec^2' in units_den:
-                timescale.append(4)
-        # if timescale none
-        if not timescale:
-            timescale=[1,1]
-        # calculate conversion rate for given units
-        t_exp = timescale[1] - timescale[0]
-        time_factor = 60**t_exp
-
-    # multiply given rate by conversion factors
-    converted_rate = rate * step_factor * density_factor * time_factor
+    # unpack units into hashable factor lookup
+    num_in, num_out = units_num if units_num else (None, None)
+    den_in, den_out = units_den if units_den else (None, None)
 
-    return converted_rate
+    factor = rate_factor(num_in, num_out, den_in, den_out,
+                         step_constant, density)
 
+    # multiply given rate by conversion factor
+    converted_rate = rate * factor
+
+    return converted_rate
 
 
 def integral(points, segment_start=None, segment_end=None, abs_t=True):
@@ -105,7 +239,8 @@ def integral(points, segment_start=None, segment_end=None, abs_t=True):
     """
     discrete integral - trapezoidal method
 
-    :param points: list of ordered tuples e.g. [(t_i, y_i)]
+    :param points: list of ordered tuples e.g. [(t_i, y_i)], TelemetryBuffer,
+                   or (n, 2) float array from as_points()
 
     :param segment_start: start index position of start of segment to be integrated
 
@@ -114,38 +249,21 @@ def integral(points, segment_start=None, segment_end=None, abs_t=True):
     :param abs_t: bool if True adds absolute value of negative t values to summand i
     """
 
-    # Convert to array, sort by first index
-    points_arr = np.array(points)
-    points_arr[np.argsort(points_arr[:,0])]
+    # Convert to float seconds array sorted by time
+    points_arr = as_points(points)
+    ts = points_arr[:,0]
 
     if segment_end:
         segment_end+=1
 
-    # If absolute times listed in dt, convert to relative time (in seconds) 
-    if isinstance(points_arr[0,0], datetime):
-
-        # Convert datetime objects into time relative to first point (in sec)
-        relative_time = points_arr[:,0] - points_arr[0,0]
-        relative_time = np.array(relative_time)
-        ts = np.array(list(map(lambda t: t.seconds, relative_time)))
-
-    # if relative timedeltas, convert to seconds
-    elif isinstance(points_arr[0,0], timedelta):
-        ts=np.array(list(map(lambda t: t.seconds, points_arr[:,0])))    
-
-    else:
-        # otherwise, no cleanup necessary
-        ts = points_arr[:,0]
-
-    # Calculate delta values of points
-    dt = np.diff(ts)
+    # Select segment to integrate
     t_seg = ts[segment_start:segment_end]
     y_seg = points_arr[segment_start:segment_end,1]
     
     if not abs_t:
         
         # negative t values possible
-        integral_trap = np.trapz(y_seg, t_seg)
+        integral_trap = _trapz(y_seg, t_seg)
         
     else:
         #absolute values of t values
@@ -155,10 +273,10 @@ def integral(points, segment_start=None, segment_end=None, abs_t=True):
         negative_t_index = np.where(t_seg < 0)
         
         # positive integral
-        integral_pos = np.trapz(y_seg[positive_t_index],
+        integral_pos = _trapz(y_seg[positive_t_index],
                                 t_seg[positive_t_index])
         # negative integral
-        integral_neg = np.trapz(y_seg[negative_t_index],
+        integral_neg = _trapz(y_seg[negative_t_index],
                                 t_seg[negative_t_index])
 
         # absolute value of integral
@@ -172,39 +290,33 @@ def derivative(points, t_0=None):
     """
     discrete derivative - calculates differenial quotient between closest points
 
-    :param points_tup: list of ordered tuples e.g. [(t_i, y_i)]
+    :param points_tup: list of ordered tuples e.g. [(t_i, y_i)], TelemetryBuffer,
+                       or (n, 2) float array from as_points()
 
-    :param t_0: float position of tangent. If none, returns slope of last segment
+    :param t_0: float (or datetime/timedelta) position of tangent. If none, returns slope of last segment
+                array-like - positions of many tangents, resolved in single pass
 
     :return: diff_x_0 float - Difference quotient for specified time interval (or last listed time interval)
+             np.ndarray if t_0 is array-like (NaN where t_0 out of range)
     """
 
     # Instantiate return
     diff_x_t0 = None
     
-    # Convert to array, sort by first index
-    points_arr = np.array(points)
-    points_arr[np.argsort(points_arr[:,0])]
+    # Convert to float seconds array sorted by time
+    points_arr = as_points(points)
 
     # proceed if there are enough points to calculate differential
     if points_arr.shape[0] >= 2:
 
-        # If absolute times listed in dt, convert to relative time (in seconds) 
-        if isinstance(points_arr[0,0], datetime):
-
-            # Convert datetime objects into time relative to first point (in sec)
-            relative_time = points_arr[:,0] - points_arr[0,0]
-            relative_time = np.array(relative_time)
-            ts = np.array(list(map(lambda t: t.seconds, relative_time)))
+        ts = points_arr[:,0]
 
-        # if relative timedeltas, convert to seconds
-        elif isinstance(points_arr[0,0], timedelta):
-            ts=np.array(list(map(lambda t: t.seconds, points_arr[:,0])))    
+        # express tangent position(s) in same time units as points
+        if t_0 is not None and np.ndim(t_0):
+            t_0 = time_axis(t_0)
+        elif t_0 is not None:
+            t_0 = epoch_seconds(t_0)
 
-        else:
-            # otherwise, no cleanup necessary
-            ts = points_arr[:,0]
-            
         # Calculate delta values of points
         dt = np.diff(ts)
         dy = np.diff(points_arr[:,1])
@@ -212,8 +324,8 @@ def derivative(points, t_0=None):
         if dt.size and dy.size:
 
             # take differenital quoient, excepting zero denominators    
-            differential_delta = [dy[i]/dt[i] if dt[i] else np.NaN \
-                                  for i in range(dy.size)]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                differential_delta = np.where(dt != 0, dy/dt, np.nan)
 
             if t_0 is None:
 
@@ -223,55 +335,36 @@ def derivative(points, t_0=None):
             else:
 
                 # If t_0 is specified, select tangent corresponding to
-                #   corresponding time interval for t_0 from differential_delta list
-
-                # Assign left boundary to corresponding time interval of slope
-                differential_delta = np.array(list(zip(points_arr[1:, 0], differential_delta)))
-                
-                if t_0 <= points_arr[-1, 0] and\
-                   t_0 >= points_arr[0,0]:
-                   # confirm t is within range
-
-                    if t_0 not in points_arr[:,0]:
-
-                        # If t_0 is not a boundary value, simply select corrresponding time interval
-
-                        # Increment through points until t_i is closest left boundary to t_0
-                        i=0
-                        t_i = points_arr[0,0]
-                        while t_0 > t_i:
-                            # cycle through derivaive values until t_0 segment
-                            t_i = differential_delta[i, 0]
-                            d_i = differential_delta[i, 1]
-                            i+=1
-
-                        # dervative of closet left-most boundary is t_0's correpsonding tangent
-                        diff_x_t0 = d_i
-
-                    elif t_0 < points_arr[-1, 0]:
-
-                        # If t_0 is intermediate boundary value, take average of two adjacent tangents
-
-                        # Retrieve index of corresponding left boundary 
-                        i = np.where(points_arr[:,0]==t_0)[0][0]
-
-                        # If start of series, return single adjacent boundary (right tangent doesn't exist)
-                        if i==0:
-                             diff_x_t0 = differential_delta[0,1]
-
-                        # If intermediate boundary value, return average
-                        elif isinstance(i, int) or \
-                             isinstance(i, np.int64):
-
-                            diff_x_t0 = (differential_delta[i-1,1] + differential_delta[i,1])/2
-                    else:
-                        # by process of elimination t_0 = points_arr[-1,0]
-                        
-                        # return last element
-                        diff_x_t0 = differential_delta[-1,1]
-
+                #   corresponding time interval for t_0 from differential_delta
+
+                # Locate closest boundary at or right of each t_0
+                t_q = np.atleast_1d(t_0)
+                n = ts.size
+                i = np.searchsorted(ts, t_q, side='left')
+                i_b = np.minimum(i, n-1)
+                is_boundary = ts[i_b] == t_q
+
+                # If t_0 is not a boundary value, simply select corrresponding time interval
+                diff_q = differential_delta[np.clip(i-1, 0, n-2)]
+
+                # If t_0 is boundary value, take average of two adjacent tangents
+                #  (first & last boundaries only have one adjacent tangent)
+                left_tangent = differential_delta[np.clip(i_b-1, 0, n-2)]
+                right_tangent = differential_delta[np.minimum(i_b, n-2)]
+                diff_q = np.where(is_boundary,
+                                  (left_tangent + right_tangent)/2,
+                                  diff_q)
+
+                # t_0 > t_max or < t_min; derivative undefined
+                in_range = (t_q >= ts[0]) & (t_q <= ts[-1])
+                diff_q = np.where(in_range, diff_q, np.nan)
+
+                if np.ndim(t_0):
+                    diff_x_t0 = diff_q
+                elif in_range[0]:
+                    diff_x_t0 = diff_q[0]
                 else:
-                    # raise error/record in log and return None; t_0 > t_max or < t_min; 
+                    # raise error/record in log and return None
                     pass
                     
         else:
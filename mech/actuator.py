@@ -1,6 +1,8 @@
 import time
 import numpy as np
+from copy import deepcopy
 from lib.utils import *
+from lib.clock import SYSTEM_CLOCK
 
 """
 Contains actuator functions controlling actual mechanical devices.
@@ -11,6 +13,10 @@ I took liberties with available actuators to make system more realistic,
 adding in pressure reading for safety and control valve (e.g. 8-port)
 connecting feed stock resivor and pump with vessle,
 which would be needed for priming, pump calibration, and safety autoshutoff.
+
+Each MockBackend instance simulates the devices of one reactor, so several
+reactors can be driven in one process. Module-level functions act on
+DEFAULT_BACKEND, which shares its state with MOCK_ACTUATOR.
 """
 
 # fake system
@@ -20,187 +26,240 @@ MOCK_ACTUATOR = {'VALVE': 0,
                  'PRESSURE': 1,
                  'TUNE': [1,0,0]}
 
-def pressure():
+# initial state of each newly-instantiated mock reactor
+MOCK_DEFAULTS = deepcopy(MOCK_ACTUATOR)
+
+
+class MockBackend:
 
     """
-    pressure - reads current pressure of reaction vessle.
-      :return: float returns current pressure of vessle (in atm)
+    Simulated devices (pump, scale, pressure sensor, valve) of single reactor
     """
 
-    # add 0.01 atm for every read
-    MOCK_ACTUATOR['PRESSURE'] += 0.01
-    pressure_reading = MOCK_ACTUATOR['PRESSURE']
-    
-    return pressure_reading
+    def __init__(self, state=None, clock=SYSTEM_CLOCK):
 
+        # device state; fresh copy of default mock system if not specified
+        if state is None:
+            state = deepcopy(MOCK_DEFAULTS)
+        self.state = state
 
-def pump(rate=None):
+        # clock used by timed pump runs
+        self.clock = clock
 
-    """
-    :param rate: var - float: desired pump rate in steps/second
-                       chr: 'f' increases pump rate by 5%
-                       chr: 's' decreases pump rate by 5%
-                       list: list of rate, preset steps
-                            e.g. [5, 10] is 5 steps/seconds for 10 steps
-                       int - number of steps to complete before stopping
-    :return: returns current pump rate (steps/s) if rate=None
-             if rate is not None, returns True for success False for error
-            
+    def pressure(self):
 
-    """
+        """
+        pressure - reads current pressure of reaction vessle.
+          :return: float returns current pressure of vessle (in atm)
+        """
 
-    pump_return = False
-    current_rate = MOCK_ACTUATOR['PUMP']
+        # add 0.01 atm for every read
+        self.state['PRESSURE'] += 0.01
+        pressure_reading = self.state['PRESSURE']
 
-    if rate is not None:
-        # moves pump faster
-        if rate=='f':
+        return pressure_reading
 
-            # Check if too fast
-            if abs(current_rate * 1.05) <= MAX_PUMP_RATE:
-                MOCK_ACTUATOR['PUMP'] = current_rate * 1.05
-                pump_return = True
-            else:
-               # set to max rate if too fast; return error
-               MOCK_ACTUATOR['PUMP'] = MAX_PUMP_RATE
-               print('whirrr!') # highly realistic fast pump noise
 
-        # moves pump slower
-        if rate=='s':
+    def pump(self, rate=None):
 
-            # Check if too slow
-            if abs(current_rate * 0.95) > MIN_PUMP_RATE:
-                MOCK_ACTUATOR['PUMP'] = current_rate * 0.95
-                pump_return = True
-            else:
-                # set to zero if too slow; return error
-                MOCK_ACTUATOR['PUMP'] = 0
-                print('record scratch noise') # sound of pump grinding to halt
+        """
+        :param rate: var - float: desired pump rate in steps/second
+                           chr: 'f' increases pump rate by 5%
+                           chr: 's' decreases pump rate by 5%
+                           list: list of rate, preset steps
+                                e.g. [5, 10] is 5 steps/seconds for 10 steps
+                           int - number of steps to complete before stopping
+        :return: returns current pump rate (steps/s) if rate=None
+                 if rate is not None, returns True for success False for error
 
-        # moves pump at given rate
-        if isinstance(rate, float) or isinstance(rate, int):
 
-            if abs(rate) <= MAX_PUMP_RATE and \
-               abs(rate) >= MIN_PUMP_RATE:
+        """
 
-                MOCK_ACTUATOR['PUMP'] = rate
-                pump_return = True
+        pump_return = False
+        current_rate = self.state['PUMP']
 
-        # moves pump at given rate for given period of time
-        if isinstance(rate, list) and \
-           isinstance(rate[0], float) and isinstance(rate[1], int):
+        if rate is not None:
+            # moves pump faster
+            if rate=='f':
 
-            # clean up rates
-            if abs(rate[0]) <= MAX_PUMP_RATE and \
-               abs(rate[0]) >= MIN_PUMP_RATE:
+                # Check if too fast
+                if abs(current_rate * 1.05) <= MAX_PUMP_RATE:
+                    self.state['PUMP'] = current_rate * 1.05
+                    pump_return = True
+                else:
+                   # set to max rate if too fast; return error
+                   self.state['PUMP'] = MAX_PUMP_RATE
+                   print('whirrr!') # highly realistic fast pump noise
 
-                # calculate duration of steps
-                duration = rate[1] / rate[0]
+            # moves pump slower
+            if rate=='s':
 
-                MOCK_ACTUATOR['PUMP'] = rate[0]
-                
-                # Achieve specified steps by
-                #  causing program to freeze for duration specified
-                duration = round(duration)
-                print('Zzz...')
-                time.sleep(duration)
+                # Check if too slow
+                if abs(current_rate * 0.95) > MIN_PUMP_RATE:
+                    self.state['PUMP'] = current_rate * 0.95
+                    pump_return = True
+                else:
+                    # set to zero if too slow; return error
+                    self.state['PUMP'] = 0
+                    print('record scratch noise') # sound of pump grinding to halt
 
-                pump_return = True
+            # moves pump at given rate
+            if isinstance(rate, float) or isinstance(rate, int):
 
-    else:
-        # read current pump rate
-        pump_return = MOCK_ACTUATOR['PUMP']
+                if abs(rate) <= MAX_PUMP_RATE and \
+                   abs(rate) >= MIN_PUMP_RATE:
 
-    return pump_return
+                    self.state['PUMP'] = rate
+                    pump_return = True
 
+            # moves pump at given rate for given period of time
+            if isinstance(rate, list) and \
+               isinstance(rate[0], float) and isinstance(rate[1], int):
 
-def scale(tare=False):
+                # clean up rates
+                if abs(rate[0]) <= MAX_PUMP_RATE and \
+                   abs(rate[0]) >= MIN_PUMP_RATE:
 
-    """
-    :param tare: bool - if True tares the scale back to zero
-    :return: returns current scale reading (in grams) if tare is False
-             if tare = True returns True for success False for error
-             if tare = False returns current pump rate (steps/s) if rate=None
+                    # calculate duration of steps
+                    duration = rate[1] / rate[0]
 
-    """
+                    self.state['PUMP'] = rate[0]
 
-    scale_return=0
-   
-    #zero scale
-    if tare:
-        MOCK_ACTUATOR['SCALE'] = 0
-        scale_return = True
-    elif tare is False:
-        #read scale; decrement by nominal mass each read
-         MOCK_ACTUATOR['SCALE'] -= abs(MOCK_ACTUATOR['PUMP'] * NOMINAL_MASS_PER_STEP)
-         scale_return = MOCK_ACTUATOR['SCALE']
-         
-    else:
-        # scale malfuncion onomatopoeia 
-        print('bzzzt!')
+                    # Achieve specified steps by
+                    #  causing program to freeze for duration specified
+                    duration = round(duration)
+                    print('Zzz...')
+                    self.clock.sleep(duration)
 
-    if scale_return < -1:
-        raise Exception('out of feed')
+                    pump_return = True
 
-    return scale_return
+        else:
+            # read current pump rate
+            pump_return = self.state['PUMP']
 
+        return pump_return
 
-def valve(position=None):
 
-    """
-    valve - sets position of valve and states current position of valve
-            valve connects feed resivoir and pump to reactor vessle. 
-    :param: position int - 1 = open/online with feed vessle
-                           0 = closed - feed goes straight to waste vessle
-                           None = states which position valve is in
-
-    :return: returns int 1 or 0 corresponding to position of valve
-             returns None if error
-    """
+    def scale(self, tare=False):
 
-    # Read valve position
-    if position is None:
-        valve_position = MOCK_ACTUATOR['VALVE']
+        """
+        :param tare: bool - if True tares the scale back to zero
+        :return: returns current scale reading (in grams) if tare is False
+                 if tare = True returns True for success False for error
+                 if tare = False returns current pump rate (steps/s) if rate=None
 
-    # open valve
-    elif position==1:
+        """
 
-        # fake valve read
-        MOCK_ACTUATOR['VALVE'] = position
+        scale_return=0
 
-        #return new position
-        valve_position = MOCK_ACTUATOR['VALVE']
+        #zero scale
+        if tare:
+            self.state['SCALE'] = 0
+            scale_return = True
+        elif tare is False:
+            #read scale; decrement by nominal mass each read
+             self.state['SCALE'] -= abs(self.state['PUMP'] * NOMINAL_MASS_PER_STEP)
+             scale_return = self.state['SCALE']
 
-        # for versimilitude
-        print('boop beep') 
-        
-    #close valve
-    elif position==0:
-        MOCK_ACTUATOR['VALVE'] = position
-        print('beep bloop') # highly realistic pump simulation
-        valve_position = MOCK_ACTUATOR['VALVE']
+        else:
+            # scale malfuncion onomatopoeia 
+            print('bzzzt!')
 
-    # invalid input
-    else:
-        print('confused bloop beep') # confused pump noises
-        valve_position = None
-    
-    return valve_position
+        if scale_return < -1:
+            raise Exception('out of feed')
 
+        return scale_return
 
-def tune():
 
-    """
-    Tune control loop - tunes PID coefficients manually
-      or algorithmically (e.g. using Ziegler-Nichols method 
-   
-    :return: list - PID coefficients K=[k_p, k_i, k_d]
+    def valve(self, position=None):
+
+        """
+        valve - sets position of valve and states current position of valve
+                valve connects feed resivoir and pump to reactor vessle. 
+        :param: position int - 1 = open/online with feed vessle
+                               0 = closed - feed goes straight to waste vessle
+                               None = states which position valve is in
+
+        :return: returns int 1 or 0 corresponding to position of valve
+                 returns None if error
+        """
+
+        # Read valve position
+        if position is None:
+            valve_position = self.state['VALVE']
+
+        # open valve
+        elif position==1:
+
+            # fake valve read
+            self.state['VALVE'] = position
+
+            #return new position
+            valve_position = self.state['VALVE']
+
+            # for versimilitude
+            print('boop beep') 
+
+        #close valve
+        elif position==0:
+            self.state['VALVE'] = position
+            print('beep bloop') # highly realistic pump simulation
+            valve_position = self.state['VALVE']
+
+        # invalid input
+        else:
+            print('confused bloop beep') # confused pump noises
+            valve_position = None
+
+        return valve_position
 
-      """
 
-    # since this system is fictitious, just make up numbers
-    very_sophisticated_tuning_algorithm_results = MOCK_ACTUATOR['TUNE']
-    K = np.array(very_sophisticated_tuning_algorithm_results)
+    def tune(self):
 
-    return K
+        """
+        Tune control loop - tunes PID coefficients manually
+          or algorithmically (e.g. using Ziegler-Nichols method 
+
+        :return: list - PID coefficients K=[k_p, k_i, k_d]
+
+          """
+
+        # since this system is fictitious, just make up numbers
+        very_sophisticated_tuning_algorithm_results = self.state['TUNE']
+        K = np.array(very_sophisticated_tuning_algorithm_results)
+
+        return K
+
+
+# devices of default (module-level) reactor
+DEFAULT_BACKEND = MockBackend(MOCK_ACTUATOR)
+
+
+def pressure():
+
+    # read pressure of default reactor
+    return DEFAULT_BACKEND.pressure()
+
+
+def pump(rate=None):
+
+    # set/read pump of default reactor
+    return DEFAULT_BACKEND.pump(rate)
+
+
+def scale(tare=False):
+
+    # read/tare scale of default reactor
+    return DEFAULT_BACKEND.scale(tare)
+
+
+def valve(position=None):
+
+    # set/read valve of default reactor
+    return DEFAULT_BACKEND.valve(position)
+
+
+def tune():
 
+    # tune coefficients of default reactor
+    return DEFAULT_BACKEND.tune()
@@ -1,6 +1,10 @@
 from mech.actuator import *
 from lib.utils import *
+from lib.clock import SYSTEM_CLOCK
 from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import time
 
 
 """
@@ -9,7 +13,175 @@ One layer up from direct actuator functions
 
 """
 
-def current_readings(sensor=None, rate_units=['s', 'sec']):    
+# sensors read each tick
+SENSORS = ('mass', 'rate', 'time', 'pressure', 'valve')
+
+
+class SensorSnapshot(namedtuple('SensorSnapshot', SENSORS + ('stale',),
+                                defaults=(frozenset(),))):
+
+    """
+    Immutable readings of every sensor, acquired once per tick and shared by
+      control loop, recipe stage transitions and safety checks.
+      scale mass (g), pump rate (steps/s), time (datetime), pressure (atm), valve position.
+      Readings are also available by key, e.g. snapshot['mass']
+      stale - names of sensors that didn't answer in time; their values are
+        last known readings (None if never read)
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str):
+            return getattr(self, key)
+
+        return super().__getitem__(key)
+
+    def items(self):
+
+        # sensor readings only
+        return ((k, getattr(self, k)) for k in SENSORS)
+
+    def with_rate_units(self, rate_units):
+
+        """
+        with_rate_units - copy of snapshot with pump rate converted from steps/s
+        :param rate_units: list - [numerator, denominator] units e.g. ['m', 'sec']
+        """
+
+        rate = convert_rate(self.rate, ['s', rate_units[0]], ['sec', rate_units[1]])
+
+        return self._replace(rate=rate)
+
+
+def acquire_snapshot(clock=SYSTEM_CLOCK, backend=DEFAULT_BACKEND):
+
+    """
+    acquire_snapshot - reads every sensor exactly once
+    :param clock: clock providing time reading
+    :param backend: devices of reactor to read
+    :return: SensorSnapshot - pump rate in steps/s
+    """
+
+    snapshot = SensorSnapshot(mass=backend.scale(),
+                              rate=backend.pump()/60, #(60 for min->s)
+                              time=clock.now(),
+                              pressure=backend.pressure(),
+                              valve=backend.valve())
+
+    return snapshot
+
+
+class SensorAcquirer:
+
+    """
+    Reads all devices of reactor concurrently so tick latency is slowest device
+      rather than sum of every device. Each device read has its own deadline;
+      reads that miss it (or raise) don't block the loop - last known value is
+      used and sensor is marked stale in snapshot. A device still busy with
+      a late read isn't queried again until that read returns.
+    """
+
+    def __init__(self, backend=DEFAULT_BACKEND, clock=SYSTEM_CLOCK,
+                 timeout=SENSOR_TIMEOUT, executor=None):
+
+        """
+        :param backend: devices of reactor to read
+        :param clock: clock providing time reading
+        :param timeout: float - seconds allowed per device read,
+                        or dict of sensor name -> seconds
+        :param executor: concurrent.futures.Executor running reads.
+                         None creates thread pool with one thread per device
+        """
+
+        self.backend = backend
+        self.clock = clock
+
+        self.devices = {'mass': backend.scale,
+                        'rate': lambda: backend.pump()/60, #(60 for min->s)
+                        'pressure': backend.pressure,
+                        'valve': backend.valve}
+
+        if isinstance(timeout, dict):
+            self.timeout = {k: timeout.get(k, SENSOR_TIMEOUT) for k in self.devices}
+        else:
+            self.timeout = {k: timeout for k in self.devices}
+
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=len(self.devices))
+
+        self.last = {k: None for k in self.devices} # last good reading of each device
+        self.pending = dict() # sensor name -> read still running from earlier tick
+        self.stale_counts = {k: 0 for k in self.devices}
+        self.errors = dict() # sensor name -> last exception raised by read
+
+    def _collect(self, name, future):
+
+        # store result of finished read; failed reads keep last known value
+        try:
+            self.last[name] = future.result()
+            return True
+        except Exception as e:
+            self.errors[name] = e
+            return False
+
+    def acquire(self):
+
+        """
+        acquire - reads every device concurrently, waiting at most each device's timeout
+        :return: SensorSnapshot - pump rate in steps/s
+        """
+
+        # submit reads; skip devices still busy with late read from earlier tick
+        futures = dict()
+        for name, read in self.devices.items():
+            previous = self.pending.pop(name, None)
+            if previous is not None and not previous.done():
+                futures[name] = previous
+                continue
+            if previous is not None:
+                self._collect(name, previous)
+            futures[name] = self.executor.submit(read)
+
+        t_start = time.monotonic()
+        now = self.clock.now()
+
+        # wait for reads in order of deadline
+        stale = set()
+        for name in sorted(futures, key=self.timeout.get):
+            future = futures[name]
+            remaining = t_start + self.timeout[name] - time.monotonic()
+            wait([future], timeout=max(remaining, 0))
+
+            if not future.done():
+                # missed deadline; collect on later tick
+                self.pending[name] = future
+                stale.add(name)
+            elif not self._collect(name, future):
+                stale.add(name)
+
+        for name in stale:
+            self.stale_counts[name] += 1
+
+        snapshot = SensorSnapshot(mass=self.last['mass'],
+                                  rate=self.last['rate'],
+                                  time=now,
+                                  pressure=self.last['pressure'],
+                                  valve=self.last['valve'],
+                                  stale=frozenset(stale))
+
+        return snapshot
+
+    def close(self):
+
+        # shut down thread pool created by acquirer
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+
+def current_readings(sensor=None, rate_units=['s', 'sec'], clock=SYSTEM_CLOCK,
+                     backend=DEFAULT_BACKEND, acquirer=None):    
 
     """
     current_readings -  provides current state of system.
@@ -18,28 +190,31 @@ def current_readings(sensor=None, rate_units=['s', 'sec']):
     :param sensor: specifies which sensor to read
          must be one of ['mass', 'rate', 'time', 'pressure', 'valve']
          if None, returns all readings as dict
+    :param clock: clock providing time reading (e.g. VirtualClock for simulations)
+    :param backend: devices of reactor to read (e.g. MockBackend instance)
+    :param acquirer: SensorAcquirer - if given, all sensors are read concurrently
+                     with per-device timeouts (stale sensors hold last known value)
     :return: dict of readings if sensor=None,
              else returns float
     """
 
-    current_data = dict()
-    
-    sensors = {'mass': scale,
-               'rate': lambda: pump()/60, #(60 for min->s)
-               'time': datetime.now,
-               'pressure': pressure,
-               'valve': valve}
-    
-    for s, actuator in sensors.items():
-        current_data[s] = actuator()
+    sensors = {'mass': backend.scale,
+               'rate': lambda: backend.pump()/60, #(60 for min->s)
+               'time': clock.now,
+               'pressure': backend.pressure,
+               'valve': backend.valve}
 
     if sensor:
-        # provide measured value single sensor specfied
+        # provide measured value single sensor specfied (other sensors not read)
         if sensor in sensors.keys():
              current_data = sensors[sensor]()
         else:
             # invalid sensor specified; raise error/report in log
             current_data = None
+    elif acquirer is not None:
+        current_data = dict(acquirer.acquire().items())
+    else:
+        current_data = dict(acquire_snapshot(clock, backend).items())
 
     # if steps/second not desired pump rate units, convert accordingly:
     if (rate_units != ['s', 'sec'] and sensor is None) \
@@ -77,33 +252,15 @@ def attenuate_pump_rate(rate, stop_rate=None, is_lowerbound=False):
         out of bounds stop value
     """
 
-    # Indicates if stop_value exceeded
-    rate_limit_hit = False
-
-    # Clean up pump rate if zero (e.g.stopped) or negative (e.g. pumping in reverse)
-    if rate < MIN_PUMP_RATE:
-
-        if rate < 0:
-            #if in reverse, stop pump
-            rate=0
-        else:
-
-            # if non-negative but lower than minimum readjust to nominal rate
-            rate = MIN_PUMP_RATE
-        rate_limit_hit = True
-        
-        #raise mass recipe discrepency error and note in log
-        #...
-
-    # Reduce pump rate if exceeds mechanical pump speed threshold
-    if rate > MAX_PUMP_RATE:
-
-        rate = MAX_PUMP_RATE
-        rate_limit_hit = True
+    # Clean up pump rate if zero (e.g.stopped), negative (e.g. pumping in reverse)
+    #  or above mechanical pump speed threshold
+    rate, too_slow, too_fast = attenuate_pump_rates(rate)
 
-        #raise mass recipe discrepency error and note in log
-        #...
+    # Indicates if stop_value exceeded
+    rate_limit_hit = too_slow or too_fast
 
+    #raise mass recipe discrepency error and note in log
+    #...
 
     if stop_rate:
         # If new rate exceeds stop rate, go with max rate
@@ -122,6 +279,50 @@ def attenuate_pump_rate(rate, stop_rate=None, is_lowerbound=False):
     return rate_j
 
 
+def pump_rate_limits(units=['s', 'sec']):
+
+    """
+    pump_rate_limits - MIN_PUMP_RATE and MAX_PUMP_RATE in given rate units
+    :param units: list - [numerator, denominator] units, e.g. ['m', 'sec'] for g/s
+    :return: 2-tuple of float - minimum, maximum pump rate
+    """
+
+    factor = rate_factor('s', units[0], 'sec', units[1])
+
+    return MIN_PUMP_RATE*factor, MAX_PUMP_RATE*factor
+
+
+def attenuate_pump_rates(rate, units=['s', 'sec']):
+
+    """
+    attenuate_pump_rates - engineering limits of attenuate_pump_rate, for single
+      rate or vectorized over array (e.g. every reactor of fleet). Rates below
+      MIN_PUMP_RATE are raised to it, or stopped if negative; rates above
+      MAX_PUMP_RATE are lowered to it.
+    :param rate: float or np.ndarray - pump rate(s)
+    :param units: list - [numerator, denominator] units of rate, e.g. ['m', 'sec'] for g/s
+    :return: 3-tuple - attenuated rate(s), too slow mask, too fast mask
+    """
+
+    min_rate, max_rate = pump_rate_limits(units)
+
+    too_slow = rate < min_rate
+    too_fast = rate > max_rate
+
+    # scalars stay off numpy; called every tick
+    if not isinstance(rate, np.ndarray):
+        if too_slow:
+            rate = 0 if rate < 0 else min_rate
+        elif too_fast:
+            rate = max_rate
+        return rate, too_slow, too_fast
+
+    rate = np.where(too_slow, np.where(rate < 0, 0.0, min_rate),
+                    np.where(too_fast, max_rate, rate))
+
+    return rate, too_slow, too_fast
+
+
 
 def pump_calibration():
 
@@ -150,12 +351,13 @@ def max_pressure(bioreactor_type=DEFAULT_REACTOR_MODEL):
     return p_max
 
 
-def pump_prime(prime_duration=5):
+def pump_prime(prime_duration=5, backend=DEFAULT_BACKEND):
     """
      Fill dead volume of pump with glucose feedstock
       by running pump at max rate offline for set number of seconds (prime_duration)
 
     :param prime_duration: int time (seconds) to run pump at max speed
+    :param backend: devices of reactor to prime
     :return: None
     """
 
@@ -164,11 +366,11 @@ def pump_prime(prime_duration=5):
     #    diaphragm: high speed for several seconds.
     #    syringe: Fill to capacaity of pump.
     
-    valve(0)
-    pump(MAX_PUMP_RATE)
-    sleep(prime_duration)
-    pump(0)
-    valve(1)
+    backend.valve(0)
+    backend.pump(MAX_PUMP_RATE)
+    backend.clock.sleep(prime_duration)
+    backend.pump(0)
+    backend.valve(1)
 
     return None
 
@@ -221,12 +423,15 @@ def vessle_conditions_good( maxpressure=True,
                             sensor_consistency=False,
                             feedempty=False,
                             contamination=False,
-                            sensor_readings=None):
+                            sensor_readings=None,
+                            backend=DEFAULT_BACKEND,
+                            snapshot=None):
 
 
     """
     Checks multiple experimental conditions and egnineering controls at once
     Returns True if all pass, False if any fail
+    If snapshot (SensorSnapshot) given, its readings are used instead of reading sensors again
     """
 
     # Instantate list
@@ -234,7 +439,9 @@ def vessle_conditions_good( maxpressure=True,
 
     # Check if max pressure exceeded
     if maxpressure:
-        goodpressure = pressure() < max_pressure()
+        pressure_0 = snapshot.pressure if snapshot else backend.pressure()
+        # pressure never read (e.g. sensor timed out) fails check
+        goodpressure = pressure_0 is not None and pressure_0 < max_pressure()
         checks.append(goodpressure)
 
     # Check if atm, pump, and mass rate of changes are in agreement w/ eachother
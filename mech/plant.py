@@ -0,0 +1,204 @@
+import numpy as np
+from copy import deepcopy
+from lib.utils import *
+from lib.clock import SYSTEM_CLOCK
+from mech.actuator import MockBackend, MOCK_DEFAULTS
+
+"""
+First-order-plus-dead-time (FOPDT) model of pump -> scale dynamics.
+Pump commands reach feed line after transport delay (tubing dead volume),
+delivered rate follows with first order lag, scale reads delivered mass
+with noise and quantization, and vessle pressure rises with feed delivered.
+FOPDTPlant steps many reactors as arrays; PlantBackend wraps single reactor
+as actuator backend driven by its clock.
+"""
+
+# plant model parameters (gain, time_constant, dead_time match classes.autotune.PLANT_DEFAULTS)
+PLANT_PARAMETERS = {'gain': 1.0,            # delivered g/s per commanded g/s
+                    'time_constant': 5.0,   # s, pump/line lag
+                    'dead_time': 2.0,       # s, transport delay of tubing
+                    'scale_noise': 0.0,     # g, standard deviation of scale reading
+                    'scale_resolution': 0.0, # g, scale quantization step (0 = none)
+                    'pressure_rise': 0.0,   # atm per g of feed delivered
+                    'dt': 0.1}              # s, internal integration step
+
+
+class FOPDTPlant:
+
+    """
+    Vectorized FOPDT plant of n reactors. Commands and state are (n,) arrays;
+      every substep updates all reactors at once. Seeded for reproducible noise.
+    """
+
+    def __init__(self, n=1, initial_mass=MOCK_DEFAULTS['SCALE'],
+                 initial_pressure=MOCK_DEFAULTS['PRESSURE'], seed=None, **params):
+
+        """
+        :param n: int - number of reactors
+        :param initial_mass: float or array - feed on scale (g)
+        :param initial_pressure: float or array - vessle pressure (atm)
+        :param seed: int - seed of scale noise generator
+        :param params: plant parameters overriding PLANT_PARAMETERS
+        """
+
+        unknown = set(params) - set(PLANT_PARAMETERS)
+        if unknown:
+            raise ValueError('unknown plant parameters: {}'.format(sorted(unknown)))
+
+        self.params = dict(PLANT_PARAMETERS, **params)
+        self.n = n
+        self.dt = self.params['dt']
+        self.rng = np.random.default_rng(seed)
+
+        tau = self.params['time_constant']
+        self.alpha = 1 - np.exp(-self.dt/tau) if tau > 0 else 1.0
+
+        # commands in transit through dead time, one row per substep
+        self.delay = int(round(self.params['dead_time']/self.dt))
+        self.in_transit = np.zeros((self.delay + 1, n))
+        self.k = 0 # substep counter
+
+        self.t = 0.0 # simulated time (s)
+        self.mass = np.full(n, initial_mass, dtype=np.float64)
+        self.pressure = np.full(n, initial_pressure, dtype=np.float64)
+        self.delivered = np.zeros(n) # g/s leaving feed
+        self.command = np.zeros(n) # g/s commanded
+
+    @property
+    def model(self):
+
+        # parameters understood by classes.autotune
+        return {k: self.params[k] for k in ('gain', 'time_constant', 'dead_time')}
+
+    def advance(self, duration, command=None):
+
+        """
+        advance - integrates plant over duration at constant command
+
+        :param duration: float - seconds; rounded to whole substeps
+        :param command: float or array (n,) - commanded rate (g/s); last command if None
+        :return: int - substeps taken
+        """
+
+        if command is not None:
+            self.command = np.broadcast_to(np.asarray(command, dtype=np.float64),
+                                           (self.n,)).copy()
+
+        steps = int(round(duration/self.dt))
+        gain = self.params['gain']
+        rise = self.params['pressure_rise']
+        ring = self.delay + 1
+
+        for _ in range(steps):
+
+            # command enters tubing; command from dead_time ago leaves it
+            self.in_transit[self.k % ring] = self.command
+            arriving = self.in_transit[(self.k + 1) % ring]
+            self.k += 1
+
+            # first order lag of delivered rate
+            self.delivered += self.alpha*(gain*arriving - self.delivered)
+
+            fed = self.delivered*self.dt
+            self.mass -= fed
+            self.pressure += rise*fed
+
+        self.t += steps*self.dt
+
+        return steps
+
+    def read_scale(self):
+
+        """
+        read_scale - scale readings with noise and quantization
+        :return: np.ndarray (n,) - mass (g)
+        """
+
+        reading = self.mass
+        if self.params['scale_noise'] > 0:
+            reading = reading + self.rng.normal(0, self.params['scale_noise'], self.n)
+
+        resolution = self.params['scale_resolution']
+        if resolution > 0:
+            reading = np.round(reading/resolution)*resolution
+
+        return reading
+
+
+class PlantBackend(MockBackend):
+
+    """
+    Actuator backend of single reactor driven by FOPDTPlant.
+      Plant is advanced to backend clock's current time before every device
+      access, so readings depend on elapsed time, not on number of reads.
+      Pump rate is stored in steps/min as by MassProgram.pump.
+    """
+
+    def __init__(self, state=None, clock=SYSTEM_CLOCK, seed=None, **params):
+
+        """
+        :param state: dict - initial device state (see mech.actuator.MOCK_ACTUATOR)
+        :param clock: clock plant time follows (VirtualClock for simulations)
+        :param seed: int - seed of scale noise
+        :param params: plant parameters overriding PLANT_PARAMETERS
+        """
+
+        if state is None:
+            state = deepcopy(MOCK_DEFAULTS)
+        super().__init__(state, clock)
+
+        self.plant = FOPDTPlant(1, initial_mass=state['SCALE'],
+                                initial_pressure=state['PRESSURE'],
+                                seed=seed, **params)
+        self.t_last = clock.monotonic()
+
+    @property
+    def model(self):
+
+        # plant parameters for PID.tune(plant)
+        return self.plant.model
+
+    def _sync(self):
+
+        # advance plant to now at current pump rate (steps/min -> g/s)
+        now = self.clock.monotonic()
+        command = self.state['PUMP']/60*NOMINAL_MASS_PER_STEP
+        steps = self.plant.advance(now - self.t_last, command)
+        self.t_last += steps*self.plant.dt
+
+        self.state['SCALE'] = float(self.plant.mass[0])
+        self.state['PRESSURE'] = float(self.plant.pressure[0])
+
+    def pressure(self):
+
+        # current vessle pressure (atm)
+        self._sync()
+
+        return self.state['PRESSURE']
+
+    def pump(self, rate=None):
+
+        # apply elapsed time at old rate before changing it
+        self._sync()
+
+        return super().pump(rate)
+
+    def scale(self, tare=False):
+
+        """
+        :param tare: bool - if True tares the scale back to zero
+        :return: noisy, quantized scale reading (g); True if tared
+        """
+
+        self._sync()
+
+        if tare:
+            self.plant.mass[:] = 0
+            self.state['SCALE'] = 0
+            return True
+
+        reading = float(self.plant.read_scale()[0])
+        if reading < -1:
+            raise Exception('out of feed')
+
+        return reading
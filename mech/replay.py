@@ -0,0 +1,102 @@
+import numpy as np
+from copy import deepcopy
+from datetime import timedelta
+from lib.utils import *
+from lib.clock import VirtualClock
+from lib.ticklog import read_tick_log
+from mech.actuator import MockBackend, MOCK_DEFAULTS
+
+"""
+Replay of recorded runs. ReplayBackend serves scale and pressure readings
+from a tick log (lib.ticklog) at its clock's current time, so a controller
+re-driven on VirtualClock sees the recorded vessel. Pump and valve are
+simulated as in MockBackend: they hold whatever replayed controller
+commands, and every pump write is kept for diffing against recorded run.
+"""
+
+# tolerance when matching clock time to recorded tick times (s)
+REPLAY_TIME_TOLERANCE = 5e-7
+
+
+class ReplayBackend(MockBackend):
+
+    """
+    Actuator backend reading sensors from recorded tick log.
+      Reading at time t returns last record at or before t (zero order hold);
+      reads before first record return first record.
+    """
+
+    def __init__(self, records, clock=None, state=None):
+
+        """
+        :param records: str or structured array - tick log path or
+                        TICK_RECORD rows (e.g. from lib.ticklog.read_tick_log)
+        :param clock: VirtualClock starting at first record time;
+                      created from records if None (see clock_for)
+        :param state: dict - initial pump/valve state (see mech.actuator.MOCK_ACTUATOR)
+        """
+
+        if isinstance(records, str):
+            records = read_tick_log(records)
+        if len(records) == 0:
+            raise ValueError('no records to replay')
+
+        self.records = records
+        self.times = np.asarray(records['time'], dtype=np.float64)
+        self.t0 = float(self.times[0])
+
+        if clock is None:
+            clock = clock_for(records)
+        if state is None:
+            state = deepcopy(MOCK_DEFAULTS)
+            state['PUMP'] = float(records['rate'][0])*60 # steps/s -> steps/min
+            state['VALVE'] = int(records['valve'][0])
+        super().__init__(state, clock)
+
+        # (clock seconds, rate) of every pump write by replayed controller
+        self.commands = list()
+
+    def index(self):
+
+        # record in effect at clock's current time
+        t = self.t0 + self.clock.monotonic() + REPLAY_TIME_TOLERANCE
+        i = np.searchsorted(self.times, t, side='right') - 1
+
+        return max(int(i), 0)
+
+    def scale(self, tare=False):
+
+        """
+        :param tare: bool - ignored in replay (recorded readings are served as is)
+        :return: recorded scale reading (g); True if tare
+        """
+
+        if tare:
+            return True
+
+        return float(self.records['mass'][self.index()])
+
+    def pressure(self):
+
+        # recorded vessle pressure (atm)
+        return float(self.records['pressure'][self.index()])
+
+    def pump(self, rate=None):
+
+        # pump simulated from replayed commands; writes are logged
+        pump_return = super().pump(rate)
+        if rate is not None:
+            self.commands.append((self.clock.monotonic(), rate))
+
+        return pump_return
+
+
+def clock_for(records):
+
+    """
+    clock_for - virtual clock whose t=0 is time of first record
+    :param records: structured array of TICK_RECORD
+    :return: VirtualClock
+    """
+
+    return VirtualClock(EPOCH + timedelta(seconds=float(records['time'][0])))
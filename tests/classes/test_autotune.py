@@ -0,0 +1,40 @@
+import unittest
+import pytest
+import numpy as np
+from classes.autotune import *
+from classes.pid import PID
+
+class TestAutotune(unittest.TestCase):
+
+    def test_candidate_grid(self):
+
+        # check every combination of coefficients generated
+        actual = candidate_grid([0, 1], [0, 0.1, 0.2], [0])
+        assert actual.shape == (6, 3) and [1, 0.2, 0] in actual.tolist()
+
+    def test_score_response_metrics(self):
+
+        # check stable candidate settles, unstable one never settles and costs more
+        t, y = step_response([[1, 0, 0], [50, 50, 0]])
+        scores = score_response(t, y)
+        cost, _ = evaluate_candidates([[1, 0, 0], [50, 50, 0]])
+        assert np.isfinite(scores['settling_time'][0]) \
+          and scores['settling_time'][1] == np.inf and cost[1] > cost[0]
+
+    def test_autotune_process_pool_matches_inline(self):
+
+        # check chunks evaluated in worker processes give same best K
+        candidates = candidate_grid(np.linspace(0, 2, 5), [0, 0.1], [0, 0.5])
+        inline = autotune(candidates=candidates, processes=1)
+        pooled = autotune(candidates=candidates, processes=2, chunk_size=4)
+        assert np.array_equal(inline.K, pooled.K) \
+          and np.allclose(inline.costs, pooled.costs)
+
+    def test_pid_tune_with_plant(self):
+
+        # check PID adopts best K found for plant model
+        pid = PID()
+        plant = {'gain': 0.7, 'time_constant': 5, 'dead_time': 2}
+        K = pid.tune(plant, processes=1)
+        assert np.array_equal(K, pid.tune_result.K) \
+          and pid.tune_result.cost == pytest.approx(np.min(pid.tune_result.costs))
@@ -0,0 +1,256 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pytest
+import numpy as np
+from datetime import datetime
+from classes.controller import FeedController
+from mech.actuator import MockBackend
+from mech.equipment import SensorAcquirer, acquire_snapshot
+from lib.clock import VirtualClock
+from lib.instrument import TickInstrumentation
+from lib.ticklog import TickLogWriter, read_tick_log
+from lib.utils import NOMINAL_MASS_PER_STEP, MIN_PUMP_RATE, convert_rate
+
+
+class CountingBackend(MockBackend):
+
+    # mock backend counting sensor reads
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = {'scale': 0, 'pressure': 0}
+
+    def scale(self):
+        self.reads['scale'] += 1
+        return super().scale()
+
+    def pressure(self):
+        self.reads['pressure'] += 1
+        return super().pressure()
+
+
+class ConsistentBackend(MockBackend):
+
+    # mock backend whose scale drops by pumped mass per second
+    def scale(self, tare=False):
+        self.state['SCALE'] -= self.state['PUMP']/60*NOMINAL_MASS_PER_STEP
+        return self.state['SCALE']
+
+
+class StaleAcquirer:
+
+    # acquirer reporting chosen sensors as stale
+    def __init__(self, backend, clock):
+        self.backend = backend
+        self.clock = clock
+        self.stale = frozenset()
+
+    def acquire(self):
+        snapshot = acquire_snapshot(self.clock, self.backend)
+        return snapshot._replace(stale=self.stale)
+
+
+class TestFeedController(unittest.TestCase):
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 1},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 1} #min
+                      }
+                   }
+
+    def test_controller_single_read_per_tick(self):
+
+        # check each tick reads every sensor exactly once
+        backend = CountingBackend()
+        controller = FeedController(TestFeedController.test_recipe,
+                                    clock=VirtualClock(), backend=backend)
+        controller.start()
+        backend.reads = {'scale': 0, 'pressure': 0}
+        for _ in range(5):
+            controller.tick()
+        assert backend.reads == {'scale': 5, 'pressure': 5}
+
+    def test_controller_snapshot_shared(self):
+
+        # check logged readings all come from tick's snapshot
+        clock = VirtualClock(datetime(2021, 1, 1))
+        controller = FeedController(TestFeedController.test_recipe,
+                                    clock=clock, backend=MockBackend())
+        controller.start()
+        clock.sleep(1)
+        controller.tick()
+        snapshot = controller.current_data
+        t_scale, mass = controller.sensor_data['scale'].last()
+        t_pressure, pressure = controller.sensor_data['pressure'].last()
+        assert mass == snapshot.mass and pressure == snapshot.pressure \
+          and t_scale == t_pressure
+
+    def test_controller_halts_on_snapshot_pressure(self):
+
+        # check safety check uses same pressure reading that is logged
+        backend = MockBackend()
+        controller = FeedController(TestFeedController.test_recipe,
+                                    clock=VirtualClock(), backend=backend)
+        controller.start()
+        backend.state['PRESSURE'] = 200
+        actual = controller.tick()
+        assert actual is False and controller.status == 'halted' \
+          and controller.sensor_data['pressure'].last()[1] == controller.current_data.pressure
+
+    def test_controller_concurrent_acquirer(self):
+
+        # check controller reads sensors through acquirer when given
+        backend = CountingBackend()
+        acquirer = SensorAcquirer(backend)
+        controller = FeedController(TestFeedController.test_recipe,
+                                    clock=VirtualClock(), backend=backend,
+                                    acquirer=acquirer)
+        controller.start()
+        actual = controller.tick()
+        acquirer.close()
+        assert actual and backend.reads == {'scale': 2, 'pressure': 2}
+
+    def test_controller_skips_stale_readings(self):
+
+        # check stale readings aren't stored and don't update measured rate
+        backend = ConsistentBackend()
+        clock = VirtualClock()
+        acquirer = StaleAcquirer(backend, clock)
+        controller = FeedController(TestFeedController.test_recipe, clock=clock,
+                                    backend=backend, acquirer=acquirer)
+        controller.start()
+        for _ in range(3):
+            controller.tick()
+            clock.sleep(1)
+        n_scale, n_pump = len(controller.sensor_data['scale']), len(controller.sensor_data['pump'])
+        n_pressure = len(controller.sensor_data['pressure'])
+        n_measured = len(controller.measured_data['pump'])
+        acquirer.stale = frozenset(['mass'])
+        controller.tick()
+        assert len(controller.sensor_data['scale']) == n_scale \
+          and len(controller.sensor_data['pump']) == n_pump + 1 \
+          and len(controller.sensor_data['pressure']) == n_pressure + 1 \
+          and len(controller.measured_data['pump']) == n_measured \
+          and controller.rate_meas_st is None
+
+    def test_controller_relay_autotune(self):
+
+        # check relay phase oscillates pump through mass program then sets K
+        recipe = {1:{'feed_type':'timed',
+                     'start_parameters': {'rate': 10},#mL/min
+                     'stop_parameters': {'stop_type':'time',
+                                         'stop_value': 1}}} #min
+        backend = ConsistentBackend()
+        clock = VirtualClock()
+        controller = FeedController(recipe, clock=clock,
+                                    backend=backend, relay_autotune=True)
+        controller.start()
+        rates = list()
+        while controller.pid.relay is not None and controller.ticks < 30:
+            controller.tick()
+            clock.sleep(1)
+            rates.append(backend.pump())
+        assert controller.pid.relay_result is not None \
+          and len(set(rates[1:-1])) == 2 \
+          and controller.pid.relay_result['Tu'] == pytest.approx(2)
+
+    def test_controller_linear_stage_stops_at_attenuated_rate(self):
+
+        # check linear stage advances once pump is attenuated to its stop rate
+        recipe = {1:{'feed_type':'linear',
+                     'start_parameters': {'inc_rate': 600},#mL/min^2
+                     'stop_parameters': {'stop_type':'rate',
+                                         'stop_value': 240}},#mL/min
+                  2:{'feed_type':'timed',
+                     'start_parameters': {'rate': 10},#mL/min
+                     'stop_parameters': {'stop_type':'time',
+                                         'stop_value': 1}}}#min
+        backend = MockBackend()
+        backend.state['SCALE'] = 1e6 #g
+        clock = VirtualClock()
+        controller = FeedController(recipe, clock=clock, backend=backend)
+        controller.start()
+        stop_rate = convert_rate(controller.mp.stop_value, ['m', 's'])*60 #steps/min
+        # cascade trim pushes ramp past stop rate
+        controller.rate_trim = 1.5
+        clock.sleep(10)
+        controller.tick()
+        attenuated, limit_hit = backend.pump(), controller.pump_limit_exceeded
+        stage = controller.mp.current_stage
+        # unit round trip may leave pump an ulp short of stop rate
+        backend.state['PUMP'] = np.nextafter(attenuated, 0)
+        clock.sleep(1)
+        controller.tick()
+        assert attenuated == stop_rate and limit_hit and stage == 1 \
+          and controller.mp.current_stage == 2 and controller.stage_changed
+
+    def test_controller_ramp_to_zero_ends_at_min_pump_rate(self):
+
+        # check decreasing ramp to rate pump can't reach ends at MIN_PUMP_RATE
+        recipe = {1:{'feed_type':'linear',
+                     'start_parameters': {'inc_rate': -600},#mL/min^2
+                     'stop_parameters': {'stop_type':'rate',
+                                         'stop_value': 0}}}#mL/min
+        backend = MockBackend()
+        backend.state['SCALE'] = 1e6 #g
+        clock = VirtualClock()
+        controller = FeedController(recipe, clock=clock, backend=backend)
+        controller.start()
+        while controller.tick() and controller.ticks < 100:
+            clock.sleep(1)
+        assert controller.status == 'complete' \
+          and backend.pump() == pytest.approx(MIN_PUMP_RATE*60)
+
+    def test_controller_instrumentation(self):
+
+        # check ticks record phase spans and pump write counts
+        instrumentation = TickInstrumentation()
+        clock = VirtualClock()
+        controller = FeedController(TestFeedController.test_recipe, clock=clock,
+                                    backend=MockBackend(),
+                                    instrumentation=instrumentation)
+        controller.start()
+        for _ in range(5):
+            controller.tick()
+            clock.sleep(1)
+        stats = instrumentation.stats()
+        assert stats['ticks'] == 5 \
+          and stats['phases']['sensors']['calls'] == 5 \
+          and stats['counters']['pump_writes'] == 6 \
+          and 'tick' in stats['slowest_tick']
+
+    def test_controller_tick_log(self):
+
+        # check every tick is appended to tick log
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        log = TickLogWriter(os.path.join(d, 'ticks.log'))
+        clock = VirtualClock()
+        controller = FeedController(TestFeedController.test_recipe, clock=clock,
+                                    backend=MockBackend(), tick_log=log)
+        controller.start()
+        for _ in range(5):
+            controller.tick()
+            clock.sleep(1)
+        log.close()
+        records = read_tick_log(log.path)
+        assert len(records) == 5 \
+          and list(records['stage']) == [1]*5 \
+          and np.all(np.diff(records['time']) == 1)
+
+    def test_controller_trends(self):
+
+        # check each tick folds scale & pressure into trend tiers
+        clock = VirtualClock()
+        controller = FeedController(TestFeedController.test_recipe, clock=clock,
+                                    backend=MockBackend(), trend_tiers=(10,))
+        controller.start()
+        for _ in range(25):
+            controller.tick()
+            clock.sleep(1)
+        trend = controller.trends['pressure'].trend(pixels=5)
+        assert len(controller.trends['scale'].raw) == 25 \
+          and trend.width == 10 \
+          and trend.max[-1] == controller.current_data.pressure
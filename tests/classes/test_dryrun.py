@@ -0,0 +1,63 @@
+import unittest
+import pytest
+import numpy as np
+from classes.dryrun import dry_run, dry_run_many
+
+class TestDryRun(unittest.TestCase):
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 60},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 0.1} #min
+                      },
+                   2:{'feed_type':'bolus',
+                      'start_parameters':{},
+                      'stop_parameters':{'stop_type':'mass',
+                                         'stop_value': 5}  #g
+                      },
+                   3:{'feed_type':'linear',
+                      'start_parameters':{'inc_rate': 60}, #mL/min^2
+                      'stop_parameters':{'stop_type':'rate',
+                                         'stop_value': 120} #mL/min
+                      }
+                   }
+
+    def test_dry_run_closed_form(self):
+
+        # check 6s timed + 5s bolus + 60s ramp, 6 + 5 + 90 g of feed
+        actual = dry_run(TestDryRun.test_recipe)
+        assert actual.duration == pytest.approx(71) \
+          and actual.mass_consumed == pytest.approx(101) \
+          and actual.completes and actual.limit_hits == () \
+          and actual.method == 'analytic'
+
+    def test_dry_run_limit_hits(self):
+
+        # check ramp down to 0 mL/min attenuated to MIN_PUMP_RATE, ramp past max never ends
+        recipe = {1:{'feed_type':'linear',
+                     'start_parameters':{'inc_rate': -60}, #mL/min^2
+                     'stop_parameters':{'stop_type':'rate',
+                                        'stop_value': 0}}, #mL/min
+                  2:{'feed_type':'linear',
+                     'start_parameters':{'inc_rate': 6000}, #mL/min^2
+                     'stop_parameters':{'stop_type':'rate',
+                                        'stop_value': 1e6}}} #mL/min
+        actual = dry_run(recipe, initial_mass=1)
+        assert actual.limit_hits == ((1, 'MIN_PUMP_RATE'), (2, 'MAX_PUMP_RATE')) \
+          and not actual.completes and actual.stuck_stage == 2 \
+          and actual.duration == np.inf and not actual.enough_feed
+
+    def test_dry_run_stepped_matches_closed_form(self):
+
+        # check virtual-time fallback agrees with closed form for fast pump
+        analytic = dry_run(TestDryRun.test_recipe)
+        stepped = dry_run(TestDryRun.test_recipe, pump_lag=1e-3)
+        assert stepped.method == 'stepped' and stepped.completes \
+          and stepped.duration == pytest.approx(analytic.duration, abs=1) \
+          and stepped.mass_consumed == pytest.approx(analytic.mass_consumed, abs=2)
+
+    def test_dry_run_many(self):
+
+        # check batch dry-run returns result per recipe
+        actual = dry_run_many([TestDryRun.test_recipe]*100)
+        assert len(actual) == 100 and all(r.completes for r in actual)
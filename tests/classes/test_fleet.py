@@ -0,0 +1,110 @@
+import unittest
+import pytest
+import numpy as np
+from classes.fleet import FleetSimulator, stage_table, TIMED, BOLUS, LINEAR
+from mech.plant import FOPDTPlant
+from mech.actuator import MockBackend
+from lib.clock import VirtualClock
+from classes.controller import FeedController
+from tests.classes.test_controller import StaleAcquirer
+
+class TestFleetSimulator(unittest.TestCase):
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 60},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 0.1} #min
+                      },
+                   2:{'feed_type':'bolus',
+                      'start_parameters':{},
+                      'stop_parameters':{'stop_type':'mass',
+                                         'stop_value': 5}  #g
+                      },
+                   3:{'feed_type':'linear',
+                      'start_parameters':{'inc_rate': 60}, #mL/min^2
+                      'stop_parameters':{'stop_type':'rate',
+                                         'stop_value': 120} #mL/min
+                      }
+                   }
+
+    def test_stage_table_units(self):
+
+        # check recipe converted to g/s, s and g/s^2
+        actual = stage_table(TestFleetSimulator.test_recipe)
+        assert actual[:, 0] == pytest.approx([TIMED, BOLUS, LINEAR]) \
+          and actual[0, 1] == pytest.approx(1) and np.isnan(actual[1, 1]) \
+          and actual[2, 2] == pytest.approx(1/60) \
+          and actual[:, 3] == pytest.approx([6, 5, 2])
+
+    def test_fleet_stage_end_times(self):
+
+        # check stage durations: 6s timed, 5g bolus at 1g/s, 1->2 g/s ramp at 1/60 g/s^2
+        fleet = FleetSimulator(TestFleetSimulator.test_recipe, n=1000)
+        fleet.run()
+        expected = np.array([6, 11, 71])
+        assert np.all(fleet.done) and fleet.transitions == 3000 \
+          and fleet.stage_end_t == pytest.approx(np.tile(expected, (1000, 1)))
+
+    def test_fleet_mixed_recipes(self):
+
+        # check reactors with different recipes advance independently
+        short_recipe = {1: TestFleetSimulator.test_recipe[1]}
+        fleet = FleetSimulator([short_recipe, TestFleetSimulator.test_recipe])
+        fleet.run(max_ticks=10)
+        assert fleet.done[0] and not fleet.done[1] \
+          and fleet.stage.tolist() == [1, 1]
+
+    def test_fleet_out_of_feed(self):
+
+        # check reactor running out of feed is halted
+        fleet = FleetSimulator(TestFleetSimulator.test_recipe, n=2,
+                               initial_mass=np.array([250, 3]))
+        fleet.run()
+        assert fleet.failed.tolist() == [False, True]
+
+    def test_fleet_with_plant_model(self):
+
+        # check fleet driven by FOPDT plant still completes recipe, stages lag ideal plant
+        plant = FOPDTPlant(n=100, seed=0, dead_time=1, time_constant=2)
+        fleet = FleetSimulator(TestFleetSimulator.test_recipe, n=100, plant=plant)
+        fleet.run()
+        assert np.all(fleet.done) and not np.any(fleet.failed) \
+          and np.all(fleet.stage_end_t[:, 1] > 11)
+
+    def test_fleet_ramp_below_min_rate_ends_with_live_loop(self):
+
+        # check ramp to 0 mL/min ends at MIN_PUMP_RATE as in live loop
+        #  (live reads back last tick's command, so it ends one tick later)
+        recipe = {1:{'feed_type':'linear',
+                     'start_parameters': {'inc_rate': -30},#mL/min^2
+                     'stop_parameters': {'stop_type':'rate',
+                                         'stop_value': 0}},#mL/min
+                  2:{'feed_type':'timed',
+                     'start_parameters': {'rate': 10},#mL/min
+                     'stop_parameters': {'stop_type':'time',
+                                         'stop_value': 0.1}}}#min
+        fleet = FleetSimulator(recipe, initial_mass=1e6)
+        fleet.run()
+
+        # live loop on open-loop ramp (stale scale skips cascade correction)
+        clock = VirtualClock()
+        backend = MockBackend()
+        backend.state['SCALE'] = 1e6 #g
+        acquirer = StaleAcquirer(backend, clock)
+        acquirer.stale = frozenset({'mass'})
+        controller = FeedController(recipe, clock=clock, backend=backend,
+                                    acquirer=acquirer)
+        controller.start()
+        stage_end_t = list()
+        while controller.ticks < 1000:
+            stage = controller.mp.current_stage
+            running = controller.tick()
+            if controller.mp.current_stage != stage or not running:
+                stage_end_t.append(clock.elapsed)
+            if not running:
+                break
+            clock.sleep(fleet.dt)
+
+        assert controller.status == 'complete' \
+          and fleet.stage_end_t[0] == pytest.approx(np.array(stage_end_t) - fleet.dt) \
+          and fleet.stage_end_t[0, 0] < 240 # setpoint reaches 0 at 240 s
@@ -1,7 +1,9 @@
 import unittest
 import pytest
 from classes.massprogram import MassProgram
-from mech.actuator import pump
+from mech.actuator import pump, MockBackend
+from lib.clock import VirtualClock
+from datetime import datetime, timedelta
 
 class TestMassProgram(unittest.TestCase):
 
@@ -59,3 +61,24 @@ class TestMassProgram(unittest.TestCase):
         assert ms_1.feed_type == expected['feed_type'] and \
         ms_1.start_parameters == expected['start_parameters'] and \
         ms_1.stop_parameters == expected['stop_parameters']
+
+
+    def test_massprogram_virtual_clock_stop_time(self):
+
+        # check timed stage stop time follows injected clock
+        t0 = datetime(2021, 1, 1)
+        mp = MassProgram(TestMassProgram.test_recipe, clock=VirtualClock(t0))
+        next(mp)
+        expected = t0 + timedelta(seconds=6)
+        assert mp.stop_value == expected
+
+
+    def test_massprogram_backend_isolation(self):
+
+        # check recipe only drives its own reactor
+        reactor = MockBackend()
+        initial_default_rate = pump()
+        mp = MassProgram(TestMassProgram.test_recipe, backend=reactor)
+        mp.pump(5, input_units=['s','sec'])
+        assert reactor.pump()/60 == pytest.approx(5) \
+          and pump() == initial_default_rate
@@ -41,3 +41,67 @@ class TestPID(unittest.TestCase):
         
         assert initial_rate < adjusted_rate
         
+
+    def test_pid_update_running_integral(self):
+
+        # check running integral & derivative of linear error e(t)=t
+        pid=PID(K=np.array([0,1,0]), derivative_filter=1)
+        for t in range(0, 11):
+            u = pid.update(t, t)
+        assert pid.total_int == pytest.approx(50) \
+          and pid.derivative == pytest.approx(1) \
+          and u == pytest.approx(50)
+
+    def test_pid_control_var_batch_incremental(self):
+
+        # check repeated batch calls only fold in new points
+        test_setpoint = [(i, 1) for i in range(1, 6)]
+        test_process = [(i, 0.5) for i in range(1, 6)]
+        pid=PID(K=np.array([1,1,0]))
+        pid.control_var(test_setpoint[:3], test_process[:3], False)
+        actual = pid.control_var(test_setpoint, test_process, False)
+        expected = 1 + 0.5 + 0.5*4 # setpoint + k_p*e + k_i*int(e)
+        assert pid.batch_seen == 5 and actual == pytest.approx(expected)
+
+    def test_pid_rate_error_bounded(self):
+
+        # check diagnostic error history does not grow without bound
+        pid=PID()
+        for t in range(PID_ERROR_HISTORY + 10):
+            pid.control_var([(t, 1)], [(t, 0.5)])
+        assert len(pid.rate_error) == PID_ERROR_HISTORY
+
+    def test_pid_relay_autotune_ultimate_gain(self):
+
+        # check relay on pure 1 tick delay plant gives Ku = 4d/(pi*a), Tu = 2 ticks
+        pid=PID()
+        pid.start_relay(center=1, amplitude=0.5)
+        process = 1
+        for t in range(20):
+            output = pid.relay_update(t, process)
+            process = output
+            if pid.relay is None:
+                break
+        assert pid.relay is None and output == 1 \
+          and pid.relay_result['Tu'] == pytest.approx(2) \
+          and pid.relay_result['Ku'] == pytest.approx(4/np.pi) \
+          and pid.K == pytest.approx([0.6*4/np.pi, 0.6*4/np.pi, 0.6*4/np.pi/4])
+
+    def test_pid_relay_hysteresis(self):
+
+        # check measurement noise inside hysteresis band doesn't switch relay
+        pid=PID()
+        pid.start_relay(center=1, amplitude=0.5, hysteresis=0.1)
+        outputs = [pid.relay_update(t, 1 + 0.05*(-1)**t) for t in range(10)]
+        assert outputs == [1.5]*10
+
+    def test_pid_control_var_batch_full_buffer(self):
+
+        # check batch mode keeps folding new points once ring buffer is full
+        setpoint, process = TelemetryBuffer(3), TelemetryBuffer(3)
+        pid=PID(K=np.array([0,1,0]))
+        for t in range(6):
+            setpoint.append(t, 1)
+            process.append(t, 0)
+            pid.control_var(setpoint, process, False)
+        assert pid.batch_seen == 6 and pid.total_int == pytest.approx(5)
@@ -0,0 +1,55 @@
+import pytest
+import numpy as np
+from main import main
+from lib.clock import VirtualClock
+from lib.ticklog import read_tick_log
+from mech.actuator import MockBackend
+from classes.replay import replay_run, recorded_commands
+
+
+class TestReplay:
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 10},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 0.2}}, #min
+                   2:{'feed_type':'bolus',
+                      'start_parameters':{},
+                      'stop_parameters':{'stop_type':'mass',
+                                         'stop_value': 5}}} #g
+
+    def record(self, tmp_path):
+
+        # run recipe on mock reactor with tick log
+        path = str(tmp_path/'ticks.log')
+        main(TestReplay.test_recipe, clock=VirtualClock(),
+             backend=MockBackend(), tick_log=path)
+        return read_tick_log(path)
+
+    def test_replay_reproduces_recorded_run(self, tmp_path):
+
+        # check unchanged controller replays recorded commands exactly
+        records = self.record(tmp_path)
+        result = replay_run(records, TestReplay.test_recipe)
+        assert len(records) > 10 \
+          and result.first_divergence is None \
+          and result.max_abs_diff == 0 \
+          and result.stage_mismatches == 0
+
+    def test_replay_detects_divergence(self, tmp_path):
+
+        # check changed recipe shows up as diverging commands
+        records = self.record(tmp_path)
+        recipe = {1: dict(TestReplay.test_recipe[1],
+                          start_parameters={'rate': 20}),
+                  2: TestReplay.test_recipe[2]}
+        result = replay_run(records, recipe)
+        assert result.first_divergence == 0 and result.max_abs_diff > 0
+
+    def test_recorded_commands(self, tmp_path):
+
+        # check command at each tick is pump rate read at following tick
+        records = self.record(tmp_path)
+        command = recorded_commands(records)
+        assert np.array_equal(command[:-1], records['rate'][1:]) \
+          and np.isnan(command[-1])
@@ -0,0 +1,75 @@
+import time
+import unittest
+import pytest
+import numpy as np
+from classes.controller import FeedController
+from classes.supervisor import ReactorSupervisor
+from mech.actuator import MockBackend
+from lib.clock import VirtualClock
+
+class TestReactorSupervisor(unittest.TestCase):
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 1},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 0.001} #min
+                      }
+                   }
+
+    def test_supervisor_runs_vessels_concurrently(self):
+
+        # check every vessel completes its recipe on its own backend
+        supervisor = ReactorSupervisor(inline=True)
+        backends = [MockBackend() for _ in range(5)]
+        for n, backend in enumerate(backends):
+            controller = FeedController(TestReactorSupervisor.test_recipe,
+                                        backend=backend)
+            supervisor.add(n, controller, period=0.01)
+        actual = supervisor.run_all()
+        expected = {n: 'complete' for n in range(5)}
+        assert actual == expected \
+          and all(b.valve() == 0 for b in backends)
+
+    def test_supervisor_executor_jitter_recorded(self):
+
+        # check ticks run through thread pool and lateness is recorded
+        supervisor = ReactorSupervisor()
+        controller = FeedController(TestReactorSupervisor.test_recipe,
+                                    backend=MockBackend())
+        supervisor.add('vessel', controller, period=0.01)
+        supervisor.run_all()
+        stats = supervisor.jitter_stats('vessel')
+        assert stats['ticks'] == controller.ticks \
+          and stats['max'] >= 0
+
+    def test_supervisor_isolates_errors(self):
+
+        # check failing vessel doesn't halt other vessels
+        supervisor = ReactorSupervisor(inline=True)
+        broken = MockBackend()
+        broken.state['SCALE'] = -100 # out of feed
+        supervisor.add('broken', FeedController(TestReactorSupervisor.test_recipe,
+                                                backend=broken), period=0.01)
+        supervisor.add('ok', FeedController(TestReactorSupervisor.test_recipe,
+                                            backend=MockBackend()), period=0.01)
+        actual = supervisor.run_all()
+        assert actual == {'broken': 'error', 'ok': 'complete'} \
+          and 'broken' in supervisor.errors
+
+    def test_supervisor_paces_on_controller_clock(self):
+
+        # check vessels sharing virtual clock tick on its 1 s grid, not in wall time
+        recipe = {1: dict(TestReactorSupervisor.test_recipe[1],
+                          stop_parameters={'stop_type': 'time', 'stop_value': 0.5})}
+        clock = VirtualClock()
+        supervisor = ReactorSupervisor(inline=True)
+        for n in range(2):
+            supervisor.add(n, FeedController(recipe, clock=clock, backend=MockBackend()))
+        t_start = time.perf_counter()
+        actual = supervisor.run_all()
+        wall = time.perf_counter() - t_start
+        deadlines = supervisor.schedulers[0].jitter.times()
+        assert actual == {0: 'complete', 1: 'complete'} \
+          and wall < 5 and clock.elapsed >= 30 \
+          and np.all(np.diff(deadlines) == 1) \
+          and all(supervisor.jitter_stats(n)['max'] == 0 for n in range(2))
@@ -0,0 +1,70 @@
+import unittest
+import pytest
+import numpy as np
+from classes.trajectory import compile_recipe, SetpointTrajectory
+
+class TestSetpointTrajectory(unittest.TestCase):
+
+    test_recipe = {1:{'feed_type':'timed',
+                      'start_parameters': {'rate': 60},#mL/min
+                      'stop_parameters': {'stop_type':'time',
+                                          'stop_value': 0.1} #min
+                      },
+                   2:{'feed_type':'bolus',
+                      'start_parameters':{},
+                      'stop_parameters':{'stop_type':'mass',
+                                         'stop_value': 5}  #g
+                      },
+                   3:{'feed_type':'linear',
+                      'start_parameters':{'inc_rate': 60}, #mL/min^2
+                      'stop_parameters':{'stop_type':'rate',
+                                         'stop_value': 120} #mL/min
+                      }
+                   }
+
+    def test_compile_boundaries(self):
+
+        # check 6s timed, 5g bolus at 1g/s, 1->2 g/s ramp at 1/60 g/s^2
+        traj = compile_recipe(TestSetpointTrajectory.test_recipe, initial_mass=500)
+        assert traj.t == pytest.approx([0, 6, 11, 71]) \
+          and traj.rate == pytest.approx([1, 1, 1, 2]) \
+          and traj.mass == pytest.approx([500, 494, 489, 399]) \
+          and traj.duration == pytest.approx(71) \
+          and traj.mass_consumed == pytest.approx(101)
+
+    def test_setpoint_lookup(self):
+
+        # check vectorized setpoint and mass lookups within and past recipe
+        traj = compile_recipe(TestSetpointTrajectory.test_recipe, initial_mass=500)
+        t = np.array([3, 11, 41, 100])
+        assert traj.setpoint(t) == pytest.approx([1, 1, 1.5, 0]) \
+          and traj.expected_mass(t) == pytest.approx([497, 489, 489 - 37.5, 399]) \
+          and list(traj.stage_at(t)) == [0, 2, 2, 3] \
+          and traj.setpoint(41.0) == pytest.approx(1.5)
+
+    def test_unreachable_stop_value(self):
+
+        # check flat ramp below stop rate never ends and later stages unreachable
+        recipe = {1:{'feed_type':'linear',
+                     'start_parameters':{'inc_rate': 0}, #mL/min^2
+                     'stop_parameters':{'stop_type':'rate',
+                                        'stop_value': 600}}, #mL/min
+                  2:TestSetpointTrajectory.test_recipe[1]}
+        traj = compile_recipe(recipe)
+        assert traj.duration == np.inf and np.isnan(traj.rate[1]) \
+          and traj.stage_at(1e9) == 0 and traj.setpoint(1e9) == pytest.approx(2)
+
+    def test_stage_rate_from_measured_start(self):
+
+        # check live loop ramp starts from measured stage start rate
+        traj = compile_recipe(TestSetpointTrajectory.test_recipe)
+        assert traj.stage_rate(2, 30, rate_0=0.5) == pytest.approx(1.0) \
+          and traj.stage_rate(2, 30) == pytest.approx(1.5)
+
+    def test_stage_setpoint_anchored_to_stage_start(self):
+
+        # check live lookup follows stage from its actual start and holds end rate
+        traj = compile_recipe(TestSetpointTrajectory.test_recipe)
+        assert traj.stage_setpoint(2, 30) == pytest.approx(1.5) \
+          and traj.stage_setpoint(2, 90) == pytest.approx(2) \
+          and traj.stage_setpoint(0, 3) == pytest.approx(1)
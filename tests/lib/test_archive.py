@@ -0,0 +1,96 @@
+import os
+import unittest
+import pytest
+import numpy as np
+import lib.archive
+from lib.archive import write_archive, ColumnArchive, encode_column, decode_column
+from lib.utils import integral, derivative
+
+
+def run_history(n=1000):
+
+    # 1 Hz run: slowly falling mass with NaN gap, stage counter
+    t = 1.6e9 + np.arange(n, dtype=np.float64)
+    mass = 250 - 0.01*np.arange(n)
+    mass[10] = np.nan
+    stage = (np.arange(n)//300 + 1).astype(np.uint32)
+    return {'time': t, 'mass': mass, 'stage': stage}
+
+
+class TestColumnArchive:
+
+    def test_encodings_lossless(self):
+
+        # check every encoding decodes bit for bit
+        values = np.array([1.6e9, 1.6e9 + 1, np.nan, -0.0, np.inf])
+        ints = np.array([3, 1, 255, 0], dtype=np.uint8)
+        assert all(np.array_equal(decode_column(encode_column(values, e), e, values.dtype, 5)
+                                  .view(np.uint64), values.view(np.uint64))
+                   for e in ('delta2', 'xor')) \
+          and np.array_equal(decode_column(encode_column(ints, 'delta'), 'delta',
+                                           ints.dtype, 4), ints)
+
+    def test_archive_round_trip(self, tmp_path):
+
+        # check both codecs read back every column unchanged
+        history = run_history()
+        for codec in ('zlib', 'lzma'):
+            path = str(tmp_path/'run.arc')
+            chunks = write_archive(path, history, chunk_rows=128, codec=codec)
+            with ColumnArchive(path) as archive:
+                records = archive.read()
+            assert chunks == 8 and len(records) == 1000 \
+              and all(np.array_equal(records[k], history[k], equal_nan=True)
+                      for k in history) \
+              and os.path.getsize(path) < sum(v.nbytes for v in history.values())/4
+
+    def test_archive_range_query_reads_needed_chunks(self, tmp_path):
+
+        # check time-range query only decompresses overlapping chunks
+        history = run_history()
+        path = str(tmp_path/'run.arc')
+        write_archive(path, history, chunk_rows=100)
+        with ColumnArchive(path) as archive:
+            records = archive.read(['mass'], 1.6e9 + 250, 1.6e9 + 349)
+            decompressed = archive.decompressed
+        assert len(records) == 100 \
+          and records['mass'][0] == history['mass'][250] \
+          and decompressed == 4 # time & mass of 2 chunks
+
+    def test_archive_analysis_matches_in_memory(self, tmp_path):
+
+        # check chunked integral/derivative equal whole-run results
+        history = run_history()
+        history['mass'][10] = 250
+        points = np.column_stack((history['time'], history['mass']))
+        path = str(tmp_path/'run.arc')
+        write_archive(path, history, chunk_rows=64)
+        t_q = 1.6e9 + np.array([63, 64, 500.5])
+        with ColumnArchive(path) as archive:
+            assert archive.integral('mass') == pytest.approx(integral(points, abs_t=False)) \
+              and np.allclose(archive.derivative('mass', t_q), derivative(points, t_q)) \
+              and archive.derivative('mass') == pytest.approx(derivative(points))
+
+    def test_archive_derivative_reads_owning_chunk(self, tmp_path):
+
+        # check derivative at chunk boundary decompresses only owning chunk
+        history = run_history()
+        points = np.column_stack((history['time'], history['mass']))
+        path = str(tmp_path/'run.arc')
+        write_archive(path, history, chunk_rows=100)
+        t_q = 1.6e9 + np.array([399, 399.5, 450])
+        with ColumnArchive(path) as archive:
+            slopes = archive.derivative('mass', t_q)
+            decompressed = archive.decompressed
+        assert np.allclose(slopes, derivative(points, t_q)) \
+          and decompressed == 4 # time & mass of 2 owning chunks
+
+    def test_archive_rejects_other_version(self, tmp_path, monkeypatch):
+
+        # check archive of other format version isn't read
+        path = str(tmp_path/'run.arc')
+        monkeypatch.setattr(lib.archive, 'ARCHIVE_VERSION', 1)
+        write_archive(path, run_history(100))
+        monkeypatch.undo()
+        with pytest.raises(ValueError, match='version 1'):
+            ColumnArchive(path)
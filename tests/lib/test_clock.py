@@ -0,0 +1,32 @@
+import unittest
+import pytest
+from datetime import datetime, timedelta
+from lib.clock import VirtualClock, SystemClock
+
+
+class TestVirtualClock:
+
+    def test_virtual_clock_sleep_advances_instantly(self):
+
+        # check sleeping advances simulated time only
+        t0 = datetime(2021, 1, 1)
+        clock = VirtualClock(t0)
+        clock.sleep(3600*48)
+        expected = t0 + timedelta(hours=48)
+        assert clock.now() == expected and clock.monotonic() == 3600*48
+
+    def test_virtual_clock_negative_sleep_ignored(self):
+
+        # check time never runs backwards
+        clock = VirtualClock(datetime(2021, 1, 1))
+        clock.sleep(-5)
+        assert clock.elapsed == 0
+
+
+class TestSystemClock:
+
+    def test_system_clock_now(self):
+
+        # check system clock follows wall time
+        actual = SystemClock().now()
+        assert abs((datetime.now() - actual).total_seconds()) < 1
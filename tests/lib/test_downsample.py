@@ -0,0 +1,50 @@
+import unittest
+import pytest
+import numpy as np
+from lib.downsample import DownsampleTier, TrendDownsampler, lttb
+
+
+class TestDownsample:
+
+    def test_tier_bucket_statistics(self):
+
+        # check min/max/sum/count/last per aligned bucket, open bucket included
+        tier = DownsampleTier(10)
+        for t, y in [(0, 1), (5, 3), (9, 2), (10, 7), (12, np.nan)]:
+            tier.append(t, y)
+        rows = tier.buckets()
+        assert rows.tolist() == [[0, 1, 3, 6, 3, 2], [10, 7, 7, 7, 1, 7]]
+
+    def test_trend_keeps_spikes(self):
+
+        # check coarse tier keeps single-sample spike in max
+        trends = TrendDownsampler(tiers=(10, 60), raw_capacity=100)
+        values = np.zeros(3600)
+        values[1234] = 99
+        for t, y in enumerate(values):
+            trends.append(float(t), y)
+        trend = trends.trend(pixels=100)
+        assert trend.width == 60 and trend.t.size == 60 \
+          and np.max(trend.max) == 99 and np.max(trend.mean) < 99
+
+    def test_trend_picks_finest_source(self):
+
+        # check zoomed-in windows use raw samples, longer ones finer tiers first
+        trends = TrendDownsampler(tiers=(10, 60), raw_capacity=100)
+        for t in range(3600):
+            trends.append(float(t), float(t))
+        raw = trends.trend(3550, 3599, pixels=100)
+        tens = trends.trend(0, 3599, pixels=400)
+        assert raw.width == 0 and raw.t.size == 50 \
+          and tens.width == 10 and tens.t.size == 360 \
+          and tens.last[-1] == 3599
+
+    def test_lttb(self):
+
+        # check LTTB keeps endpoints and picks out peak
+        t = np.arange(1000, dtype=np.float64)
+        y = np.sin(t/50)
+        y[500] = 10
+        keep = lttb(t, y, 50)
+        assert keep.size == 50 and keep[0] == 0 and keep[-1] == 999 \
+          and 500 in keep and np.all(np.diff(keep) > 0)
@@ -0,0 +1,72 @@
+import unittest
+import pytest
+from lib.instrument import TickInstrumentation
+
+
+class FakeTimer:
+
+    # timer advancing one second per read
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        self.t += 1
+        return self.t
+
+
+class TestTickInstrumentation:
+
+    def test_instrumentation_phase_spans(self):
+
+        # check span totals and per tick breakdown of phases
+        instrumentation = TickInstrumentation(timer=FakeTimer())
+        for _ in range(3):
+            instrumentation.tick_start()
+            with instrumentation.span('sensors'):
+                pass
+            with instrumentation.span('pump'):
+                pass
+            instrumentation.tick_end()
+        stats = instrumentation.stats()
+        assert stats['ticks'] == 3 \
+          and stats['phases']['sensors'] == {'calls': 3, 'total': 3, 'mean': 1, 'max': 1} \
+          and instrumentation.last_tick == {'sensors': 1, 'pump': 1, 'tick': 5}
+
+    def test_instrumentation_disabled(self):
+
+        # check disabled instrumentation records nothing
+        instrumentation = TickInstrumentation(enabled=False)
+        instrumentation.tick_start()
+        with instrumentation.span('sensors'):
+            pass
+        instrumentation.count('pump_writes')
+        instrumentation.tick_end()
+        stats = instrumentation.stats()
+        assert stats['ticks'] == 0 and stats['phases'] == {} \
+          and stats['counters']['pump_writes'] == 0
+
+    def test_instrumentation_counters(self):
+
+        # check event counters accumulate
+        instrumentation = TickInstrumentation()
+        instrumentation.count('pump_writes')
+        instrumentation.count('pump_writes')
+        instrumentation.count('limit_hits', 3)
+        assert instrumentation.stats()['counters'] == {'limit_hits': 3,
+                                                       'pump_writes': 2,
+                                                       'stage_transitions': 0}
+
+    def test_instrumentation_profile_window(self):
+
+        # check profiling runs for requested ticks only, even when disabled
+        instrumentation = TickInstrumentation(enabled=False)
+        instrumentation.profile(2, memory=True)
+        ticks_profiled = list()
+        for _ in range(4):
+            instrumentation.tick_start()
+            ticks_profiled.append(instrumentation.profiler is not None)
+            sorted(range(100))
+            instrumentation.tick_end()
+        assert ticks_profiled == [True, True, False, False] \
+          and instrumentation.memory_stats is not None \
+          and 'sorted' in instrumentation.profile_report()
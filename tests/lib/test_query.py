@@ -0,0 +1,73 @@
+import unittest
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from lib.query import RunQuery
+from lib.utils import integral, epoch_seconds
+
+
+def run_history(n=5000):
+
+    # 1 Hz run of 3 stages with random pump rate and one dropped reading
+    rng = np.random.default_rng(0)
+    t = 1.6e9 + np.arange(n, dtype=np.float64)
+    rate = rng.random(n)
+    rate[100] = np.nan
+    stage = np.repeat([1, 2, 3], [1000, 2500, 1500]).astype(np.uint32)
+    return {'time': t, 'rate': rate, 'mass': 250 - 0.01*np.arange(n), 'stage': stage}
+
+
+class TestRunQuery:
+
+    def test_query_range_aggregates(self):
+
+        # check range aggregates against numpy and lib.utils.integral
+        history = run_history()
+        query = RunQuery(history, block=64)
+        t, y = history['time'], history['rate']
+        start, stop = t[50] - 0.5, t[4000]
+        window = y[50:4001]
+        points = np.column_stack((t[50:4001], history['mass'][50:4001]))
+        assert query.aggregate('rate', 'sum', start, stop) == pytest.approx(np.nansum(window)) \
+          and query.aggregate('rate', 'mean', start, stop) == pytest.approx(np.nanmean(window)) \
+          and query.aggregate('rate', 'count', start, stop) == 3950 \
+          and query.aggregate('rate', 'min', start, stop) == np.nanmin(window) \
+          and query.aggregate('rate', 'max', start, stop) == np.nanmax(window) \
+          and query.aggregate('mass', 'integral', start, stop) == \
+              pytest.approx(integral(points, abs_t=False)) \
+          and query.aggregate('mass', 'change', start, stop) == pytest.approx(-39.5)
+
+    def test_query_per_stage(self):
+
+        # check stage segments and per-stage mean pump rate
+        history = run_history()
+        query = RunQuery(history)
+        segments, means = query.per_stage('rate', 'mean')
+        assert list(segments['stage']) == [1, 2, 3] \
+          and list(segments['stop'] - segments['start']) == [1000, 2500, 1500] \
+          and means == pytest.approx([np.nanmean(history['rate'][:1000]),
+                                      np.mean(history['rate'][1000:3500]),
+                                      np.mean(history['rate'][3500:])])
+
+    def test_query_per_interval(self):
+
+        # check per-bin maxima, empty ranges give NaN
+        history = run_history()
+        query = RunQuery(history)
+        starts, maxima = query.per_interval('rate', 'max', 1000)
+        empty = query.aggregate('rate', 'max', 0, 1)
+        assert starts.size == 5 \
+          and maxima == pytest.approx([np.nanmax(history['rate'][k:k + 1000])
+                                       for k in range(0, 5000, 1000)]) \
+          and np.isnan(empty)
+
+    def test_query_datetimes_and_unsorted_rows(self):
+
+        # check datetime bounds and rows stored out of time order
+        t0 = datetime(2021, 1, 1)
+        times = np.array([epoch_seconds(t0 + timedelta(seconds=s)) for s in (2, 0, 1, 3)])
+        query = RunQuery({'time': times, 'mass': np.array([8., 10., 9., 7.])})
+        assert query.aggregate('mass', 'first') == 10 \
+          and query.aggregate('mass', 'sum', t0 + timedelta(seconds=1),
+                              t0 + timedelta(seconds=2)) == 17 \
+          and query.at('mass', t0 + timedelta(seconds=2.5)) == 8
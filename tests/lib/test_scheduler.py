@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+import pytest
+import numpy as np
+from datetime import datetime
+from lib.clock import VirtualClock, SYSTEM_CLOCK
+from lib.scheduler import DeadlineScheduler
+
+
+class TestDeadlineScheduler:
+
+    def test_deadline_scheduler_no_drift(self):
+
+        # check time spent working doesn't stretch loop period
+        clock = VirtualClock(datetime(2021, 1, 1))
+        scheduler = DeadlineScheduler(1, clock)
+        scheduler.start()
+        for _ in range(100):
+            clock.advance(0.3) # work
+            scheduler.wait()
+        assert clock.monotonic() == pytest.approx(100) \
+          and scheduler.overruns == 0
+
+    def test_deadline_scheduler_overrun_skips_deadlines(self):
+
+        # check slow tick skips missed deadlines instead of drifting
+        clock = VirtualClock(datetime(2021, 1, 1))
+        scheduler = DeadlineScheduler(1, clock)
+        scheduler.start()
+        clock.advance(2.5) # slow tick
+        scheduler.wait()
+        assert clock.monotonic() == pytest.approx(3) \
+          and scheduler.overruns == 2
+
+    def test_deadline_scheduler_histograms(self):
+
+        # check every tick lands in cycle time & jitter histograms
+        clock = VirtualClock(datetime(2021, 1, 1))
+        scheduler = DeadlineScheduler(1, clock)
+        scheduler.start()
+        for _ in range(10):
+            clock.advance(0.02)
+            scheduler.wait()
+        stats = scheduler.stats()
+        cycle_bin = np.searchsorted(scheduler.bins, 0.02, side='right') - 1
+        assert scheduler.cycle_hist.sum() == 10 \
+          and scheduler.cycle_hist[cycle_bin] == 10 \
+          and scheduler.jitter_hist[0] == 10 \
+          and stats['cycle_mean'] == pytest.approx(0.02)
+
+    def test_deadline_scheduler_wait_async(self):
+
+        # check awaited waits follow same deadline grid as blocking waits
+        scheduler = DeadlineScheduler(0.01, SYSTEM_CLOCK)
+
+        async def loop():
+            scheduler.start()
+            for _ in range(5):
+                await scheduler.wait_async()
+
+        asyncio.run(loop())
+        deadlines = scheduler.jitter.times()
+        assert scheduler.ticks == 5 \
+          and np.diff(deadlines) == pytest.approx([0.01]*4)
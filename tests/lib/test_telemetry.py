@@ -0,0 +1,81 @@
+import unittest
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from lib.telemetry import TelemetryBuffer
+from lib.utils import derivative, integral
+
+
+class TestTelemetryBuffer:
+
+    def test_telemetry_buffer_append_window(self):
+
+        # check samples are returned oldest first
+        buf = TelemetryBuffer(4)
+        for i in range(3):
+            buf.append(i, 10*i)
+        expected = np.array([[0, 0], [1, 10], [2, 20]])
+        actual = buf.window()
+        assert len(buf) == 3 and actual == pytest.approx(expected)
+
+    def test_telemetry_buffer_wraparound(self):
+
+        # check oldest samples are overwritten once capacity is hit
+        buf = TelemetryBuffer(4)
+        for i in range(10):
+            buf.append(i, i)
+        expected = np.array([6, 7, 8, 9])
+        actual = buf.times()
+        assert len(buf) == 4 and buf.total == 10 \
+          and actual == pytest.approx(expected)
+
+    def test_telemetry_buffer_window_is_view(self):
+
+        # check window does not copy underlying storage
+        buf = TelemetryBuffer(4)
+        for i in range(6):
+            buf.append(i, i)
+        actual = buf.window(2)
+        assert np.shares_memory(actual, buf._data) \
+          and actual == pytest.approx(np.array([[4, 4], [5, 5]]))
+
+    def test_telemetry_buffer_datetime_microseconds(self):
+
+        # check datetimes stored as epoch seconds w/o losing microseconds
+        t0 = datetime(2020, 1, 1)
+        buf = TelemetryBuffer(4)
+        buf.append(t0, 0)
+        buf.append(t0 + timedelta(days=1, microseconds=500), 1)
+        expected = 86400.0005
+        actual = buf[-1][0] - buf[0][0]
+        assert actual == pytest.approx(expected, abs=1e-6)
+
+    def test_telemetry_buffer_legacy_indexing(self):
+
+        # check list-of-tuples style indexing used by PID still works
+        buf = TelemetryBuffer(4)
+        buf.append(1, 0.5)
+        buf.append(2, 0.7)
+        assert buf[-1:][0][1] == pytest.approx(0.7)
+
+    def test_telemetry_buffer_calculus_helpers(self):
+
+        # check derivative & integral accept buffer directly
+        buf = TelemetryBuffer(16)
+        for i in range(11):
+            buf.append(i/10, i/10)
+        assert derivative(buf) == pytest.approx(1) \
+          and integral(buf) == pytest.approx(0.5)
+
+    def test_telemetry_buffer_extend(self):
+
+        # check block append wraps like repeated append and keeps last capacity samples
+        block = TelemetryBuffer(4)
+        single = TelemetryBuffer(4)
+        block.append(0, 0)
+        single.append(0, 0)
+        block.extend(np.arange(1, 7), np.arange(1, 7)*10)
+        for i in range(1, 7):
+            single.append(i, i*10)
+        assert np.array_equal(block.window(), single.window()) \
+          and block.total == single.total == 7
@@ -0,0 +1,68 @@
+import unittest
+import pytest
+import numpy as np
+from lib.ticklog import TickLogWriter, read_tick_log, TICK_RECORD, FLAG_TRANSITION
+
+
+class TestTickLog:
+
+    def test_tick_log_round_trip(self, tmp_path):
+
+        # check records read back field for field, unset floats NaN
+        path = str(tmp_path/'ticks.log')
+        with TickLogWriter(path) as log:
+            log.append(time=1.0, mass=250, rate=0.5, stage=1, valve=1)
+            log.append(time=2.0, mass=249, rate=0.5, stage=2, flags=FLAG_TRANSITION)
+        records = read_tick_log(path)
+        assert records.dtype == TICK_RECORD \
+          and list(records['mass']) == [250, 249] \
+          and list(records['stage']) == [1, 2] \
+          and records['flags'][1] & FLAG_TRANSITION \
+          and np.isnan(records['setpoint']).all()
+
+    def test_tick_log_read_while_writing(self, tmp_path):
+
+        # check reader sees only records written so far, without copying
+        path = str(tmp_path/'ticks.log')
+        log = TickLogWriter(path)
+        for t in range(5):
+            log.append(time=t)
+        records = read_tick_log(path)
+        log.append(time=5)
+        log.close()
+        assert len(records) == 5 \
+          and isinstance(records, np.memmap) \
+          and list(records['time']) == [0, 1, 2, 3, 4]
+
+    def test_tick_log_grows(self, tmp_path):
+
+        # check log grows past initial capacity and is trimmed on close
+        path = str(tmp_path/'ticks.log')
+        with TickLogWriter(path, capacity=4) as log:
+            for t in range(10):
+                log.append(time=t)
+        records = read_tick_log(path)
+        assert list(records['time']) == list(range(10)) \
+          and (tmp_path/'ticks.log').stat().st_size == 64 + 10*TICK_RECORD.itemsize
+
+    def test_tick_log_records_outlive_map(self, tmp_path):
+
+        # check records held across grow and close stay readable
+        path = str(tmp_path/'ticks.log')
+        log = TickLogWriter(path, capacity=2)
+        log.append(time=0)
+        before_grow = log.records
+        log.append(time=1)
+        log.append(time=2)
+        before_close = log.records
+        log.close()
+        assert list(before_grow['time']) == [0] \
+          and list(before_close['time']) == [0, 1, 2]
+
+    def test_tick_log_rejects_other_files(self, tmp_path):
+
+        # check files that aren't tick logs raise ValueError
+        path = tmp_path/'other.bin'
+        path.write_bytes(b'x'*128)
+        with pytest.raises(ValueError):
+            read_tick_log(str(path))
@@ -31,6 +31,37 @@ class TestConvertRate:
         expected = 1
         assert actual == pytest.approx(expected)
 
+    def test_convert_rate_mass_to_volume_density(self):
+
+        # check density is applied for mass -> volume conversion
+        actual = convert_rate(10,
+                              units_num = ['m', 'v'],
+                              density=2)
+        expected = 5
+        assert actual == pytest.approx(expected)
+
+    def test_convert_rate_array(self):
+
+        # check whole arrays are converted in one pass
+        test_rates = np.array([60, 120, 180])
+        actual = convert_rate(test_rates, units_den=['min','sec'])
+        expected = np.array([5, 10, 15])
+        assert actual == pytest.approx(expected)
+
+    def test_rate_factor_cached(self):
+
+        # check unit pair resolved once, then looked up
+        rate_factor.cache_clear()
+        convert_rate(1, ['s', 'm'], ['sec', 'hour'])
+        convert_rate(2, ['s', 'm'], ['sec', 'hour'])
+        assert rate_factor.cache_info().hits == 1
+
+    def test_rate_factor_incompatible_units(self):
+
+        # check rate & acceleration units can't be mixed
+        with pytest.raises(ValueError):
+            rate_factor('v', 'v', 'sec', 'min^2')
+
 
 
 """
@@ -165,6 +196,32 @@ class TestDerivative:
 
 
         
+    def test_derivative_array_t0_matches_scalar(self):
+
+        # check array-valued t_0 matches scalar t_0 at boundaries & interiors
+        test_points_y = [(i/10)**2 for i in range(-10, 11)]
+        test_points_t = [i/10 for i in range(-10, 11)]
+        test_points = list(zip(test_points_t, test_points_y))
+        test_t0 = [-1, -0.95, 0, 0.05, 0.3, 1]
+        expected = [derivative(test_points, t_0=t) for t in test_t0]
+        actual = derivative(test_points, t_0=np.array(test_t0))
+        assert actual == pytest.approx(expected)
+
+    def test_derivative_array_t0_out_of_range(self):
+
+        # check out of range t_0 values yield NaN
+        test_points = [(0, 0), (1, 1), (2, 4)]
+        actual = derivative(test_points, t_0=[-1, 1.5, 3])
+        assert np.isnan(actual[0]) and np.isnan(actual[2]) \
+          and actual[1] == pytest.approx(3)
+
+    def test_derivative_scalar_t0_out_of_range(self):
+
+        # check out of range scalar t_0 returns None
+        test_points = [(0, 0), (1, 1), (2, 4)]
+        actual = derivative(test_points, t_0=3)
+        assert actual is None
+
     def test_derivative_single_point(self):
 
         # Check that single point returns no derivative
@@ -172,3 +229,57 @@ class TestDerivative:
         actual = derivative(test_points)
         assert actual is None
 
+
+
+class TestTimeAxis:
+
+    def test_time_axis_datetime64(self):
+
+        # check datetime64 array converts to epoch seconds
+        test_times = np.array(['1970-01-01T00:00:01', '1970-01-02T00:00:01.5'],
+                              dtype='datetime64[ms]')
+        expected = np.array([1, 86401.5])
+        actual = time_axis(test_times)
+        assert actual == pytest.approx(expected)
+
+    def test_time_axis_timedelta_days_microseconds(self):
+
+        # check days and microseconds are not discarded
+        test_times = [timedelta(0), timedelta(days=1, microseconds=250)]
+        expected = np.array([0, 86400.00025])
+        actual = time_axis(np.array(test_times))
+        assert actual == pytest.approx(expected, abs=1e-9)
+
+    def test_time_axis_datetime_matches_epoch_seconds(self):
+
+        # check vectorized and scalar conversions agree
+        t = datetime(2021, 6, 1, 12, 30, 15, 123456)
+        actual = time_axis(np.array([t]))[0]
+        expected = epoch_seconds(t)
+        assert actual == pytest.approx(expected, abs=1e-6)
+
+    def test_as_points_float_array_no_copy(self):
+
+        # check ingested float arrays pass through without copying
+        test_points = np.array([[0., 1.], [1., 2.]])
+        actual = as_points(test_points)
+        assert np.shares_memory(actual, test_points)
+
+    def test_derivative_subsecond_sampling(self):
+
+        # check sub-second sample spacing yields correct slope
+        t0 = datetime(2021, 6, 1)
+        test_points = [(t0 + timedelta(milliseconds=500*i), i) for i in range(0, 5)]
+        expected = 2
+        actual = derivative(test_points)
+        assert actual == pytest.approx(expected)
+
+    def test_derivative_datetime64_fast_path(self):
+
+        # check datetime64 times & values ingested once
+        test_times = np.arange('2021-06-01T00:00:00', '2021-06-01T00:00:10',
+                               dtype='datetime64[s]')
+        test_points = as_points(test_times, values=np.arange(10)*3.)
+        expected = 3
+        actual = derivative(test_points)
+        assert actual == pytest.approx(expected)
@@ -0,0 +1,36 @@
+import unittest
+import pytest
+from copy import deepcopy
+from mech.actuator import MockBackend, MOCK_ACTUATOR, MOCK_DEFAULTS, pump
+from lib.clock import VirtualClock
+
+
+class TestMockBackend:
+
+    def test_mock_backend_independent_state(self):
+
+        # check reactors don't share device state
+        reactor_1 = MockBackend()
+        reactor_2 = MockBackend()
+        reactor_1.pump(100)
+        reactor_1.scale()
+        assert reactor_1.pump() == 100 and reactor_2.pump() == 0 \
+          and reactor_1.scale() < reactor_2.scale()
+
+    def test_mock_backend_default_module_functions(self):
+
+        # check module-level functions drive MOCK_ACTUATOR
+        reactor = MockBackend()
+        try:
+            pump(50)
+            assert MOCK_ACTUATOR['PUMP'] == 50 and reactor.pump() == 0
+        finally:
+            MOCK_ACTUATOR.update(deepcopy(MOCK_DEFAULTS))
+
+    def test_mock_backend_timed_pump_uses_clock(self):
+
+        # check preset step runs wait on backend clock
+        clock = VirtualClock()
+        reactor = MockBackend(clock=clock)
+        reactor.pump([5.0, 50])
+        assert clock.elapsed == 10
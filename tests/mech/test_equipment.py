@@ -1,8 +1,10 @@
 import unittest
 import pytest
+import time
 from datetime import datetime
 from mech.equipment import *
 from mech.actuator import MOCK_ACTUATOR
+from lib.clock import VirtualClock
 
 class TestCurrentReadings:
 
@@ -27,6 +29,14 @@ class TestCurrentReadings:
         actual = current_readings(sensor='time')
         assert isinstance(actual, datetime)
 
+    def test_current_reading_virtual_clock(self):
+
+        # Check that time reading comes from injected clock
+        clock = VirtualClock(datetime(2021, 1, 1))
+        clock.sleep(10)
+        actual = current_readings(sensor='time', clock=clock)
+        assert actual == datetime(2021, 1, 1, 0, 0, 10)
+
 
 class TestAttenuatePumpRate:
 
@@ -85,6 +95,18 @@ class TestAttenuatePumpRate:
         assert actual_val == expected_0 \
           and flag== expected_1
 
+    def test_attenuate_pump_rates_vectorized(self):
+
+        # checks array of g/s rates is attenuated like attenuate_pump_rate
+        min_rate, max_rate = pump_rate_limits(['m', 'sec'])
+        test_rates = np.array([-1, min_rate/2, 1, 2*max_rate]) #g/s
+        actual, too_slow, too_fast = attenuate_pump_rates(test_rates, ['m', 'sec'])
+        expected = [convert_rate(attenuate_pump_rate(r)[0], ['s', 'm'])
+                    for r in convert_rate(test_rates, ['m', 's'])]
+        assert actual == pytest.approx(expected) \
+          and list(too_slow) == [True, True, False, False] \
+          and list(too_fast) == [False, False, False, True]
+
 
     class TestVessleConditionsGood:
 
@@ -111,3 +133,75 @@ class TestAttenuatePumpRate:
 
 
 
+
+
+class TestSensorSnapshot:
+
+    def test_snapshot_key_access(self):
+
+        # check readings available by attribute, key and index
+        snapshot = acquire_snapshot(backend=MockBackend())
+        assert snapshot['mass'] == snapshot.mass == snapshot[0] \
+          and set(dict(snapshot.items())) == set(SENSORS)
+
+    def test_snapshot_rate_units(self):
+
+        # check pump rate converted like current_readings
+        backend = MockBackend()
+        backend.pump(600)
+        snapshot = acquire_snapshot(backend=backend)
+        expected = convert_rate(snapshot.rate, ['s', 'm'])
+        actual = snapshot.with_rate_units(['m', 'sec']).rate
+        assert actual == pytest.approx(expected)
+
+
+class SlowBackend(MockBackend):
+
+    # mock backend with slow pressure sensor
+    delay = 0.5
+
+    def pressure(self):
+        time.sleep(self.delay)
+        return super().pressure()
+
+
+class TestSensorAcquirer:
+
+    def test_acquirer_reads_all_sensors(self):
+
+        # check concurrent snapshot matches sensor layout
+        acquirer = SensorAcquirer(MockBackend())
+        snapshot = acquirer.acquire()
+        acquirer.close()
+        assert snapshot.stale == frozenset() \
+          and all(v is not None for k, v in snapshot.items())
+
+    def test_acquirer_timeout_marks_stale(self):
+
+        # check slow device doesn't block other reads and is marked stale
+        acquirer = SensorAcquirer(SlowBackend(), timeout={'pressure': 0.01})
+        t_0 = time.monotonic()
+        snapshot = acquirer.acquire()
+        elapsed = time.monotonic() - t_0
+        acquirer.close()
+        assert snapshot.stale == {'pressure'} and snapshot.pressure is None \
+          and snapshot.mass is not None and elapsed < SlowBackend.delay
+
+    def test_acquirer_stale_uses_last_value(self):
+
+        # check late read is collected and reused on next tick
+        backend = SlowBackend()
+        backend.delay = 0.05
+        acquirer = SensorAcquirer(backend, timeout={'pressure': 0.01})
+        acquirer.acquire()
+        time.sleep(0.1)
+        snapshot = acquirer.acquire()
+        acquirer.close()
+        assert snapshot.pressure is not None and 'pressure' in snapshot.stale \
+          and acquirer.stale_counts['pressure'] == 2
+
+    def test_missing_pressure_fails_safety_check(self):
+
+        # check safety check fails closed when pressure never read
+        snapshot = SensorSnapshot(1, 1, datetime.now(), None, 1, frozenset(['pressure']))
+        assert not vessle_conditions_good(snapshot=snapshot)
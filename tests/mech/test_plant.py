@@ -0,0 +1,60 @@
+import unittest
+import pytest
+import numpy as np
+from mech.plant import FOPDTPlant, PlantBackend
+from lib.clock import VirtualClock
+from classes.pid import PID
+
+
+class TestFOPDTPlant:
+
+    def test_plant_dead_time_and_lag(self):
+
+        # check nothing delivered before dead time, then rate approaches command
+        plant = FOPDTPlant(n=2, initial_mass=100, dead_time=2, time_constant=1)
+        plant.advance(1.9, [1, 2])
+        before = plant.delivered.copy()
+        plant.advance(20)
+        assert np.all(before == 0) \
+          and plant.delivered == pytest.approx([1, 2], rel=1e-3)
+
+    def test_plant_seeded_noise_quantized(self):
+
+        # check same seed gives same readings, on scale resolution grid
+        readings = list()
+        for _ in range(2):
+            plant = FOPDTPlant(n=5, seed=3, scale_noise=0.5, scale_resolution=0.1)
+            readings.append(plant.read_scale())
+        assert np.array_equal(readings[0], readings[1]) \
+          and np.allclose(readings[0]/0.1, np.round(readings[0]/0.1))
+
+    def test_plant_pressure_rise(self):
+
+        # check pressure rises with feed delivered
+        plant = FOPDTPlant(initial_mass=100, initial_pressure=1, dead_time=0,
+                           time_constant=0, pressure_rise=0.01)
+        plant.advance(10, 1)
+        assert plant.mass[0] == pytest.approx(90) \
+          and plant.pressure[0] == pytest.approx(1.1)
+
+
+class TestPlantBackend:
+
+    def test_plant_backend_time_based(self):
+
+        # check readings follow clock time, not number of reads
+        clock = VirtualClock()
+        backend = PlantBackend(clock=clock, dead_time=0, time_constant=0)
+        backend.pump(600) # steps/min = 2 g/s
+        clock.sleep(5)
+        first = backend.scale()
+        second = backend.scale()
+        assert first == second == pytest.approx(250 - 10)
+
+    def test_plant_backend_tunes_pid(self):
+
+        # check PID can be auto-tuned against backend's plant model
+        backend = PlantBackend(time_constant=3, dead_time=1)
+        pid = PID(backend=backend)
+        K = pid.tune(backend, processes=1)
+        assert len(K) == 3 and np.isfinite(pid.tune_result.cost)
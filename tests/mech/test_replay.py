@@ -0,0 +1,56 @@
+import unittest
+import pytest
+import numpy as np
+from lib.ticklog import TICK_RECORD
+from mech.replay import ReplayBackend, clock_for
+
+
+def trace(n=5):
+
+    # recorded ticks 1 s apart with falling scale and rising pressure
+    records = np.zeros(n, dtype=TICK_RECORD)
+    records['time'] = 1.6e9 + np.arange(n)
+    records['mass'] = 250 - np.arange(n)
+    records['pressure'] = 1 + 0.1*np.arange(n)
+    records['rate'] = 2.0
+    return records
+
+
+class TestReplayBackend:
+
+    def test_replay_backend_follows_clock(self):
+
+        # check readings are those of record in effect at clock time
+        records = trace()
+        backend = ReplayBackend(records)
+        first = (backend.scale(), backend.pressure())
+        backend.clock.sleep(2.5)
+        assert first == (250, 1) \
+          and backend.scale() == 248 \
+          and backend.pressure() == pytest.approx(1.2)
+
+    def test_replay_backend_logs_commands(self):
+
+        # check pump starts at recorded rate and holds replayed commands
+        backend = ReplayBackend(trace())
+        start = backend.pump()
+        backend.clock.sleep(1)
+        backend.pump(30.0)
+        assert start == 120 \
+          and backend.pump() == 30 \
+          and backend.commands == [(1, 30.0)]
+
+    def test_replay_clock_starts_at_first_record(self):
+
+        # check virtual clock time matches first recorded tick
+        records = trace()
+        clock = clock_for(records)
+        backend = ReplayBackend(records, clock)
+        clock.sleep(4)
+        assert backend.index() == 4 and backend.scale() == 246
+
+    def test_replay_backend_rejects_empty_trace(self):
+
+        # check empty record arrays raise ValueError
+        with pytest.raises(ValueError):
+            ReplayBackend(np.zeros(0, dtype=TICK_RECORD))